@@ -1,12 +1,28 @@
-from fastapi import FastAPI, HTTPException
+import time
+
+_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from contextlib import asynccontextmanager, suppress
+import asyncio
+import hmac
+import json
 import logging
+import math
+import urllib.parse
 import uvicorn
 
 from config import config
-from services.sql_agent import SQLAgent
+from services.batch import BatchRunner
+from services.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from services.query_executor import QueryExecutionError
+from services.result_formats import MEDIA_TYPES, ArrowStreamEncoder, ResultEncodingError, available_formats, ndjson_line
+from services.startup_report import StartupReport
 
 # Configure logging
 logging.basicConfig(
@@ -16,11 +32,124 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Scheduler error codes that mean the LLM backend is saturated, not that the query is bad
+OVERLOAD_ERROR_CODES = {"llm_queue_full", "llm_timeout", "llm_unavailable", "llm_rate_limited"}
+# Of those, the ones where the request was turned away before using the LLM (429 instead of 503)
+THROTTLED_ERROR_CODES = {"llm_queue_full", "llm_rate_limited"}
+
+def _client_id(http_request: Request) -> Optional[str]:
+    """Client charged for LLM usage: the X-Client-ID header, else the caller's address"""
+    client_id = http_request.headers.get("x-client-id", "").strip()
+    if client_id:
+        return client_id[:128]
+    return http_request.client.host if http_request.client else None
+
+def _require_admin(http_request: Request):
+    """Reject maintenance calls without the ADMIN_TOKEN (sent as X-Admin-Token or a Bearer token)"""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Endpoint de administración deshabilitado (configura ADMIN_TOKEN)")
+    token = http_request.headers.get("x-admin-token", "")
+    authorization = http_request.headers.get("authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+    if not hmac.compare_digest(token.encode("utf-8"), config.ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Token de administración no válido")
+
+# HTTP status for query execution failures (anything else is a bad query: 400)
+EXECUTION_ERROR_STATUS = {"db_timeout": 504, "db_unavailable": 503}
+
+def _error_exception(result: Dict[str, Any]) -> HTTPException:
+    """HTTP error for a failed generation: 429/503 with Retry-After when the LLM is saturated"""
+    error_code = result.get("error_code")
+    if error_code not in OVERLOAD_ERROR_CODES:
+        return HTTPException(status_code=400, detail=result["error"])
+    headers = None
+    if result.get("retry_after"):
+        headers = {"Retry-After": str(int(math.ceil(result["retry_after"])))}
+    status_code = 429 if error_code in THROTTLED_ERROR_CODES else 503
+    return HTTPException(status_code=status_code, detail=result["error"], headers=headers)
+
+# Modules that dominate startup, imported (and timed) when the agent is built
+HEAVY_IMPORTS = ("httpx", "httpcore", "openai", "services.sql_agent")
+
+startup = StartupReport(_STARTED)
+
+# Built on first use (normally by the lifespan, right after the server starts)
+sql_agent = None
+_agent_build: Optional[asyncio.Future] = None
+
+def _build_agent():
+    """Import the LLM stack and construct the agent (runs in a worker thread)"""
+    global sql_agent
+    for module in HEAVY_IMPORTS:
+        startup.import_module(module)
+    from services.sql_agent import SQLAgent
+    with startup.phase("agent_init"):
+        agent = SQLAgent()
+    if config.QUERY_CACHE_SEED_FILE:
+        with startup.phase("cache_seed"):
+            try:
+                startup.cache_seed = agent.seed_cache(config.QUERY_CACHE_SEED_FILE)
+            except Exception as e:
+                # Seeding is an optimization: serve with a cold cache rather than not at all
+                logger.error(f"Could not seed the query cache from {config.QUERY_CACHE_SEED_FILE}: {e}")
+                startup.cache_seed = {"error": str(e)}
+    sql_agent = agent
+    return agent
+
+async def get_agent():
+    """The SQL agent, building it off the event loop if it does not exist yet"""
+    global _agent_build
+    if sql_agent is not None:
+        return sql_agent
+    if _agent_build is None:
+        _agent_build = asyncio.ensure_future(asyncio.to_thread(_build_agent))
+    build = _agent_build
+    try:
+        return await asyncio.shield(build)
+    except Exception:
+        # Let the next request try again
+        if _agent_build is build:
+            _agent_build = None
+        raise
+
+async def _start_agent():
+    """Build the agent, start its health monitor and optionally warm the LLM up"""
+    try:
+        agent = await get_agent()
+        if agent.health_monitor is not None:
+            agent.health_monitor.start()
+        if config.STARTUP_WARMUP:
+            with startup.phase("warmup"):
+                startup.warmup = await agent.warm_up()
+        startup.mark_ready()
+        logger.info(startup.summary())
+    except Exception as e:
+        startup.error = str(e)
+        logger.error(f"Failed to build the SQL agent: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Accept connections at once and build the agent in the background; release it on shutdown"""
+    startup.mark("server_started")
+    starting = asyncio.create_task(_start_agent())
+    yield
+    starting.cancel()
+    with suppress(asyncio.CancelledError):
+        await starting
+    if sql_agent is not None:
+        if sql_agent.health_monitor is not None:
+            await sql_agent.health_monitor.stop()
+        await sql_agent.llm_client.aclose()
+        if sql_agent.executor is not None:
+            await sql_agent.executor.aclose()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="SQL Agent API",
     description="Convert natural language queries to SQL for Sakila database",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -32,19 +161,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize SQL Agent
-sql_agent = SQLAgent()
-
 # Request/Response models
 class QueryRequest(BaseModel):
     query: str
 
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    parallelism: Optional[int] = None
+    stream: bool = False
+
+class RunQueryRequest(BaseModel):
+    query: str
+    format: str = "ndjson"
+    max_rows: Optional[int] = None
+
+class InvalidateRequest(BaseModel):
+    tables: Optional[List[str]] = None
+
 class QueryResponse(BaseModel):
     success: bool
     sql_query: str = None
     natural_query: str = None
     llm_info: Dict[str, Any] = None
     validation: Dict[str, Any] = None
+    cache: Dict[str, Any] = None
     error: str = None
 
 @app.get("/")
@@ -65,26 +205,54 @@ async def basic_health_check():
         "provider": config.LLM_PROVIDER
     }
 
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the agent is built (and warmed up, if enabled), 503 before"""
+    if not startup.ready:
+        raise HTTPException(status_code=503, detail="Starting", headers={"Retry-After": "1"})
+    return {"status": "ready", "ready_ms": startup.ready_ms}
+
+@app.get("/startup/stats")
+async def startup_stats():
+    """Startup timeline: heavy imports, agent construction, warm-up and time to ready (ms)"""
+    return startup.to_dict()
+
 @app.get("/health")
 async def health_check():
-    """Full health check endpoint - includes LLM connection test"""
+    """Full health check endpoint - includes LLM connection status.
+    
+    Answered from the background health monitor's last probe, so polling it
+    never adds LLM traffic; probes inline only when the monitor is disabled.
+    """
     try:
+        sql_agent = await get_agent()
         # Basic service status
         status = {
             "status": "ok",
             "service": "SQL Agent API",
             "provider": config.LLM_PROVIDER,
-            "model": sql_agent.llm_client.model if sql_agent.llm_client else "unknown"
+            "model": sql_agent.llm_client.model if sql_agent.llm_client else "unknown",
+            "llm_scheduler": sql_agent.llm_client.scheduler.stats() if sql_agent.llm_client else None
         }
         
-        # Test LLM connection with timeout
+        # LLM connection status, from memory when the monitor is running
         try:
-            llm_test = sql_agent.test_connection_fast()
-            status["llm_connection"] = llm_test["success"]
+            health = sql_agent.health_status()
+            if health is not None:
+                status["llm_state"] = health["state"]
+                status["llm_health"] = health
+                llm_test = health["last_result"]
+            else:
+                llm_test = await sql_agent.test_connection_fast()
             
-            if not llm_test["success"]:
+            if llm_test is not None:
+                status["llm_connection"] = llm_test["success"]
+                if not llm_test["success"]:
+                    status["llm_error"] = llm_test.get("error", "Unknown LLM error")
+            
+            if (health is not None and health["state"] in ("degraded", "down")) or \
+                    (llm_test is not None and not llm_test["success"]):
                 status["status"] = "degraded"
-                status["llm_error"] = llm_test.get("error", "Unknown LLM error")
                 
         except Exception as llm_error:
             logger.warning(f"LLM health check failed: {llm_error}")
@@ -102,22 +270,20 @@ async def health_check():
         }
 
 @app.post("/generate-sql", response_model=QueryResponse)
-async def generate_sql(request: QueryRequest):
+async def generate_sql(request: QueryRequest, http_request: Request):
     """Generate SQL from natural language query"""
     try:
         logger.info(f"Processing query: {request.query[:100]}...")
         
-        result = await sql_agent.process_query(request.query)
+        sql_agent = await get_agent()
+        result = await sql_agent.process_query(request.query, client_id=_client_id(http_request))
         
         if result["success"]:
             logger.info("SQL generation successful")
             return QueryResponse(**result)
         else:
             logger.warning(f"SQL generation failed: {result['error']}")
-            raise HTTPException(
-                status_code=400, 
-                detail=result["error"]
-            )
+            raise _error_exception(result)
             
     except HTTPException:
         raise
@@ -128,22 +294,251 @@ async def generate_sql(request: QueryRequest):
             detail="Internal server error"
         )
 
+@app.post("/generate-sql/stream")
+async def generate_sql_stream(request: QueryRequest, http_request: Request):
+    """Generate SQL as Server-Sent Events.
+    
+    ``field`` events carry each JSON field (sql_query, explanation, ...) as soon
+    as the model finishes it; a final ``result`` event carries the same payload
+    as /generate-sql (or ``success: false`` with the error). A repaired or
+    LIMIT-capped SQL is sent as a second ``sql_query`` field before the result.
+    """
+    logger.info(f"Streaming query: {request.query[:100]}...")
+    client_id = _client_id(http_request)
+    
+    try:
+        sql_agent = await get_agent()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        raise HTTPException(
+            status_code=500, 
+            detail="Internal server error"
+        )
+    
+    async def event_stream():
+        events = sql_agent.process_query_stream(request.query, client_id=client_id)
+        try:
+            async for event in events:
+                data = json.dumps(event["data"], ensure_ascii=False, default=str)
+                yield f"event: {event['event']}\ndata: {data}\n\n"
+        finally:
+            # A client that disconnects closes the LLM stream right away
+            await events.aclose()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/generate-sql/batch")
+async def generate_sql_batch(request: BatchQueryRequest, http_request: Request):
+    """Generate SQL for many queries at once.
+    
+    Identical normalized queries are generated once, at lower priority than
+    single queries when the LLM rate limit is reached. With ``stream: true`` the
+    results are sent as NDJSON lines in completion order followed by a summary
+    line; otherwise a single JSON document is returned in input order.
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="queries cannot be empty")
+    if len(request.queries) > config.BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large: {len(request.queries)} queries (max {config.BATCH_MAX_QUERIES})"
+        )
+    
+    parallelism = min(request.parallelism or config.BATCH_MAX_PARALLELISM, config.BATCH_MAX_PARALLELISM)
+    runner = BatchRunner(await get_agent(), parallelism=parallelism, client_id=_client_id(http_request))
+    logger.info(f"Processing batch of {len(request.queries)} queries (parallelism {parallelism})")
+    
+    if request.stream:
+        async def ndjson_stream():
+            async for item in runner.iter_results(request.queries):
+                yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
+        
+        return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+    
+    return await runner.run(request.queries)
+
+@app.post("/generate-and-run")
+async def generate_and_run(request: RunQueryRequest, http_request: Request):
+    """Generate SQL and run it, streaming the rows.
+    
+    Only generations that pass validation (a single SELECT on known tables)
+    are executed, with at most ``max_rows`` rows (capped by
+    EXECUTION_MAX_ROWS) and EXECUTION_TIMEOUT seconds. ``format: ndjson``
+    sends one line with the generation, one with the columns, one per batch
+    of rows and a final ``end`` (or ``error``) line; ``format: arrow`` sends
+    an Arrow IPC stream with the SQL in the schema metadata.
+    """
+    sql_agent = await get_agent()
+    if sql_agent.executor is None:
+        raise HTTPException(status_code=404, detail="La ejecución de consultas está deshabilitada (QUERY_EXECUTION_ENABLED)")
+    if request.format not in available_formats():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato no disponible: {request.format} (disponibles: {', '.join(available_formats())})"
+        )
+    max_rows = max(1, min(request.max_rows or config.EXECUTION_MAX_ROWS, config.EXECUTION_MAX_ROWS))
+    
+    result = await sql_agent.process_query(request.query, client_id=_client_id(http_request))
+    if not result["success"]:
+        raise _error_exception(result)
+    validation = result.get("validation") or {}
+    if not validation.get("is_valid"):
+        problems = validation.get("errors") or validation.get("warnings") or [validation.get("error", "")]
+        raise HTTPException(
+            status_code=422,
+            detail=f"El SQL generado no se ejecuta porque no pasó la validación: {'; '.join(map(str, problems))}"
+        )
+    
+    events = sql_agent.execute_sql(result["sql_query"], max_rows, tables=validation.get("tables") or ())
+    try:
+        # Fail with a proper status while nothing has been sent yet
+        try:
+            columns = await events.__anext__()
+        except StopAsyncIteration:
+            raise QueryExecutionError("La consulta terminó sin devolver columnas")
+        encoder = None
+        if request.format == "arrow":
+            encoder = ArrowStreamEncoder(
+                columns["columns"],
+                metadata={"sql_query": result["sql_query"], "max_rows": str(max_rows)},
+                types=columns.get("types")
+            )
+    except QueryExecutionError as e:
+        await events.aclose()
+        logger.warning(f"Query execution failed: {e}")
+        raise HTTPException(status_code=EXECUTION_ERROR_STATUS.get(e.error_code, 400), detail=str(e))
+    except Exception as e:
+        await events.aclose()
+        logger.exception("Query execution failed before streaming")
+        raise HTTPException(status_code=500, detail=f"Error ejecutando la consulta: {e}")
+    # The stream bodies close ``events`` themselves; this covers a response that is never iterated
+    close_events = BackgroundTask(events.aclose)
+    
+    if encoder is not None:
+        async def arrow_stream():
+            try:
+                async for event in events:
+                    if event["type"] == "rows":
+                        yield encoder.batch(event["rows"])
+                yield encoder.end()
+            except (QueryExecutionError, ResultEncodingError) as e:
+                # An error batch and no end-of-stream marker tell the reader the stream is incomplete
+                logger.warning(f"Query execution failed while streaming: {e}")
+                yield encoder.error(str(e), getattr(e, "error_code", "encoding_error"))
+            finally:
+                await events.aclose()
+        
+        return StreamingResponse(
+            arrow_stream(),
+            media_type=MEDIA_TYPES["arrow"],
+            headers={"X-SQL-Query": urllib.parse.quote(result["sql_query"])},
+            background=close_events
+        )
+    
+    async def ndjson_stream():
+        try:
+            yield ndjson_line({"type": "generation", "result": result})
+            yield ndjson_line(columns)
+            async for event in events:
+                yield ndjson_line(event)
+        except QueryExecutionError as e:
+            logger.warning(f"Query execution failed while streaming: {e}")
+            yield ndjson_line({"type": "error", "error": str(e), "error_code": e.error_code})
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(ndjson_stream(), media_type=MEDIA_TYPES["ndjson"], background=close_events)
+
+@app.get("/execution/stats")
+async def execution_stats():
+    """Query execution counters (backend, rows streamed, timeouts, pool usage)"""
+    return (await get_agent()).execution_stats()
+
+@app.get("/result-cache/stats")
+async def result_cache_stats():
+    """Result set cache statistics (entries, memory, hit rate, indexed tables)"""
+    return (await get_agent()).result_cache_stats()
+
+@app.post("/result-cache/invalidate")
+async def invalidate_result_cache(request: InvalidateRequest, http_request: Request):
+    """Drop cached result sets that read any of ``tables`` (all of them when omitted; requires ADMIN_TOKEN).
+    
+    With several workers the others drop theirs on their next lookup.
+    """
+    _require_admin(http_request)
+    invalidated = (await get_agent()).invalidate_results(request.tables)
+    logger.info(f"Invalidated {invalidated} cached result sets (tables: {request.tables or 'all'})")
+    return {"invalidated": invalidated, "tables": request.tables}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Query result cache statistics"""
+    return (await get_agent()).cache_stats()
+
+@app.get("/llm-transport/stats")
+async def llm_transport_stats():
+    """Record/replay transport of the LLM clients (mode, file, exchanges recorded or replayed)"""
+    return (await get_agent()).transport_stats()
+
+@app.get("/repair/stats")
+async def repair_stats():
+    """SQLite dry-run and self-repair statistics"""
+    return (await get_agent()).repair_stats()
+
+@app.get("/coalescing/stats")
+async def coalescing_stats():
+    """Concurrent identical queries coalesced into one LLM generation"""
+    return (await get_agent()).coalescing_stats()
+
+@app.get("/usage/stats")
+async def usage_stats():
+    """LLM tokens and cost per client (X-Client-ID header or address)"""
+    return (await get_agent()).usage_stats()
+
+@app.get("/rate-limit/stats")
+async def rate_limit_stats():
+    """Local LLM tokens/requests per minute budget and waiting requests"""
+    return (await get_agent()).rate_limit_stats()
+
+@app.get("/router/stats")
+async def router_stats():
+    """LLM backend latency, error rate and circuit breaker state"""
+    return (await get_agent()).router_stats()
+
+@app.get("/http/stats")
+async def http_stats():
+    """Shared HTTP connection pool statistics"""
+    return (await get_agent()).http_stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms, parse modes, tokens, cache and errors"""
+    sql_agent = await get_agent()
+    return PlainTextResponse(sql_agent.metrics_text(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/test-llm")
 async def test_llm():
     """Test LLM connection endpoint"""
-    return sql_agent.test_connection()
+    return await (await get_agent()).test_connection()
 
 if __name__ == "__main__":
     try:
         # Validate configuration
         config.validate()
-        logger.info(f"Starting SQL Agent API with {config.LLM_PROVIDER} provider")
+        logger.info(f"Starting SQL Agent API with {config.LLM_PROVIDER} provider ({config.WORKERS} workers)")
         
         uvicorn.run(
             "app:app", 
             host="0.0.0.0", 
             port=config.PORT, 
-            reload=config.DEBUG
+            reload=config.DEBUG and config.WORKERS == 1,
+            workers=config.WORKERS
         )
     except Exception as e:
         logger.error(f"Failed to start server: {e}")
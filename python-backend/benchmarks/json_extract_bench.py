@@ -0,0 +1,191 @@
+"""Fuzz corpus and benchmark of the tolerant JSON extractor.
+
+Builds a deterministic corpus of messy model outputs (code fences, preambles,
+trailing text, escaped and unescaped quotes, single quotes, raw newlines,
+list-valued fields, truncation) around known SQL answers, then reports how
+often each parser recovers the exact ``sql_query`` and what it costs, next
+to the four-strategy regex cascade it replaced.
+
+Usage:
+    python benchmarks/json_extract_bench.py [--seed 7] [--truncations 20] [--iterations 200] [-v]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.json_extract import extract_json_object  # noqa: E402
+
+ANSWERS = [
+    {
+        "sql_query": "SELECT titulo, descripcion FROM pelicula WHERE clasificacion = 'PG' LIMIT 10;",
+        "explanation": "Películas con clasificación PG.",
+        "considerations": "Sin índice sobre clasificacion.",
+        "alternatives": "Filtrar también por año de lanzamiento.",
+    },
+    {
+        "sql_query": "SELECT c.nombre, c.apellidos, SUM(p.total) AS total_gastado FROM cliente c\n"
+                     "JOIN pago p ON c.id_cliente = p.id_cliente\nGROUP BY c.id_cliente, c.nombre, c.apellidos\n"
+                     "ORDER BY total_gastado DESC LIMIT 10;",
+        "explanation": "Los 10 clientes que más han gastado.",
+        "considerations": "Usa el índice de pago.id_cliente.",
+        "alternatives": "Una subconsulta agregada sobre pago.",
+    },
+    {
+        "sql_query": "SELECT c.nombre FROM cliente c JOIN direccion d ON c.id_direccion = d.id_direccion "
+                     "JOIN ciudad ci ON d.id_ciudad = ci.id_ciudad WHERE ci.nombre = \"A Coruña (La Coruña)\";",
+        "explanation": "Clientes de \"A Coruña\".",
+        "considerations": "",
+        "alternatives": "WHERE ci.nombre LIKE 'A Coru%'",
+    },
+    {
+        "sql_query": "SELECT titulo FROM pelicula WHERE descripcion LIKE '%{épica}%' AND titulo <> 'It''s';",
+        "explanation": "Títulos con llaves {} y comillas en el patrón.",
+        "considerations": "LIKE con comodín inicial recorre toda la tabla.",
+        "alternatives": "Índice FULLTEXT sobre descripcion.",
+    },
+    {
+        "sql_query": "SELECT DATE_FORMAT(fecha_pago, '%Y-%m') AS mes, SUM(total) FROM pago GROUP BY mes;",
+        "explanation": "Ingresos por mes.",
+        "considerations": "Agrupa sobre una expresión.",
+        "alternatives": "EXTRACT(YEAR_MONTH FROM fecha_pago)",
+    },
+]
+
+
+def _unescaped(answer):
+    """JSON written by hand: quotes and newlines inside values left raw"""
+    fields = ",\n  ".join(f'"{k}": "{v}"' for k, v in answer.items())
+    return "{\n  " + fields + "\n}"
+
+
+def _single_quoted(answer):
+    fields = ", ".join(f"'{k}': '{v}'" for k, v in answer.items())
+    return "{" + fields + "}"
+
+
+def _list_alternatives(answer):
+    data = dict(answer, alternatives=[answer["alternatives"], "Otra variante."])
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+MUTATIONS = {
+    "plain": lambda a: json.dumps(a, ensure_ascii=False),
+    "indented": lambda a: json.dumps(a, ensure_ascii=False, indent=2),
+    "fenced": lambda a: "```json\n" + json.dumps(a, ensure_ascii=False, indent=2) + "\n```",
+    "preamble": lambda a: "Aquí tienes la consulta {json}:\n" + json.dumps(a, ensure_ascii=False),
+    "trailing_text": lambda a: json.dumps(a, ensure_ascii=False) + "\n\nEspero que te sirva. {fin}",
+    "trailing_comma": lambda a: json.dumps(a, ensure_ascii=False, indent=2)[:-2] + ",\n}",
+    "unescaped": _unescaped,
+    "fenced_unescaped": lambda a: "```\n" + _unescaped(a) + "\n```\nNota: revisa los índices.",
+    "single_quotes": _single_quoted,
+    "list_field": _list_alternatives,
+}
+
+
+def build_corpus(seed, truncations):
+    """``(name, text, expected_sql, exact)`` cases; truncated ones only need a prefix"""
+    rng = random.Random(seed)
+    corpus = []
+    for index, answer in enumerate(ANSWERS):
+        for name, mutate in MUTATIONS.items():
+            if name == "single_quotes" and "'" in answer["sql_query"]:
+                continue  # ambiguous for any parser
+            corpus.append((f"{name}[{index}]", mutate(answer), answer["sql_query"], True))
+        text = json.dumps(answer, ensure_ascii=False, indent=2)
+        value_start = text.index('"sql_query": "') + len('"sql_query": "')
+        for _ in range(truncations):
+            cut = rng.randint(value_start + 5, len(text) - 1)
+            corpus.append((f"truncated@{cut}[{index}]", text[:cut], answer["sql_query"], False))
+    return corpus
+
+
+def legacy_parse(content):
+    """The four-strategy cascade used before the extractor (for comparison only)"""
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        pass
+    try:
+        cleaned = re.sub(r'```(?:json)?\s*', '', content)
+        cleaned = re.sub(r'```\s*$', '', cleaned)
+        return json.loads(cleaned.strip())
+    except json.JSONDecodeError:
+        pass
+    try:
+        json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', content, re.DOTALL)
+        if json_match:
+            return json.loads(json_match.group(0))
+    except (json.JSONDecodeError, AttributeError):
+        pass
+    result = {}
+    for field in ("sql_query", "explanation", "considerations", "alternatives"):
+        match = re.search(rf'["\']{field}["\']\s*:\s*["\']([^"\']*)["\'"]', content, re.DOTALL)
+        if match:
+            result[field] = match.group(1)
+    if result.get("sql_query"):
+        return result
+    return None
+
+
+def extractor_parse(content):
+    return extract_json_object(content)[0]
+
+
+def is_correct(data, expected, exact):
+    if not isinstance(data, dict):
+        return False
+    sql = data.get("sql_query")
+    if not isinstance(sql, str) or not sql:
+        return False
+    return sql == expected if exact else expected.startswith(sql)
+
+
+def measure(function, corpus, iterations):
+    """Per-document timings in microseconds, one sample per corpus pass"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        for _, text, _, _ in corpus:
+            function(text)
+        samples.append((time.perf_counter() - start) / len(corpus) * 1e6)
+    samples.sort()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--truncations", type=int, default=20, help="truncated variants per answer")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("-v", "--verbose", action="store_true", help="print the cases the extractor gets wrong")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.seed, args.truncations)
+    print(f"corpus: {len(corpus)} documents ({len(corpus) - len(ANSWERS) * args.truncations} complete)")
+    for name, function in (("extractor", extractor_parse), ("legacy cascade", legacy_parse)):
+        correct = 0
+        complete_correct = 0
+        for case, text, expected, exact in corpus:
+            ok = is_correct(function(text), expected, exact)
+            correct += ok
+            complete_correct += ok and exact
+            if args.verbose and not ok and function is extractor_parse:
+                print(f"  MISS {case}: {function(text)!r:.120}")
+        samples = measure(function, corpus, args.iterations)
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        print(
+            f"{name:>15}: sql_query correct {correct}/{len(corpus)} "
+            f"(complete {complete_correct})  mean {statistics.fmean(samples):6.1f} us/doc  "
+            f"p50 {samples[len(samples) // 2]:6.1f}  p99 {p99:6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Offline load test of ``/generate-sql`` against a mock LLM server.
+
+Starts the stub OpenAI-compatible server (see ``stub_openai_server.py``) in
+a background thread, points the backend at it as a ``docker_runner``
+model, and drives the FastAPI app in-process (``httpx.ASGITransport``) at
+increasing concurrency. Each step reports throughput, latency percentiles
+and event-loop lag (how late a 5 ms ticker on the app's loop wakes up,
+i.e. how long request handling blocks the loop). Micro-benchmarks of the
+CPU-bound pieces of a request (JSON extraction, SQL validation, prompt
+building) run afterwards.
+
+Results can be saved as a JSON baseline and compared against later runs;
+the comparison exits with status 1 when throughput, p95 latency or a
+micro-benchmark regresses by more than ``--tolerance``.
+
+Profiles of the mock server:
+
+- ``overhead``: 50 ms answers, 20% malformed; measures the backend's own cost.
+- ``docker_runner``: lognormal latency (median 400 ms), prompt processing at
+  1000 tokens/s with prefix caching, 40 tokens/s, 25% malformed.
+- ``openai``: lognormal latency (median 800 ms), 80 tokens/s, well-formed JSON.
+
+Usage:
+    python benchmarks/load_test.py [--profile overhead] [--concurrency 1,4,16,64] [--requests 200]
+        [--save benchmarks/baselines/overhead.json] [--compare benchmarks/baselines/overhead.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROFILES = {
+    "overhead": {"latency": 0.05, "jitter": 0.01, "distribution": "uniform", "token_rate": 0.0,
+                 "malformed_rate": 0.2},
+    "docker_runner": {"latency": 0.4, "jitter": 0.5, "distribution": "lognormal", "token_rate": 40.0,
+                      "prefill_rate": 1000.0, "malformed_rate": 0.25},
+    "openai": {"latency": 0.8, "jitter": 0.3, "distribution": "lognormal", "token_rate": 80.0,
+               "malformed_rate": 0.0},
+}
+
+QUERIES = [
+    "Muestra las 10 películas más alquiladas",
+    "¿Qué clientes han gastado más dinero?",
+    "Lista los actores que aparecen en más de 30 películas",
+    "Clientes que viven en Madrid",
+    "Número de películas por categoría",
+    "Ingresos totales por año",
+    "Alquileres pendientes de devolución",
+    "Películas con clasificación PG",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub(port: int, seed: int, **knobs):
+    """Run the stub server on its own thread and event loop, so it does not add to the app's loop lag"""
+    import uvicorn
+    from benchmarks.stub_openai_server import create_stub_app
+
+    stub = create_stub_app("mock", content=None, seed=seed, **knobs)
+    server = uvicorn.Server(uvicorn.Config(stub, host="127.0.0.1", port=port, log_level="error"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("mock LLM server did not start")
+        time.sleep(0.01)
+    return stub, server, thread
+
+
+def configure_backend(port: int, cache: bool):
+    """Environment for the backend under test; must run before ``app`` is imported"""
+    os.environ.update({
+        "LLM_PROVIDER": "docker_runner",
+        "DOCKER_RUNNER_BASE_URL": f"http://127.0.0.1:{port}/v1/",
+        "DOCKER_RUNNER_MODEL": "mock-model",
+        "LLM_BACKENDS": "",
+        "HEALTH_MONITOR_ENABLED": "false",
+        "QUERY_CACHE_ENABLED": "true" if cache else "false",
+        "SIMILARITY_INDEX_ENABLED": "true" if cache else "false",
+    })
+
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else float("nan")
+
+
+async def lag_monitor(samples, interval=0.005):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def run_step(client, concurrency: int, requests: int, offset: int, cache: bool):
+    """Send ``requests`` queries with ``concurrency`` in flight; returns the step's summary"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors, lag = [], 0, []
+
+    async def one(i):
+        nonlocal errors
+        # Unique wording per request unless the cache path is being measured
+        query = QUERIES[i % len(QUERIES)] if cache else f"{QUERIES[i % len(QUERIES)]} (petición {offset + i})"
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post("/generate-sql", json={"query": query})
+                ok = response.status_code == 200 and response.json().get("success")
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    monitor = asyncio.create_task(lag_monitor(lag))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    monitor.cancel()
+    latencies.sort()
+    lag.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "loop_lag_p50_ms": round(percentile(lag, 0.5) * 1000, 2),
+        "loop_lag_p99_ms": round(percentile(lag, 0.99) * 1000, 2),
+        "loop_lag_max_ms": round(lag[-1] * 1000, 2) if lag else None,
+    }
+
+
+def time_us(function, inputs, iterations):
+    """Mean and p99 microseconds per call over ``iterations`` passes of ``inputs``"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        for item in inputs:
+            function(item)
+        samples.append((time.perf_counter() - start) / len(inputs) * 1e6)
+    samples.sort()
+    return {"mean_us": round(statistics.fmean(samples), 2), "p99_us": round(percentile(samples, 0.99), 2)}
+
+
+def micro_benchmarks(agent, iterations: int):
+    from benchmarks.json_extract_bench import build_corpus
+    from benchmarks.sql_validator_bench import CORPUS
+    from models.json_extract import extract_json_object
+
+    documents = [text for _, text, _, _ in build_corpus(7, 5)]
+    return {
+        "json_extract": time_us(extract_json_object, documents, iterations),
+        "validate_sql": time_us(agent._validate_sql, CORPUS, iterations),
+        "build_prompt": time_us(agent._build_prompt, QUERIES, iterations),
+    }
+
+
+def compare(current, baseline, tolerance: float):
+    """Regressions of ``current`` against ``baseline`` (empty when within tolerance)"""
+    regressions = []
+    steps = {step["concurrency"]: step for step in baseline.get("load", [])}
+    for step in current["load"]:
+        base = steps.get(step["concurrency"])
+        if base is None:
+            continue
+        label = f"c={step['concurrency']}"
+        if step["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{label} throughput {base['throughput_rps']} -> {step['throughput_rps']} req/s")
+        # 1 ms of slack so sub-millisecond noise on fast steps is not reported
+        if step["p95_ms"] > base["p95_ms"] * (1 + tolerance) + 1:
+            regressions.append(f"{label} p95 {base['p95_ms']} -> {step['p95_ms']} ms")
+    for name, result in current["micro"].items():
+        base = baseline.get("micro", {}).get(name)
+        if base and result["mean_us"] > base["mean_us"] * (1 + tolerance):
+            regressions.append(f"{name} {base['mean_us']} -> {result['mean_us']} us")
+    return regressions
+
+
+def print_report(report):
+    print(f"profile {report['meta']['profile']}: {json.dumps(report['meta']['stub'])}")
+    print(f"{'conc':>5} {'req/s':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'lag p99':>8} {'lag max':>8}")
+    for step in report["load"]:
+        print(f"{step['concurrency']:>5} {step['throughput_rps']:>8.1f} {step['errors']:>6} "
+              f"{step['p50_ms']:>8.1f} {step['p95_ms']:>8.1f} {step['p99_ms']:>8.1f} "
+              f"{step['loop_lag_p99_ms']:>8.2f} {step['loop_lag_max_ms']:>8.2f}")
+    print("parse modes: " + ", ".join(f"{mode} {count}" for mode, count in report["parse_modes"].items()))
+    for name, result in report["micro"].items():
+        print(f"{name:>13}: mean {result['mean_us']:8.1f} us  p99 {result['p99_us']:8.1f} us")
+
+
+async def run(args, stub):
+    import httpx
+    from app import app, get_agent
+
+    # Per-request warnings (e.g. tolerant JSON parsing) would otherwise measure the terminal
+    logging.getLogger().setLevel(args.log_level)
+    steps = []
+    sql_agent = await get_agent()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://backend", timeout=120) as client:
+        # Warm-up: first connections, lazy imports and allocator growth stay out of the first step
+        await run_step(client, 4, 8, -100, args.cache)
+        offset = 0
+        for concurrency in args.concurrency:
+            requests = max(args.requests, concurrency * 2)
+            steps.append(await run_step(client, concurrency, requests, offset, args.cache))
+            offset += requests
+    await sql_agent.llm_client.aclose()
+    parse_modes = {mode: child.value for mode, child in sql_agent.metrics.parses.items()}
+    return steps, parse_modes, sql_agent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="overhead")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma-separated concurrency steps")
+    parser.add_argument("--requests", type=int, default=200, help="requests per step (at least 2x concurrency)")
+    parser.add_argument("--cache", action="store_true", help="keep the query cache and similarity index on")
+    parser.add_argument("--iterations", type=int, default=200, help="passes per micro-benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="CRITICAL", help="backend log level during the run")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed relative regression")
+    args = parser.parse_args()
+    args.concurrency = [int(value) for value in args.concurrency.split(",")]
+
+    knobs = PROFILES[args.profile]
+    port = free_port()
+    stub, server, thread = start_stub(port, args.seed, **knobs)
+    configure_backend(port, args.cache)
+    try:
+        steps, parse_modes, agent = asyncio.run(run(args, stub))
+        micro = micro_benchmarks(agent, args.iterations)
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+    report = {
+        "meta": {
+            "profile": args.profile,
+            "stub": knobs,
+            "cache": args.cache,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "mock_requests": stub.state.requests,
+            "mock_malformed": stub.state.malformed,
+            "mock_cached_tokens": stub.state.cached_tokens,
+        },
+        "load": steps,
+        "parse_modes": parse_modes,
+        "micro": micro,
+    }
+    print_report(report)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"REGRESSIONS vs {args.compare} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"no regressions vs {args.compare} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
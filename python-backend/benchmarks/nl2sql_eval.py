@@ -0,0 +1,374 @@
+"""Offline NL->SQL evaluation over the Sakila golden set.
+
+Runs every question of a versioned golden set (``benchmarks/data/golden_set_v1.jsonl``:
+Spanish question, reference SQL, tags) through the agent, executes both the
+generated and the reference SQL on the SQLite mirror built from
+``database/*.sql`` and compares the result sets (as multisets, or in order
+when the item sets ``order_matters``). Reports execution accuracy (overall
+and per tag), end-to-end latency percentiles, tokens per query and the
+structured-vs-fallback parse rate. Questions run in parallel.
+
+LLM answers never come from the network unless asked to:
+
+- ``--record PATH``: call the configured LLM (``LLM_PROVIDER``, ``OPENAI_MODEL``,
+  ``DOCKER_RUNNER_MODEL``, prompt in ``system-prompt.md``) through the
+  recording transport (``LLM_TRANSPORT=record``, see ``models/llm_transport.py``);
+  the file starts afresh.
+- ``--replay PATH``: serve the recorded answers by request hash after the
+  recorded latency times ``--latency-scale``. Runs are deterministic and
+  offline; the backend is configured like the recording, and requests that
+  changed since (prompt, model, settings) are reported as ``not_recorded``.
+- ``--oracle``: answer with the reference SQL; checks the golden set and the
+  harness (accuracy must be 100%).
+
+Usage:
+    python benchmarks/nl2sql_eval.py --record benchmarks/recordings/gpt-4o-mini.jsonl
+    python benchmarks/nl2sql_eval.py --replay benchmarks/recordings/gpt-4o-mini.jsonl [--latency-scale 0]
+        [--save report.json] [--compare previous.json] [--verbose]
+    python benchmarks/nl2sql_eval.py --oracle
+"""
+import argparse
+import asyncio
+import datetime
+import decimal
+import hashlib
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_GOLDEN_SET = os.path.join(os.path.dirname(__file__), "data", "golden_set_v1.jsonl")
+MAX_ROWS = 100000
+EXECUTION_TIMEOUT = 30.0
+STATUSES = ("match", "mismatch", "invalid", "exec_error", "gen_error", "not_recorded")
+
+
+def load_golden_set(path):
+    """Items of the golden set plus the SHA-256 of the file (its version for reports)"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    items = [json.loads(line) for line in raw.decode("utf-8").splitlines() if line.strip()]
+    return items, hashlib.sha256(raw).hexdigest()[:16]
+
+
+def configure_backend(transport, path, latency_scale=0.0, provider=None, model=None):
+    """Environment for the agent under test; must run before ``services.sql_agent`` is imported"""
+    os.environ.update({
+        "LLM_TRANSPORT": transport,
+        "LLM_TRANSPORT_FILE": path or "",
+        "LLM_REPLAY_LATENCY_SCALE": str(latency_scale),
+        "LLM_REPLAY_LATENCY_MS": "0",
+        "LLM_BACKENDS": "",
+        "HEALTH_MONITOR_ENABLED": "false",
+        "QUERY_CACHE_ENABLED": "false",
+        "SIMILARITY_INDEX_ENABLED": "false",
+        "SINGLE_FLIGHT_ENABLED": "false",
+        "QUERY_EXECUTION_ENABLED": "false",
+        # A LIMIT added by the cost check would change the result set under comparison
+        "COST_AUTO_LIMIT": "false",
+        "LLM_TPM_LIMIT": "0",
+        "LLM_RPM_LIMIT": "0",
+        "WORKERS": "1",
+    })
+    # Replayed requests must match the recorded ones byte for byte: same provider and model
+    if provider == "openai":
+        os.environ.update({"LLM_PROVIDER": "openai", "OPENAI_MODEL": model})
+    elif provider is not None:
+        os.environ.update({"LLM_PROVIDER": "docker_runner", "DOCKER_RUNNER_MODEL": model})
+
+
+def oracle_transport(items):
+    """Mock transport answering each question with its reference SQL"""
+    import httpx
+
+    references = {item["question"]: item["sql"] for item in items}
+
+    def handler(request):
+        payload = json.loads(request.content)
+        question = next(m["content"] for m in reversed(payload["messages"]) if m["role"] == "user")
+        content = json.dumps({
+            "sql_query": references.get(question, ""), "explanation": "", "considerations": "", "alternatives": "",
+        })
+        return httpx.Response(200, json={
+            "id": "chatcmpl-oracle", "object": "chat.completion", "created": 0, "model": payload["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        })
+
+    return httpx.MockTransport(handler)
+
+
+def install_transport(agent, transport):
+    import httpx
+
+    http_client = httpx.AsyncClient(transport=transport, timeout=agent.llm_client.http.timeout)
+    for backend in agent.llm_client.router.backends:
+        backend.client = backend.client.with_options(http_client=http_client)
+    return http_client
+
+
+def _normalize_value(value):
+    # MySQL DECIMAL sums come back as floats from SQLite; compare at cent precision
+    if isinstance(value, (float, decimal.Decimal)):
+        value = round(float(value), 2)
+        return int(value) if value.is_integer() else value
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime.datetime) else value.isoformat()
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+
+def normalize_rows(rows):
+    return [tuple(_normalize_value(value) for value in row) for row in rows]
+
+
+def same_results(generated, reference, order_matters):
+    if order_matters:
+        return generated == reference
+    return Counter(generated) == Counter(reference)
+
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else float("nan")
+
+
+async def evaluate_item(agent, mirror, item, reference, semaphore):
+    """Generate, execute and compare one golden item"""
+    async with semaphore:
+        started = time.perf_counter()
+        response = await agent.process_query(item["question"], client_id="eval")
+        latency_ms = (time.perf_counter() - started) * 1000
+    llm_info = response.get("llm_info") or {}
+    outcome = {
+        "id": item["id"],
+        "question": item["question"],
+        "tags": item.get("tags", []),
+        "latency_ms": round(latency_ms, 2),
+        "parse": llm_info.get("parse"),
+        "usage": llm_info.get("usage"),
+        "sql": response.get("sql_query"),
+        "detail": None,
+    }
+    if not response.get("success"):
+        replay = agent.llm_client.transport
+        missed = getattr(replay, "missed_queries", ())
+        outcome["status"] = "not_recorded" if item["question"] in missed else "gen_error"
+        outcome["detail"] = response.get("error")
+        return outcome
+    validation = response.get("validation") or {}
+    if not validation.get("is_valid"):
+        outcome["status"] = "invalid"
+        outcome["detail"] = "; ".join(map(str, validation.get("errors") or [validation.get("error", "")]))
+        return outcome
+    try:
+        result = await asyncio.to_thread(mirror.execute, response["sql_query"], MAX_ROWS, EXECUTION_TIMEOUT)
+    except Exception as e:
+        outcome["status"] = "exec_error"
+        outcome["detail"] = str(e)
+        return outcome
+    rows = normalize_rows(result["rows"])
+    matched = same_results(rows, reference, item.get("order_matters", False))
+    outcome["status"] = "match" if matched else "mismatch"
+    if not matched:
+        outcome["detail"] = f"{len(rows)} rows vs {len(reference)} expected"
+    return outcome
+
+
+def summarize(outcomes):
+    total = len(outcomes)
+    statuses = Counter(outcome["status"] for outcome in outcomes)
+    latencies = sorted(outcome["latency_ms"] for outcome in outcomes)
+    usages = [outcome["usage"] for outcome in outcomes if outcome["usage"]]
+    parses = Counter(outcome["parse"] for outcome in outcomes if outcome["parse"])
+    parsed = sum(parses.values())
+    by_tag = {}
+    for outcome in outcomes:
+        for tag in outcome["tags"]:
+            entry = by_tag.setdefault(tag, {"total": 0, "matched": 0})
+            entry["total"] += 1
+            entry["matched"] += int(outcome["status"] == "match")
+    for entry in by_tag.values():
+        entry["accuracy"] = round(entry["matched"] / entry["total"], 4)
+    return {
+        "total": total,
+        "execution_accuracy": round(statuses["match"] / total, 4) if total else 0.0,
+        "statuses": {status: statuses[status] for status in STATUSES},
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies), 2) if latencies else None,
+            "p50": round(percentile(latencies, 0.5), 2),
+            "p95": round(percentile(latencies, 0.95), 2),
+            "p99": round(percentile(latencies, 0.99), 2),
+        },
+        "tokens_per_query": {
+            "prompt": round(statistics.fmean(u.get("prompt_tokens") or 0 for u in usages), 1) if usages else None,
+            "completion": round(statistics.fmean(u.get("completion_tokens") or 0 for u in usages), 1) if usages else None,
+            "cached": round(statistics.fmean(u.get("cached_tokens") or 0 for u in usages), 1) if usages else None,
+        },
+        "parse_modes": dict(parses),
+        "structured_rate": round(parses["structured"] / parsed, 4) if parsed else 0.0,
+        "fallback_rate": round((parsed - parses["structured"]) / parsed, 4) if parsed else 0.0,
+        "by_tag": dict(sorted(by_tag.items())),
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Regressions of ``current`` against a previous report (empty when none)"""
+    regressions = []
+    now, before = current["summary"], baseline["summary"]
+    if now["execution_accuracy"] < before["execution_accuracy"]:
+        regressions.append(f"accuracy {before['execution_accuracy']:.1%} -> {now['execution_accuracy']:.1%}")
+    if now["latency_ms"]["p95"] > before["latency_ms"]["p95"] * (1 + tolerance) + 1:
+        regressions.append(f"p95 {before['latency_ms']['p95']} -> {now['latency_ms']['p95']} ms")
+    for field in ("prompt", "completion"):
+        old, new = before["tokens_per_query"][field], now["tokens_per_query"][field]
+        if old and new and new > old * (1 + tolerance):
+            regressions.append(f"{field} tokens/query {old} -> {new}")
+    previous = {outcome["id"]: outcome["status"] for outcome in baseline["items"]}
+    for outcome in current["items"]:
+        if previous.get(outcome["id"]) == "match" and outcome["status"] != "match":
+            regressions.append(f"{outcome['id']} match -> {outcome['status']} ({outcome['question']})")
+    return regressions
+
+
+def print_report(report, verbose):
+    meta, summary = report["meta"], report["summary"]
+    print(f"{meta['mode']} {meta['provider']}/{meta['model']}  golden set {meta['golden_set']} "
+          f"({meta['golden_set_version']}), prompt {meta['prompt_hash']}")
+    print(f"execution accuracy {summary['execution_accuracy']:.1%} "
+          f"({summary['statuses']['match']}/{summary['total']})  "
+          + ", ".join(f"{status} {count}" for status, count in summary["statuses"].items() if count))
+    latency = summary["latency_ms"]
+    print(f"latency ms: mean {latency['mean']}  p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}")
+    tokens = summary["tokens_per_query"]
+    print(f"tokens/query: prompt {tokens['prompt']}  completion {tokens['completion']}  cached {tokens['cached']}")
+    print(f"parse: structured {summary['structured_rate']:.1%}, fallback {summary['fallback_rate']:.1%} "
+          f"({', '.join(f'{mode} {count}' for mode, count in summary['parse_modes'].items())})")
+    print("by tag: " + ", ".join(
+        f"{tag} {entry['matched']}/{entry['total']}" for tag, entry in summary["by_tag"].items()
+    ))
+    for outcome in report["items"]:
+        if verbose or outcome["status"] != "match":
+            print(f"  {outcome['id']} {outcome['status']:<12} {outcome['latency_ms']:>8.1f} ms  {outcome['question']}")
+            if outcome["status"] != "match":
+                print(f"      {outcome['sql']}")
+                if outcome["detail"]:
+                    print(f"      {outcome['detail']}")
+
+
+async def run(args, items):
+    from config import config
+    from services.sql_agent import SQLAgent
+    from services.sqlite_mirror import SQLiteMirror
+
+    agent = SQLAgent()
+    http_client = install_transport(agent, oracle_transport(items)) if args.oracle else None
+    mirror = SQLiteMirror(agent.schema_catalog, data_path=config.SAKILA_DATA_PATH or None, load_data=True)
+
+    references = {}
+    for item in items:
+        result = mirror.execute(item["sql"], MAX_ROWS, EXECUTION_TIMEOUT)
+        references[item["id"]] = normalize_rows(result["rows"])
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(
+        evaluate_item(agent, mirror, item, references[item["id"]], semaphore) for item in items
+    ))
+    elapsed = time.perf_counter() - started
+    if http_client is not None:
+        await http_client.aclose()
+    await agent.llm_client.aclose()
+    backend = agent.llm_client.router.primary
+    transport = agent.transport_stats()
+    return outcomes, elapsed, backend.provider, backend.model, agent.system_prompt_hash, transport
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--golden-set", default=DEFAULT_GOLDEN_SET)
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--replay", metavar="PATH", help="serve LLM answers from a recording")
+    mode.add_argument("--record", metavar="PATH", help="call the configured LLM and record its answers")
+    mode.add_argument("--oracle", action="store_true", help="answer with the reference SQL")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="replayed latency multiplier (0: none)")
+    parser.add_argument("--concurrency", type=int, default=4, help="questions in flight")
+    parser.add_argument("--log-level", default="CRITICAL", help="backend log level during the run")
+    parser.add_argument("--verbose", action="store_true", help="list every item, not only failures")
+    parser.add_argument("--save", metavar="PATH", help="write the report as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved report")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed relative latency/token regression")
+    args = parser.parse_args()
+
+    items, version = load_golden_set(args.golden_set)
+    if args.replay:
+        from models.llm_transport import read_meta
+
+        backends = read_meta(args.replay).get("backends") or [{}]
+        configure_backend("replay", args.replay, args.latency_scale, backends[0].get("provider"), backends[0].get("model"))
+    elif args.record:
+        # Append-only transport: start a fresh file so every exchange comes from this run
+        if os.path.exists(args.record):
+            os.remove(args.record)
+        configure_backend("record", args.record)
+    else:
+        configure_backend("live", None, provider="docker_runner", model="oracle")
+
+    logging.basicConfig(level=args.log_level)
+    logging.getLogger().setLevel(args.log_level)
+    outcomes, elapsed, provider, model, prompt_hash, transport = asyncio.run(run(args, items))
+
+    if args.record:
+        print(f"{transport['recorded']} exchanges recorded to {args.record}")
+    elif args.replay and transport["misses"]:
+        print(f"warning: {transport['misses']} requests are not in {args.replay} "
+              f"(prompt, model or settings changed since it was recorded)")
+
+    report = {
+        "meta": {
+            "mode": "record" if args.record else "oracle" if args.oracle else "replay",
+            "recording": args.record or args.replay,
+            "provider": provider,
+            "model": model,
+            "prompt_hash": prompt_hash,
+            "golden_set": os.path.basename(args.golden_set),
+            "golden_set_version": version,
+            "latency_scale": None if args.record else args.latency_scale,
+            "concurrency": args.concurrency,
+            "elapsed_s": round(elapsed, 3),
+            "python": platform.python_version(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "summary": summarize(outcomes),
+        "items": outcomes,
+    }
+    print_report(report, args.verbose)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+            f.write("\n")
+        print(f"report saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"REGRESSIONS vs {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"no regressions vs {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
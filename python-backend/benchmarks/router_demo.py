@@ -0,0 +1,133 @@
+"""Drive the LLM router against local stub servers.
+
+Starts in-process OpenAI-compatible stubs (see ``stub_openai_server.py``)
+and runs three scenarios through ``LLMRouter`` with real HTTP clients:
+
+- ``tail``: the primary is fast but 10% of its answers take 1.5 s; compares
+  latency percentiles with and without hedging.
+- ``slow``: the first backend is consistently slower; the router learns to
+  prefer the faster one.
+- ``dead``: the first backend refuses connections; requests fail over and
+  its circuit breaker opens so later requests skip it entirely.
+
+Usage:
+    python benchmarks/router_demo.py [--requests 200] [--concurrency 10] [--hedge-delay 0.3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn  # noqa: E402
+from openai import AsyncOpenAI  # noqa: E402
+
+from benchmarks.stub_openai_server import create_stub_app  # noqa: E402
+from models.router import CircuitBreaker, LLMBackend, LLMRouter  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def start_stub(**knobs):
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(create_stub_app(**knobs), host="127.0.0.1", port=port, log_level="error"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return port, server, task
+
+
+def make_backend(name, port):
+    client = AsyncOpenAI(base_url=f"http://127.0.0.1:{port}/v1", api_key="stub", max_retries=0, timeout=10)
+    return LLMBackend(name, "openai_compatible", client, f"{name}-model",
+                      breaker=CircuitBreaker(failure_threshold=3, reset_timeout=5))
+
+
+async def drive(router, requests, concurrency):
+    """Latencies (seconds) of ``requests`` calls with bounded concurrency"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await router.call(lambda backend: backend.client.chat.completions.create(
+                    model=backend.model, messages=[{"role": "user", "content": "Top 10 películas"}]
+                ))
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return sorted(latencies), errors
+
+
+def summary(label, latencies, errors, router):
+    def pct(q):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000 if latencies else float("nan")
+    stats = router.stats()
+    print(
+        f"  {label:<22} ok {len(latencies):4d}  errors {errors:3d}  "
+        f"mean {statistics.fmean(latencies) * 1000 if latencies else 0:7.1f} ms  "
+        f"p50 {pct(0.5):7.1f}  p95 {pct(0.95):7.1f}  p99 {pct(0.99):7.1f}  "
+        f"hedged {stats['hedged']}  hedge_wins {stats['hedge_wins']}  failovers {stats['failovers']}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--hedge-delay", type=float, default=0.3)
+    parser.add_argument("-v", "--verbose", action="store_true", help="print per-backend router stats")
+    args = parser.parse_args()
+
+    stubs = []
+    try:
+        tail_port, *rest = await start_stub(name="tail", latency=0.1, jitter=0.02, tail_rate=0.1, tail_latency=1.5, seed=1)
+        stubs.append(rest)
+        fast_port, *rest = await start_stub(name="fast", latency=0.15, jitter=0.02, seed=2)
+        stubs.append(rest)
+        slow_port, *rest = await start_stub(name="slow", latency=0.5, jitter=0.05, seed=3)
+        stubs.append(rest)
+        dead_port = free_port()  # nothing listens here
+
+        print("tail: primary with a 10% slow tail, backup without")
+        for hedge_delay in (0.0, args.hedge_delay):
+            router = LLMRouter([make_backend("tail", tail_port), make_backend("fast", fast_port)], hedge_delay=hedge_delay)
+            latencies, errors = await drive(router, args.requests, args.concurrency)
+            summary(f"hedge_delay={hedge_delay}", latencies, errors, router)
+            if args.verbose:
+                print(json.dumps(router.stats()["backends"], indent=2))
+
+        print("slow: first backend 0.5 s, second 0.15 s")
+        router = LLMRouter([make_backend("slow", slow_port), make_backend("fast", fast_port)])
+        latencies, errors = await drive(router, args.requests, args.concurrency)
+        summary("latency-aware", latencies, errors, router)
+        print("    " + ", ".join(f"{b['name']}: {b['wins']} wins" for b in router.stats()["backends"]))
+
+        print("dead: first backend refuses connections")
+        router = LLMRouter([make_backend("dead", dead_port), make_backend("fast", fast_port)])
+        latencies, errors = await drive(router, args.requests, args.concurrency)
+        summary("failover", latencies, errors, router)
+        dead = router.stats()["backends"][0]
+        print(f"    dead backend: {dead['requests']} attempts, breaker {dead['state']} (opened {dead['breaker_opened']}x)")
+    finally:
+        for server, task in stubs:
+            server.should_exit = True
+        await asyncio.gather(*(task for _, task in stubs), return_exceptions=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+"""Replay a query log through the lexical similarity index.
+
+Reports how many queries would be served by exact cache hits, reused from a
+near-duplicate or adapted with the short prompt, plus lookup latency and the
+LLM time saved under the given latency assumptions.
+
+Usage:
+    python benchmarks/similarity_eval.py [query_log.txt|.jsonl] [--llm-ms 4000] [--adapt-ms 1500]
+
+A ``.jsonl`` log may carry a ``latency_ms`` field per line with the observed
+generation time; otherwise ``--llm-ms`` is used.
+
+Also checks that question pairs whose SQL differs (negation, prepositions,
+count vs listing) are never served by reuse; exits with status 1 if one is.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.normalization import normalize_query  # noqa: E402
+from services.similarity_index import SimilarityIndex  # noqa: E402
+
+DEFAULT_LOG = os.path.join(os.path.dirname(__file__), "data", "query_log_sample.txt")
+
+# (indexed question, new question): similar wording, different SQL
+MUST_NOT_REUSE = [
+    ("Clientes que han alquilado películas", "Clientes que no han alquilado películas"),
+    ("Películas con categoría", "Películas sin categoría"),
+    ("Alquileres antes de 2005", "Alquileres desde 2005"),
+    ("¿Cuántos clientes hay en Madrid?", "Lista los clientes de Madrid"),
+    ("Lista los clientes de Madrid", "¿Cuántos clientes hay en Madrid?"),
+    ("Pagos entre 2005 y 2006", "Pagos de 2005 y 2006"),
+    ("Actores de películas de acción", "Películas de actores de acción"),
+    ("¿Quién alquiló más películas en 2005?", "¿Cuándo alquiló más películas en 2005?"),
+    ("clientes que alquilaron dos películas", "clientes que alquilaron películas"),
+    ("películas de acción y comedia", "películas de acción o comedia"),
+    ("la película más alquilada", "las películas más alquiladas"),
+]
+
+
+def load_log(path):
+    """Yield (query, latency_ms or None) from a text or JSONL log"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                record = json.loads(line)
+                yield record["query"], record.get("latency_ms")
+            else:
+                yield line, None
+
+
+def replay(entries, index, llm_ms, adapt_ms, verbose=False):
+    exact_keys = set()
+    outcome = {"exact": 0, "reuse": 0, "adapt": 0, "miss": 0}
+    saved_ms = 0.0
+    lookup_us = []
+
+    for query, latency_ms in entries:
+        cost_ms = latency_ms if latency_ms is not None else llm_ms
+        key = normalize_query(query)
+        if key in exact_keys:
+            outcome["exact"] += 1
+            saved_ms += cost_ms
+            if verbose:
+                print(f"  exact  {query}")
+            continue
+
+        start = time.perf_counter()
+        match = index.lookup(query)
+        lookup_us.append((time.perf_counter() - start) * 1e6)
+
+        if match is None:
+            outcome["miss"] += 1
+        elif match["mode"] == "reuse":
+            outcome["reuse"] += 1
+            saved_ms += cost_ms
+        else:
+            outcome["adapt"] += 1
+            saved_ms += max(cost_ms - adapt_ms, 0.0)
+
+        if verbose:
+            label = "miss" if match is None else match["mode"]
+            detail = "" if match is None else f"  ({match['score']:.3f} ~ {match['matched_query']})"
+            print(f"  {label:<6} {query}{detail}")
+
+        exact_keys.add(key)
+        index.add(query, {"sql_query": f"-- generated for: {query}"})
+
+    return outcome, saved_ms, lookup_us
+
+
+def check_regressions(reuse_threshold, adapt_threshold, verbose=False):
+    """Pairs of ``MUST_NOT_REUSE`` that the index would wrongly serve by reuse"""
+    failures = []
+    for indexed, asked in MUST_NOT_REUSE:
+        index = SimilarityIndex(reuse_threshold=reuse_threshold, adapt_threshold=adapt_threshold)
+        index.add(indexed, {"sql_query": f"-- generated for: {indexed}"})
+        match = index.lookup(asked)
+        label = "miss" if match is None else match["mode"]
+        if label == "reuse":
+            failures.append((indexed, asked))
+        if verbose:
+            score = "" if match is None else f" ({match['score']:.3f})"
+            print(f"  {label:<6} {asked} ~ {indexed}{score}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", nargs="?", default=DEFAULT_LOG)
+    parser.add_argument("--llm-ms", type=float, default=4000.0, help="full generation latency")
+    parser.add_argument("--adapt-ms", type=float, default=1500.0, help="adapt-prompt generation latency")
+    parser.add_argument("--reuse-threshold", type=float, default=0.97)
+    parser.add_argument("--adapt-threshold", type=float, default=0.75)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    entries = list(load_log(args.log))
+    index = SimilarityIndex(reuse_threshold=args.reuse_threshold, adapt_threshold=args.adapt_threshold)
+    outcome, saved_ms, lookup_us = replay(entries, index, args.llm_ms, args.adapt_ms, args.verbose)
+
+    total = len(entries)
+    baseline_ms = sum(lat if lat is not None else args.llm_ms for _, lat in entries)
+    hits = outcome["exact"] + outcome["reuse"] + outcome["adapt"]
+    lookup_us.sort()
+    print(f"Queries replayed:     {total}")
+    print(f"Exact cache hits:     {outcome['exact']}")
+    print(f"Similarity reuse:     {outcome['reuse']}")
+    print(f"Similarity adapt:     {outcome['adapt']}")
+    print(f"Misses (full prompt): {outcome['miss']}")
+    print(f"Hit rate:             {hits / total:.1%}" if total else "Hit rate: n/a")
+    if lookup_us:
+        print(f"Lookup latency:       p50 {lookup_us[len(lookup_us) // 2]:.1f} us, "
+              f"max {lookup_us[-1]:.1f} us")
+    print(f"LLM time saved:       {saved_ms / 1000:.1f} s of {baseline_ms / 1000:.1f} s "
+          f"({saved_ms / baseline_ms:.1%})" if baseline_ms else "")
+
+    failures = check_regressions(args.reuse_threshold, args.adapt_threshold, args.verbose)
+    print(f"Wrong reuse checks:   {len(MUST_NOT_REUSE) - len(failures)}/{len(MUST_NOT_REUSE)} passed")
+    for indexed, asked in failures:
+        print(f"  REUSED {asked!r} from {indexed!r}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Micro-benchmark of the parser-based SQL validator.
+
+Runs a corpus of representative generated queries through
+``SQLValidator.validate`` and reports the per-query cost, next to the
+substring checks it replaced.
+
+Usage:
+    python benchmarks/sql_validator_bench.py [--iterations 2000] [-v]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.schema_catalog import SchemaCatalog  # noqa: E402
+from services.sql_validator import SQLValidator  # noqa: E402
+
+CORPUS = [
+    "SELECT titulo, descripcion FROM pelicula WHERE clasificacion = 'PG' LIMIT 10;",
+    "SELECT c.nombre, c.apellidos, SUM(p.total) AS total_gastado FROM cliente c "
+    "JOIN pago p ON c.id_cliente = p.id_cliente GROUP BY c.id_cliente, c.nombre, c.apellidos "
+    "ORDER BY total_gastado DESC LIMIT 10;",
+    "SELECT p.titulo, COUNT(a.id_alquiler) AS veces_alquilada FROM pelicula p "
+    "JOIN inventario i ON p.id_pelicula = i.id_pelicula JOIN alquiler a ON i.id_inventario = a.id_inventario "
+    "GROUP BY p.id_pelicula, p.titulo ORDER BY veces_alquilada DESC LIMIT 10;",
+    "SELECT c.nombre, c.apellidos, ci.nombre AS ciudad FROM cliente c "
+    "JOIN direccion d ON c.id_direccion = d.id_direccion JOIN ciudad ci ON d.id_ciudad = ci.id_ciudad "
+    "WHERE ci.nombre = 'Madrid';",
+    "SELECT cat.nombre, COUNT(*) AS total FROM categoria cat "
+    "JOIN pelicula_categoria pc ON cat.id_categoria = pc.id_categoria GROUP BY cat.nombre;",
+    "SELECT a.nombre, a.apellidos FROM actor a WHERE a.id_actor IN "
+    "(SELECT pa.id_actor FROM pelicula_actor pa GROUP BY pa.id_actor HAVING COUNT(*) > 30);",
+    "SELECT EXTRACT(YEAR FROM fecha_pago) AS anio, SUM(total) FROM pago GROUP BY anio;",
+    "SELECT * FROM alquiler WHERE fecha_devolucion IS NULL;",
+    "SELECT titulo FROM pelicula; DROP TABLE pelicula;",
+    "SELECT titulo INTO OUTFILE '/tmp/peliculas.csv' FROM pelicula;",
+]
+
+
+def legacy_validate(sql_query):
+    """The substring checks used before the parser (for comparison only)"""
+    sql_lower = sql_query.lower().strip()
+    has_dangerous = any(k in sql_lower for k in ['drop', 'delete', 'truncate', 'alter', 'create'])
+    is_select = sql_lower.startswith('select')
+    return {"is_select": is_select, "is_valid": is_select and not has_dangerous}
+
+
+def measure(function, iterations):
+    """Per-query timings in microseconds, one sample per corpus pass"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        for sql in CORPUS:
+            function(sql)
+        samples.append((time.perf_counter() - start) / len(CORPUS) * 1e6)
+    samples.sort()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("-v", "--verbose", action="store_true", help="print the validation of each query")
+    args = parser.parse_args()
+
+    catalog = SchemaCatalog.from_file(os.getenv("SAKILA_SCHEMA_PATH") or None)
+    validator = SQLValidator(catalog)
+
+    if args.verbose:
+        for sql in CORPUS:
+            result = validator.validate(sql)
+            print(f"{'OK ' if result['is_valid'] else 'ERR'} {sql[:70]}")
+            for message in result["errors"] + result["warnings"]:
+                print(f"      {message}")
+
+    for name, function in (("parser", validator.validate), ("legacy substring", legacy_validate)):
+        samples = measure(function, args.iterations)
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        print(
+            f"{name:>17}: mean {statistics.fmean(samples):7.1f} us/query  "
+            f"p50 {samples[len(samples) // 2]:7.1f}  p99 {p99:7.1f}"
+        )
+    print(f"schema catalog: {'loaded' if catalog is not None else 'not available (schema checks skipped)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Minimal OpenAI-compatible chat completions server for local tests.
+
+Answers ``POST /v1/chat/completions`` (plain and ``stream: true``) with SQL
+JSON responses after a configurable latency, and fails a configurable share
+of requests with HTTP 500. The latency follows a distribution (uniform
+``latency`` ± ``jitter``, lognormal with median ``latency`` and sigma
+``jitter``, or exponential with mean ``latency``) with an optional slow
+tail, plus prompt processing at ``prefill_rate`` tokens per second and
+generation time at ``token_rate`` tokens per second. Like a llama.cpp slot,
+the server keeps the previous prompt: the prefix shared with it is not
+processed again and is reported as ``cached_tokens`` (unless the request
+sends ``cache_prompt: false``). A share of
+the answers can be malformed the way small local models write them (code
+fences, prose around the JSON, unescaped quotes, truncation...).
+
+Useful as a fake backend for the LLM router
+(``LLM_BACKENDS=stub=http://127.0.0.1:9001/v1|stub-model``) and for the
+load tests in ``load_test.py``.
+
+Usage:
+    python benchmarks/stub_openai_server.py [--port 9001] [--latency 0.2] [--jitter 0.05] [--error-rate 0]
+        [--distribution uniform|lognormal|exponential] [--token-rate 0] [--prefill-rate 0] [--malformed-rate 0]
+        [--tail-rate 0 --tail-latency 2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+
+from benchmarks.json_extract_bench import ANSWERS, MUTATIONS  # noqa: E402
+
+DEFAULT_CONTENT = json.dumps({
+    "sql_query": "SELECT titulo FROM pelicula LIMIT 10;",
+    "explanation": "Lista de películas.",
+    "considerations": "Sin filtros.",
+    "alternatives": "Ordenar por título.",
+}, ensure_ascii=False)
+
+DISTRIBUTIONS = ("uniform", "lognormal", "exponential")
+# How docker_runner models break the JSON: the fuzz mutations plus truncation and plain prose
+MALFORMED_KINDS = tuple(kind for kind in MUTATIONS if kind not in ("plain", "indented")) + ("truncated", "prose")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+def malformed_answer(answer: dict, kind: str, rng: random.Random) -> str:
+    if kind == "truncated":
+        text = json.dumps(answer, ensure_ascii=False)
+        return text[:rng.randint(len(text) // 3, len(text) - 2)]
+    if kind == "prose":
+        return f"Claro, esta es la consulta:\n\n{answer['sql_query']}\n\n{answer['explanation']}"
+    return MUTATIONS[kind](answer)
+
+
+def create_stub_app(name: str = "stub", latency: float = 0.2, jitter: float = 0.0,
+                    error_rate: float = 0.0, tail_rate: float = 0.0, tail_latency: float = 2.0,
+                    content: Optional[str] = DEFAULT_CONTENT, seed: int = 0, distribution: str = "uniform",
+                    token_rate: float = 0.0, malformed_rate: float = 0.0, prefill_rate: float = 0.0) -> FastAPI:
+    """FastAPI app imitating the chat completions endpoint; ``app.state`` holds the knobs.
+
+    With ``content=None`` the answers rotate over the benchmark SQL answers
+    and ``malformed_rate`` of them are malformed.
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"distribution must be one of {DISTRIBUTIONS}")
+    app = FastAPI(title=f"Stub OpenAI server ({name})")
+    app.state.latency = latency
+    app.state.jitter = jitter
+    app.state.error_rate = error_rate
+    app.state.tail_rate = tail_rate
+    app.state.tail_latency = tail_latency
+    app.state.distribution = distribution
+    app.state.token_rate = token_rate
+    app.state.malformed_rate = malformed_rate
+    app.state.prefill_rate = prefill_rate
+    app.state.last_prompt = ""
+    app.state.cached_tokens = 0
+    app.state.content = content
+    app.state.requests = 0
+    app.state.malformed = 0
+    rng = random.Random(seed)
+
+    def sample_latency() -> float:
+        state = app.state
+        if rng.random() < state.tail_rate:
+            return state.tail_latency
+        if state.latency <= 0:
+            return 0.0
+        if state.distribution == "lognormal":
+            return state.latency * rng.lognormvariate(0, state.jitter)
+        if state.distribution == "exponential":
+            return rng.expovariate(1 / state.latency)
+        return max(0.0, state.latency + rng.uniform(-state.jitter, state.jitter))
+
+    def answer_text() -> str:
+        if app.state.content is not None:
+            return app.state.content
+        answer = ANSWERS[app.state.requests % len(ANSWERS)]
+        if rng.random() < app.state.malformed_rate:
+            app.state.malformed += 1
+            return malformed_answer(answer, rng.choice(MALFORMED_KINDS), rng)
+        return json.dumps(answer, ensure_ascii=False)
+
+    def prefill(body):
+        """Prompt and cached token counts; the cache holds the previous prompt only"""
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        cached = 0
+        if body.get("cache_prompt", True):
+            cached = len(os.path.commonprefix([prompt, app.state.last_prompt])) // 4
+        app.state.last_prompt = prompt
+        app.state.cached_tokens += cached
+        return estimate_tokens(prompt), cached
+
+    def usage(tokens, text):
+        prompt, cached = tokens
+        completion_tokens = estimate_tokens(text)
+        return {"prompt_tokens": prompt, "completion_tokens": completion_tokens,
+                "total_tokens": prompt + completion_tokens, "prompt_tokens_details": {"cached_tokens": cached}}
+
+    def completion(model, tokens, text):
+        return {
+            "id": f"chatcmpl-{name}-{app.state.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": usage(tokens, text),
+        }
+
+    def chunk(model, delta, finish_reason=None, usage=None):
+        payload = {
+            "id": f"chatcmpl-{name}-{app.state.requests}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+        }
+        if usage is not None:
+            payload["usage"] = usage
+        return "data: " + json.dumps(payload, ensure_ascii=False) + "\n\n"
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "name": name}
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": f"{name}-model", "object": "model"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(body: dict):
+        app.state.requests += 1
+        delay = sample_latency()
+        model = body.get("model", f"{name}-model")
+        if rng.random() < app.state.error_rate:
+            await asyncio.sleep(delay / 4)
+            return JSONResponse({"error": {"message": f"{name}: simulated failure"}}, status_code=500)
+
+        text = answer_text()
+        tokens = prefill(body)
+        if app.state.prefill_rate > 0:
+            delay += (tokens[0] - tokens[1]) / app.state.prefill_rate
+        generation = estimate_tokens(text) / app.state.token_rate if app.state.token_rate > 0 else 0.0
+        if not body.get("stream"):
+            await asyncio.sleep(delay + generation)
+            return completion(model, tokens, text)
+
+        async def events():
+            pieces = [text[i:i + 16] for i in range(0, len(text), 16)]
+            # Without a token rate, half the latency is time to first token and half is spread over the chunks
+            first, rest = (delay, generation) if generation else (delay / 2, delay / 2)
+            await asyncio.sleep(first)
+            for piece in pieces:
+                yield chunk(model, {"content": piece})
+                await asyncio.sleep(rest / len(pieces))
+            yield chunk(model, {}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk(model, {}, usage=usage(tokens, text))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--name", default="stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per completion (median for lognormal)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="uniform spread, or lognormal sigma")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="uniform")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="completion tokens per second (0: instant)")
+    parser.add_argument("--prefill-rate", type=float, default=0.0, help="uncached prompt tokens per second (0: instant)")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of malformed JSON answers")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="share of requests that take --tail-latency")
+    parser.add_argument("--tail-latency", type=float, default=2.0)
+    args = parser.parse_args()
+
+    app = create_stub_app(
+        args.name, args.latency, args.jitter, args.error_rate, args.tail_rate, args.tail_latency,
+        content=None if args.malformed_rate else DEFAULT_CONTENT, distribution=args.distribution,
+        token_rate=args.token_rate, malformed_rate=args.malformed_rate, prefill_rate=args.prefill_rate
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,17 +19,172 @@ class Config:
     )
     DOCKER_RUNNER_MODEL = os.getenv("DOCKER_RUNNER_MODEL", "ai/smollm2:latest")
     
+    # LLM Concurrency Configuration
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 32))
+    LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", 256))
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 30))
+    LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", 60))
+    
+    # Query Result Cache Configuration
+    QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+    QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 1024))
+    QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", 86400))
+    QUERY_CACHE_SQLITE_PATH = os.getenv("QUERY_CACHE_SQLITE_PATH", "")
+    QUERY_CACHE_DISK_TIMEOUT = float(os.getenv("QUERY_CACHE_DISK_TIMEOUT", 0.05))  # seconds to wait for a locked disk tier
+    QUERY_CACHE_SEED_FILE = os.getenv("QUERY_CACHE_SEED_FILE", "")  # LLM recording loaded into the cache at startup
+    
+    # Similarity Index Configuration (near-duplicate query reuse)
+    SIMILARITY_INDEX_ENABLED = os.getenv("SIMILARITY_INDEX_ENABLED", "true").lower() == "true"
+    SIMILARITY_REUSE_THRESHOLD = float(os.getenv("SIMILARITY_REUSE_THRESHOLD", 0.97))
+    SIMILARITY_ADAPT_THRESHOLD = float(os.getenv("SIMILARITY_ADAPT_THRESHOLD", 0.75))
+    SIMILARITY_MAX_ENTRIES = int(os.getenv("SIMILARITY_MAX_ENTRIES", 5000))
+    
+    # Prompt Pruning Configuration (send only the tables relevant to each query)
+    PROMPT_PRUNING_ENABLED = os.getenv("PROMPT_PRUNING_ENABLED", "true").lower() == "true"
+    PROMPT_MAX_TABLES = int(os.getenv("PROMPT_MAX_TABLES", 8))
+    SAKILA_SCHEMA_PATH = os.getenv("SAKILA_SCHEMA_PATH", "")
+    
+    # Batch Generation Configuration
+    BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", 1000))
+    BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", 8))
+    
+    # Cost Estimation Configuration (offline, from the Sakila schema and data dumps)
+    COST_ESTIMATION_ENABLED = os.getenv("COST_ESTIMATION_ENABLED", "true").lower() == "true"
+    COST_MAX_RESULT_ROWS = int(os.getenv("COST_MAX_RESULT_ROWS", 1000))
+    COST_MAX_SCAN_ROWS = int(os.getenv("COST_MAX_SCAN_ROWS", 10000))
+    COST_DEFAULT_LIMIT = int(os.getenv("COST_DEFAULT_LIMIT", 100))
+    COST_AUTO_LIMIT = os.getenv("COST_AUTO_LIMIT", "false").lower() == "true"
+    SAKILA_DATA_PATH = os.getenv("SAKILA_DATA_PATH", "")
+    
+    # Self-Repair Configuration (dry-run on an in-memory SQLite mirror of Sakila)
+    SQL_REPAIR_ENABLED = os.getenv("SQL_REPAIR_ENABLED", "false").lower() == "true"
+    SQL_REPAIR_MAX_RETRIES = int(os.getenv("SQL_REPAIR_MAX_RETRIES", 1))
+    SQLITE_MIRROR_LOAD_DATA = os.getenv("SQLITE_MIRROR_LOAD_DATA", "false").lower() == "true"
+    
+    # LLM Router Configuration (several backends with failover, hedging and circuit breakers)
+    LLM_BACKENDS = os.getenv("LLM_BACKENDS", "")  # e.g. "docker_runner,openai"; empty: only LLM_PROVIDER
+    LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", 0))  # seconds; 0 disables hedging
+    LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", 0))  # per backend; 0: only LLM_REQUEST_TIMEOUT
+    LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 3))
+    LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", 30))
+    LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", 100))
+    
+    # HTTP Connection Pool Configuration (shared by the LLM clients and health probes)
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+    HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+    HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+    HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", 3))
+    
+    # LLM Transport Configuration (live, or record/replay LLM exchanges in LLM_TRANSPORT_FILE)
+    LLM_TRANSPORT = os.getenv("LLM_TRANSPORT", "live")  # live, record or replay
+    LLM_TRANSPORT_FILE = os.getenv("LLM_TRANSPORT_FILE", "llm-recording.jsonl")
+    LLM_REPLAY_LATENCY_SCALE = float(os.getenv("LLM_REPLAY_LATENCY_SCALE", 0))  # x recorded latency; 0: instant
+    LLM_REPLAY_LATENCY_MS = float(os.getenv("LLM_REPLAY_LATENCY_MS", 0))  # fixed delay added to each answer
+    
+    # Health Monitor Configuration (background LLM probes; /health answers from memory)
+    HEALTH_MONITOR_ENABLED = os.getenv("HEALTH_MONITOR_ENABLED", "true").lower() == "true"
+    HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", 15))
+    HEALTH_CHECK_JITTER = float(os.getenv("HEALTH_CHECK_JITTER", 0.2))  # fraction of the interval
+    HEALTH_MAX_BACKOFF = float(os.getenv("HEALTH_MAX_BACKOFF", 120))
+    HEALTH_DOWN_AFTER = int(os.getenv("HEALTH_DOWN_AFTER", 3))
+    HEALTH_RECOVER_AFTER = int(os.getenv("HEALTH_RECOVER_AFTER", 2))
+    
+    # Prompt Caching Configuration (stable prompt prefix; cache hints for OpenAI and llama.cpp)
+    PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_SLOT = int(os.getenv("LLM_CACHE_SLOT", -1))  # llama.cpp slot to pin requests to; -1: server picks
+    
+    # Request Coalescing Configuration (identical concurrent queries share one generation)
+    SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+    
+    # LLM Rate Limit Configuration (provider TPM/RPM budget; limits are for all workers together)
+    LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", 0))  # tokens per minute; 0 disables
+    LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", 0))  # requests per minute; 0 disables
+    LLM_RATE_MAX_WAIT = float(os.getenv("LLM_RATE_MAX_WAIT", 30))
+    
+    # Usage Accounting Configuration (tokens and cost per client; prices per 1M tokens)
+    USAGE_MAX_CLIENTS = int(os.getenv("USAGE_MAX_CLIENTS", 10000))
+    LLM_PRICE_INPUT = float(os.getenv("LLM_PRICE_INPUT", 0))
+    LLM_PRICE_CACHED_INPUT = float(os.getenv("LLM_PRICE_CACHED_INPUT", 0))
+    LLM_PRICE_OUTPUT = float(os.getenv("LLM_PRICE_OUTPUT", 0))
+    
+    # Query Execution Configuration (/generate-and-run: MySQL through aiomysql, or the SQLite mirror)
+    QUERY_EXECUTION_ENABLED = os.getenv("QUERY_EXECUTION_ENABLED", "false").lower() == "true"
+    EXECUTION_BACKEND = os.getenv("EXECUTION_BACKEND", "mysql")  # mysql or sqlite
+    DB_HOST = os.getenv("DB_HOST", "localhost")
+    DB_PORT = int(os.getenv("DB_PORT", 3306))
+    DB_USER = os.getenv("DB_USER", "root")
+    DB_PASSWORD = os.getenv("DB_PASSWORD", "")
+    DB_NAME = os.getenv("DB_NAME", "sakila_es")
+    DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+    EXECUTION_MAX_ROWS = int(os.getenv("EXECUTION_MAX_ROWS", 10000))
+    EXECUTION_TIMEOUT = float(os.getenv("EXECUTION_TIMEOUT", 10))  # seconds per query, including streaming
+    EXECUTION_BATCH_ROWS = int(os.getenv("EXECUTION_BATCH_ROWS", 500))
+    
+    # Result Set Cache Configuration (rows of /generate-and-run keyed by normalized SQL; invalidation shared by workers)
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 256))
+    RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", 64))
+    RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 3600))
+    
+    # Admin Configuration (token required by maintenance endpoints such as POST /result-cache/invalidate)
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # empty: those endpoints are disabled
+    
+    # Startup Configuration (the agent is built in the background; /health/ready reports when it is done)
+    STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "false").lower() == "true"  # one throwaway LLM generation
+    
     # Server Configuration
     PORT = int(os.getenv("PORT", 5000))
     DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+    WORKERS = int(os.getenv("WORKERS", 1))  # worker processes; >1 shares cache and LLM budget via SQLite
+    SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "")  # default: a file in the temp dir
+    
+    @classmethod
+    def llm_backend_entries(cls):
+        """Configured LLM backends in priority order (LLM_BACKENDS, or just LLM_PROVIDER)"""
+        entries = [entry.strip() for entry in cls.LLM_BACKENDS.split(",") if entry.strip()]
+        return entries or [cls.LLM_PROVIDER]
+    
+    @classmethod
+    def shared_state_path(cls):
+        """SQLite file holding cross-worker leases and counters ('' with a single worker)"""
+        if cls.WORKERS <= 1:
+            return ""
+        return cls.SHARED_STATE_PATH or os.path.join(tempfile.gettempdir(), f"sql-agent-{cls.PORT}-state.db")
+    
+    @classmethod
+    def query_cache_path(cls):
+        """Disk tier of the query cache; with several workers it defaults to a file they share"""
+        if cls.QUERY_CACHE_SQLITE_PATH or cls.WORKERS <= 1:
+            return cls.QUERY_CACHE_SQLITE_PATH
+        return os.path.join(tempfile.gettempdir(), f"sql-agent-{cls.PORT}-cache.db")
     
     @classmethod
     def validate(cls):
         """Validate configuration"""
-        if cls.LLM_PROVIDER == "openai" and not cls.OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY is required when using OpenAI provider")
-        
         if cls.LLM_PROVIDER not in ["openai", "docker_runner"]:
             raise ValueError("LLM_PROVIDER must be either 'openai' or 'docker_runner'")
+        if cls.WORKERS < 1:
+            raise ValueError("WORKERS must be at least 1")
+        if cls.EXECUTION_BACKEND not in ["mysql", "sqlite"]:
+            raise ValueError("EXECUTION_BACKEND must be either 'mysql' or 'sqlite'")
+        if cls.LLM_TRANSPORT not in ["live", "record", "replay"]:
+            raise ValueError("LLM_TRANSPORT must be 'live', 'record' or 'replay'")
+        if cls.LLM_TRANSPORT == "replay" and not os.path.exists(cls.LLM_TRANSPORT_FILE):
+            raise ValueError(f"LLM_TRANSPORT_FILE {cls.LLM_TRANSPORT_FILE} not found (required to replay)")
+        
+        for entry in cls.llm_backend_entries():
+            # Replayed answers need no key
+            if entry == "openai" and not cls.OPENAI_API_KEY and cls.LLM_TRANSPORT != "replay":
+                raise ValueError("OPENAI_API_KEY is required when using OpenAI provider")
+            if entry not in ["openai", "docker_runner"]:
+                name, _, target = entry.partition("=")
+                base_url, _, model = target.partition("|")
+                if not (name and base_url and model):
+                    raise ValueError(
+                        f"Invalid LLM_BACKENDS entry '{entry}': use 'openai', 'docker_runner' or 'name=base_url|model'"
+                    )
 
 config = Config()
\ No newline at end of file
@@ -0,0 +1,130 @@
+import importlib.util
+import logging
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# httpcore trace events that mean a new connection was set up
+_CONNECT_EVENT = "connection.connect_tcp.complete"
+_TLS_EVENT = "connection.start_tls.complete"
+
+
+def _h2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class _InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Counts requests and new connections on the way to the real transport"""
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport, pool: "HTTPPool"):
+        self._transport = transport
+        self._pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        pool = self._pool
+        previous = request.extensions.get("trace")
+        request.extensions["trace"] = pool._trace if previous is None else _chain(pool._trace, previous)
+        pool.requests += 1
+        pool.in_flight += 1
+        pool.peak_in_flight = max(pool.peak_in_flight, pool.in_flight)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            pool.errors += 1
+            raise
+        finally:
+            pool.in_flight -= 1
+        version = response.extensions.get("http_version", b"HTTP/1.1").decode("ascii", "replace")
+        pool.http_versions[version] = pool.http_versions.get(version, 0) + 1
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def _chain(first, second):
+    async def trace(event_name: str, info: Dict[str, Any]):
+        await first(event_name, info)
+        await second(event_name, info)
+    return trace
+
+
+class HTTPPool:
+    """Shared ``httpx.AsyncClient`` for LLM traffic and health probes.
+
+    One keep-alive connection pool (per origin) serves every backend client
+    and probe, so repeated calls reuse warm TCP/TLS connections instead of
+    opening new ones. HTTP/2 is negotiated over TLS when the optional ``h2``
+    package is installed. ``stats`` reports pool occupancy and how many
+    connections were opened, which exposes connection churn.
+    ``wrap_transport`` may wrap or replace the network transport (see
+    ``models.llm_transport``).
+    """
+
+    def __init__(self, max_connections: int = 100, max_keepalive: int = 20,
+                 keepalive_expiry: float = 30.0, connect_timeout: float = 5.0,
+                 read_timeout: float = 60.0, http2: bool = True,
+                 wrap_transport: Optional[Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport]] = None):
+        self.http2 = http2 and _h2_available()
+        if http2 and not self.http2:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.errors = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self.http_versions: Dict[str, int] = {}
+        self._transport = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+        self.transport = self._transport if wrap_transport is None else wrap_transport(self._transport)
+        self.client = httpx.AsyncClient(
+            transport=_InstrumentedTransport(self.transport, self),
+            timeout=self.timeout
+        )
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]):
+        if event_name == _CONNECT_EVENT:
+            self.connections_opened += 1
+        elif event_name == _TLS_EVENT:
+            self.tls_handshakes += 1
+
+    def _connections(self) -> Optional[list]:
+        # httpcore does not expose pool occupancy publicly; read it defensively
+        pool = getattr(self._transport, "_pool", None)
+        connections = getattr(pool, "connections", None)
+        return list(connections) if connections is not None else None
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool limits, occupancy and connection churn counters"""
+        stats = {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "connect_timeout": self.timeout.connect,
+            "read_timeout": self.timeout.read,
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "errors": self.errors,
+            "connections_opened": self.connections_opened,
+            "tls_handshakes": self.tls_handshakes,
+            "reuse_ratio": round(1 - self.connections_opened / self.requests, 4) if self.requests else 0.0,
+            "http_versions": dict(self.http_versions),
+        }
+        connections = self._connections()
+        if connections is not None:
+            idle = sum(1 for connection in connections if connection.is_idle())
+            stats.update({"connections": len(connections), "idle": idle, "active": len(connections) - idle})
+        return stats
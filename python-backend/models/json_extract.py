@@ -0,0 +1,191 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# First "{" that plausibly opens an object (a key or "}" follows), so braces in
+# a preamble such as "aquí tienes el {json}" are skipped
+_OBJECT_START_RE = re.compile(r"""\{\s*(?:["'}]|[A-Za-z_]\w*\s*:)""")
+_WS_RE = re.compile(r"\s*")
+# String body up to the next unescaped quote (or the end of the text)
+_STRING_BODY_RE = {
+    '"': re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL),
+    "'": re.compile(r"[^'\\]*(?:\\.[^'\\]*)*", re.DOTALL),
+}
+# A quote only closes a value if the JSON structure continues after it; otherwise
+# it is an unescaped quote inside the value (typical of SQL string literals)
+_VALUE_END_RE = re.compile(r"""\s*(?:[}\]]|,\s*(?:["'}\]]|[A-Za-z_]\w*\s*:|$)|$)""")
+_KEY_END_RE = re.compile(r"\s*(?::|$)")
+_BARE_RE = re.compile(r"""[^\s,:{}\[\]"']+""")
+# Unquoted object value: runs to the end of the line or the next "key:"
+_BARE_VALUE_RE = re.compile(r"""(?:[^,}\]\n]|,(?!\s*["']?\w+["']?\s*:))+""")
+_ESCAPE_RE = re.compile(r"\\(?:u([0-9a-fA-F]{4})|(.)|$)", re.DOTALL)
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+_FENCE_RE = re.compile(r"```[\w-]*[ \t]*\n?(.*?)(?:```|$)", re.DOTALL)
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+
+_decoder = json.JSONDecoder()
+
+
+def decode_string(raw: str) -> str:
+    """Unescape the body of a JSON string, keeping unknown escapes such as ``\\'``"""
+    if "\\" not in raw:
+        return raw
+    return _ESCAPE_RE.sub(_unescape, raw)
+
+
+def _unescape(match: re.Match) -> str:
+    if match.group(1):
+        return chr(int(match.group(1), 16))
+    ch = match.group(2)
+    if ch is None:
+        return ""  # dangling backslash of a truncated string
+    return _ESCAPES.get(ch, ch)
+
+
+def strip_code_fence(text: str) -> str:
+    """Content of the first Markdown code fence, or the text itself"""
+    match = _FENCE_RE.search(text)
+    return match.group(1).strip() if match else text.strip()
+
+
+class _TolerantParser:
+    """Recursive-descent JSON reader that never raises.
+
+    Accepts single quotes, bare keys, raw newlines and unescaped quotes inside
+    strings, missing or trailing commas, and stops at the end of the first
+    object. Input cut short returns whatever was read so far with
+    ``truncated`` set.
+    """
+
+    def __init__(self, text: str, start: int):
+        self.text = text
+        self.pos = start
+        self.end = len(text)
+        self.truncated = False
+
+    def _skip_ws(self):
+        self.pos = _WS_RE.match(self.text, self.pos).end()
+
+    def parse_object(self) -> Dict[str, Any]:
+        self.pos += 1
+        obj: Dict[str, Any] = {}
+        while True:
+            self._skip_ws()
+            if self.pos >= self.end:
+                self.truncated = True
+                return obj
+            ch = self.text[self.pos]
+            if ch == "}":
+                self.pos += 1
+                return obj
+            if ch == ",":
+                self.pos += 1
+                continue
+            key = self._key()
+            if key is None:
+                self.pos += 1  # stray character where a key should be
+                continue
+            self._skip_ws()
+            if self.pos < self.end and self.text[self.pos] == ":":
+                self.pos += 1
+                self._skip_ws()
+            if self.pos >= self.end:
+                self.truncated = True
+                return obj
+            obj[key] = self._value(_BARE_VALUE_RE)
+
+    def _array(self) -> List[Any]:
+        self.pos += 1
+        items: List[Any] = []
+        while True:
+            self._skip_ws()
+            if self.pos >= self.end:
+                self.truncated = True
+                return items
+            ch = self.text[self.pos]
+            if ch == "]":
+                self.pos += 1
+                return items
+            if ch == ",":
+                self.pos += 1
+                continue
+            if ch == "}":
+                return items  # mismatched bracket: let the enclosing object close
+            if ch == ":":
+                self.pos += 1
+                continue
+            items.append(self._value(_BARE_RE))
+
+    def _key(self) -> Optional[str]:
+        ch = self.text[self.pos]
+        if ch in "\"'":
+            return self._string(ch, _KEY_END_RE)
+        match = _BARE_RE.match(self.text, self.pos)
+        if match is None:
+            return None
+        self.pos = match.end()
+        return match.group()
+
+    def _value(self, bare_re: re.Pattern) -> Any:
+        ch = self.text[self.pos]
+        if ch == "{":
+            return self.parse_object()
+        if ch == "[":
+            return self._array()
+        if ch in "\"'":
+            return self._string(ch, _VALUE_END_RE)
+        match = bare_re.match(self.text, self.pos)
+        if match is None:
+            return None
+        self.pos = match.end()
+        token = match.group().strip()
+        if token in _LITERALS:
+            return _LITERALS[token]
+        try:
+            return json.loads(token)
+        except ValueError:
+            return token
+
+    def _string(self, quote: str, end_re: re.Pattern) -> str:
+        body_re = _STRING_BODY_RE[quote]
+        parts = []
+        self.pos += 1
+        while True:
+            match = body_re.match(self.text, self.pos)
+            parts.append(match.group())
+            self.pos = match.end()
+            if self.pos >= self.end or self.text[self.pos] != quote:
+                # End of input (possibly after a dangling backslash)
+                self.truncated = True
+                self.pos = self.end
+                return decode_string("".join(parts))
+            self.pos += 1
+            if end_re.match(self.text, self.pos):
+                return decode_string("".join(parts))
+            parts.append(quote)
+
+
+def extract_json_object(content: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Extract the first JSON object from model output in a single scan.
+
+    Returns ``(data, method)``. ``method`` is ``"json"`` when the object is
+    valid JSON (decoded by the C decoder in place, ignoring any code fence or
+    text around it), ``"tolerant"`` when it needed the lenient reader,
+    ``"truncated"`` when the output ended before the object closed, and
+    ``"none"`` when there is no object at all. Works on any prefix of a
+    streamed response.
+    """
+    if not content:
+        return None, "none"
+    match = _OBJECT_START_RE.search(content)
+    if match is None:
+        return None, "none"
+    start = match.start()
+    try:
+        data, _ = _decoder.raw_decode(content, start)
+        return data, "json"
+    except ValueError:
+        pass
+    parser = _TolerantParser(content, start)
+    data = parser.parse_object()
+    return data, "truncated" if parser.truncated else "tolerant"
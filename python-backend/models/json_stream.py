@@ -0,0 +1,97 @@
+from typing import List, Optional, Tuple
+
+from models.json_extract import decode_string
+
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONFieldParser:
+    """Emits top-level string fields of a JSON object as soon as they close.
+
+    Chunks of model output are fed in as they arrive; ``feed`` returns the
+    ``(field, value)`` pairs completed by that chunk. Text before the first
+    ``{`` (code fences, preambles) is ignored and nested values are skipped.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._buffer: List[str] = []
+        self._key: Optional[str] = None
+        self._expect = "key"  # key | colon | value | comma
+        self._capturing_value = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        completed: List[Tuple[str, str]] = []
+        for ch in chunk:
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._expect = "key"
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._close_string(completed)
+                    continue
+                if self._depth == 1:
+                    self._buffer.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._buffer = []
+                self._capturing_value = self._depth == 1 and self._expect == "value"
+                continue
+
+            if ch in _WHITESPACE:
+                continue
+
+            if ch in "{[":
+                if self._depth == 1:
+                    self._expect = "comma"
+                self._depth += 1
+                continue
+            if ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._started = False
+                continue
+            if self._depth == 1:
+                if ch == ":":
+                    self._expect = "value"
+                elif ch == ",":
+                    self._expect = "key"
+                    self._key = None
+                elif self._expect == "value":
+                    # Non-string scalar (number, true, null): skip until the comma
+                    self._expect = "comma"
+        return completed
+
+    def _close_string(self, completed: List[Tuple[str, str]]):
+        if self._depth != 1:
+            return
+        raw = "".join(self._buffer)
+        self._buffer = []
+        if self._expect == "key":
+            self._key = self._decode(raw)
+            self._expect = "colon"
+        elif self._capturing_value and self._key is not None:
+            value = self._decode(raw)
+            self.fields[self._key] = value
+            completed.append((self._key, value))
+            self._expect = "comma"
+        self._capturing_value = False
+
+    @staticmethod
+    def _decode(raw: str) -> str:
+        return decode_string(raw)
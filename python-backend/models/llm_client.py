@@ -1,232 +1,525 @@
-from openai import OpenAI
-from typing import Dict, Any
+import openai
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from typing import Dict, Any, AsyncIterator, List, Optional
+import asyncio
 import logging
 import json
-import re
+import time
+import httpx
 from config import config
+from models.http_pool import HTTPPool
+from models.json_extract import extract_json_object, strip_code_fence
+from models.json_stream import IncrementalJSONFieldParser
+from models.llm_transport import create_transport
+from models.rate_limiter import RateLimitedError, RateLimiter
+from models.router import CircuitBreaker, LLMBackend, LLMRouter
+from models.scheduler import LLMScheduler, SchedulerError, SchedulerTimeoutError
+from models.shared_state import SharedState
 
 logger = logging.getLogger(__name__)
 
+# Modelos que soportan Structured Outputs (response_format json_schema)
+STRUCTURED_OUTPUT_MODELS = ["gpt-4o", "gpt-4o-2024-08-06", "gpt-4o-mini", "gpt-4o-mini-2024-07-18"]
+
+# Completion token cap of a SQL generation request
+MAX_COMPLETION_TOKENS = 1500
+
+# JSON Schema para salida estructurada
+SQL_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sql_query": {
+            "type": "string",
+            "description": "The generated SQL query only, without formatting or markdown"
+        },
+        "explanation": {
+            "type": "string", 
+            "description": "Brief explanation of what the query does and how it works"
+        },
+        "considerations": {
+            "type": "string",
+            "description": "Performance considerations, indexes used, or optimization notes"
+        },
+        "alternatives": {
+            "type": "string",
+            "description": "Alternative approaches or variations of the query"
+        }
+    },
+    "required": ["sql_query", "explanation", "considerations", "alternatives"],
+    "additionalProperties": False
+}
+
+
+def _usage(usage: Any, response: Any = None) -> Optional[Dict[str, int]]:
+    """Token counts from a completion's ``usage``, including prompt tokens served from the provider's cache.
+    
+    OpenAI reports them in ``prompt_tokens_details.cached_tokens``; llama.cpp
+    servers report ``timings.cache_n`` when they omit the details.
+    """
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None)
+    if cached is None:
+        timings = getattr(response, "timings", None)
+        if isinstance(timings, dict):
+            cached = timings.get("cache_n")
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "cached_tokens": cached or 0
+    }
+
+
+def _text_field(value: Any) -> str:
+    """Response fields are strings; local models sometimes return lists or null"""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "\n".join(_text_field(item) for item in value)
+    return json.dumps(value, ensure_ascii=False)
+
 class LLMClient:
     def __init__(self):
-        self.client = None
-        self.model = None
+        self.router = None
+        self.http = HTTPPool(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive=config.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+            connect_timeout=config.HTTP_CONNECT_TIMEOUT,
+            read_timeout=config.LLM_REQUEST_TIMEOUT,
+            http2=config.HTTP2_ENABLED,
+            wrap_transport=self._wrap_transport
+        )
+        self.scheduler = LLMScheduler(
+            max_concurrency=config.LLM_MAX_CONCURRENCY,
+            max_queue=config.LLM_MAX_QUEUE,
+            queue_timeout=config.LLM_QUEUE_TIMEOUT,
+            request_timeout=config.LLM_REQUEST_TIMEOUT,
+            shared=self._create_shared_state()
+        )
+        self.rate_limiter = self._create_rate_limiter()
         self._initialize_client()
+        if self.transport is not None:
+            self.transport.meta.setdefault("backends", [
+                {"name": b.name, "provider": b.provider, "model": b.model} for b in self.router.backends
+            ])
+    
+    @property
+    def transport(self):
+        """The record/replay transport under the HTTP pool, if LLM_TRANSPORT is not live"""
+        return self.http.transport if config.LLM_TRANSPORT != "live" else None
+    
+    @staticmethod
+    def _wrap_transport(network: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+        """Record LLM exchanges to, or replay them from, LLM_TRANSPORT_FILE"""
+        if config.LLM_TRANSPORT == "live":
+            return network
+        logger.info(f"LLM transport in {config.LLM_TRANSPORT} mode ({config.LLM_TRANSPORT_FILE})")
+        return create_transport(
+            config.LLM_TRANSPORT,
+            config.LLM_TRANSPORT_FILE,
+            network,
+            latency_scale=config.LLM_REPLAY_LATENCY_SCALE,
+            latency_ms=config.LLM_REPLAY_LATENCY_MS
+        )
+    
+    @staticmethod
+    def _create_shared_state():
+        """Cross-worker LLM budget store when running several worker processes"""
+        path = config.shared_state_path()
+        if not path:
+            return None
+        try:
+            return SharedState(path)
+        except Exception as e:
+            logger.error(f"Could not open shared worker state {path}, limiting per worker: {e}")
+            return None
+    
+    @staticmethod
+    def _create_rate_limiter():
+        """Local TPM/RPM budget, split evenly between worker processes"""
+        if config.LLM_TPM_LIMIT <= 0 and config.LLM_RPM_LIMIT <= 0:
+            return None
+        return RateLimiter(
+            tokens_per_minute=config.LLM_TPM_LIMIT / config.WORKERS,
+            requests_per_minute=config.LLM_RPM_LIMIT / config.WORKERS,
+            max_wait=config.LLM_RATE_MAX_WAIT
+        )
     
     def _initialize_client(self):
-        """Initialize OpenAI client based on provider configuration"""
+        """Initialize one async OpenAI client per configured backend behind the router"""
         try:
-            if config.LLM_PROVIDER == "openai":
-                self.client = OpenAI(api_key=config.OPENAI_API_KEY)
-                self.model = config.OPENAI_MODEL
-                logger.info("Initialized OpenAI client")
-                
-            elif config.LLM_PROVIDER == "docker_runner":
-                self.client = OpenAI(
-                    base_url=config.DOCKER_RUNNER_BASE_URL,
-                    api_key="anything"  # Docker runner doesn't validate API key
-                )
-                self.model = config.DOCKER_RUNNER_MODEL
-                logger.info("Initialized Docker Model Runner client")
-                
+            entries = config.llm_backend_entries()
+            # With several backends the router fails over itself; SDK retries would only delay it
+            max_retries = 0 if len(entries) > 1 else 2
+            self.router = LLMRouter(
+                [self._create_backend(entry, max_retries) for entry in entries],
+                hedge_delay=config.LLM_HEDGE_DELAY,
+                attempt_timeout=config.LLM_ATTEMPT_TIMEOUT
+            )
         except Exception as e:
             logger.error(f"Failed to initialize LLM client: {e}")
             raise
     
-    async def generate_sql(self, user_query: str, system_prompt: str) -> Dict[str, Any]:
-        """Generate SQL query from natural language with structured JSON output"""
-        try:
-            # JSON Schema para salida estructurada
-            sql_response_schema = {
-                "type": "object",
-                "properties": {
-                    "sql_query": {
-                        "type": "string",
-                        "description": "The generated SQL query only, without formatting or markdown"
-                    },
-                    "explanation": {
-                        "type": "string", 
-                        "description": "Brief explanation of what the query does and how it works"
-                    },
-                    "considerations": {
-                        "type": "string",
-                        "description": "Performance considerations, indexes used, or optimization notes"
-                    },
-                    "alternatives": {
-                        "type": "string",
-                        "description": "Alternative approaches or variations of the query"
-                    }
-                },
-                "required": ["sql_query", "explanation", "considerations", "alternatives"],
-                "additionalProperties": False
-            }
+    def _create_backend(self, entry: str, max_retries: int) -> LLMBackend:
+        """Backend for an LLM_BACKENDS entry: 'openai', 'docker_runner' or 'name=base_url|model'"""
+        breaker = CircuitBreaker(
+            failure_threshold=config.LLM_BREAKER_FAILURES,
+            reset_timeout=config.LLM_BREAKER_RESET
+        )
+        if entry == "openai":
+            client = AsyncOpenAI(
+                api_key=config.OPENAI_API_KEY or ("replay" if config.LLM_TRANSPORT == "replay" else None),
+                timeout=self.http.timeout,
+                max_retries=max_retries,
+                http_client=self.http.client
+            )
+            name, provider, model = "openai", "openai", config.OPENAI_MODEL
+            logger.info("Initialized OpenAI client")
             
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_query}
-            ]
+        elif entry == "docker_runner":
+            client = AsyncOpenAI(
+                base_url=config.DOCKER_RUNNER_BASE_URL,
+                api_key="anything",  # Docker runner doesn't validate API key
+                timeout=self.http.timeout,
+                max_retries=max_retries,
+                http_client=self.http.client
+            )
+            name, provider, model = "docker_runner", "docker_runner", config.DOCKER_RUNNER_MODEL
+            logger.info("Initialized Docker Model Runner client")
             
-            # Usar Structured Outputs si el modelo lo soporta
-            if config.LLM_PROVIDER == "openai" and self.model in ["gpt-4o", "gpt-4o-2024-08-06", "gpt-4o-mini", "gpt-4o-mini-2024-07-18"]:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=0.1,
-                    max_tokens=1500,
-                    response_format={
-                        "type": "json_schema",
-                        "json_schema": {
-                            "name": "sql_response",
-                            "schema": sql_response_schema,
-                            "strict": True
-                        }
-                    }
-                )
-                
-                # Parsear respuesta JSON estructurada
-                content = response.choices[0].message.content
-                sql_data = json.loads(content)
-                
-                return {
-                    "success": True,
-                    "sql_query": sql_data["sql_query"],
-                    "explanation": sql_data["explanation"],
-                    "considerations": sql_data["considerations"], 
-                    "alternatives": sql_data["alternatives"],
-                    "model": self.model,
-                    "provider": config.LLM_PROVIDER,
-                    "structured": True
+        else:
+            # Any other OpenAI-compatible server (llama.cpp, vLLM, a local stub)
+            name, _, target = entry.partition("=")
+            base_url, _, model = target.partition("|")
+            client = AsyncOpenAI(
+                base_url=base_url,
+                api_key="anything",
+                timeout=self.http.timeout,
+                max_retries=max_retries,
+                http_client=self.http.client
+            )
+            provider = "openai_compatible"
+            logger.info(f"Initialized OpenAI-compatible client {name} at {base_url}")
+        
+        return LLMBackend(name, provider, client, model, window=config.LLM_LATENCY_WINDOW, breaker=breaker)
+    
+    @property
+    def client(self) -> AsyncOpenAI:
+        """Client of the primary (first configured) backend"""
+        return self.router.primary.client
+    
+    @property
+    def model(self) -> str:
+        """Model of the primary (first configured) backend"""
+        return self.router.primary.model
+    
+    async def _create_completion(self, **kwargs):
+        """Run a chat completion through the concurrency scheduler"""
+        return await self.scheduler.run(
+            lambda: self.client.chat.completions.create(**kwargs)
+        )
+    
+    @staticmethod
+    def _supports_structured_output(backend: LLMBackend) -> bool:
+        """Whether the backend's model supports OpenAI Structured Outputs"""
+        return backend.provider == "openai" and backend.model in STRUCTURED_OUTPUT_MODELS
+    
+    @staticmethod
+    def _prompt_cache_hints(backend: LLMBackend, prompt_cache_key: Optional[str]) -> Dict[str, Any]:
+        """Request fields that help the backend reuse the cached prompt prefix"""
+        if not config.PROMPT_CACHE_ENABLED:
+            return {}
+        if backend.provider == "openai":
+            # Routes requests sharing the prefix to the same cache shard
+            return {"prompt_cache_key": prompt_cache_key} if prompt_cache_key else {}
+        # llama.cpp server (Docker Model Runner): keep the KV cache of the previous prompt
+        hints = {"cache_prompt": True}
+        if config.LLM_CACHE_SLOT >= 0:
+            hints["id_slot"] = config.LLM_CACHE_SLOT
+        return hints
+    
+    def _completion_kwargs(self, user_query: str, system_prompt: str, backend: LLMBackend,
+                           prompt_cache_key: Optional[str] = None) -> Dict[str, Any]:
+        """Chat completion arguments for a SQL generation request"""
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_query}
+        ]
+        
+        kwargs = {
+            "model": backend.model,
+            "messages": messages,
+            "temperature": 0.1,
+            "max_tokens": MAX_COMPLETION_TOKENS
+        }
+        
+        # Usar Structured Outputs si el modelo lo soporta
+        if self._supports_structured_output(backend):
+            kwargs["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "sql_response",
+                    "schema": SQL_RESPONSE_SCHEMA,
+                    "strict": True
                 }
-                
-            else:
-                # Fallback para modelos que no soportan structured outputs
-                # Forzar formato JSON para modelos locales
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=0.1,
-                    max_tokens=1500,
-                    response_format={"type": "json_object"} if config.LLM_PROVIDER == "docker_runner" else None
-                )
-                
-                content = response.choices[0].message.content.strip()
-                logger.info(f"Raw response from {config.LLM_PROVIDER}: {content[:200]}...")
-                
-                # Usar parsing robusto
-                sql_data = self._robust_json_parse(content)
-                
-                if sql_data:
-                    return {
-                        "success": True,
-                        "sql_query": sql_data.get("sql_query", ""),
-                        "explanation": sql_data.get("explanation", ""),
-                        "considerations": sql_data.get("considerations", ""),
-                        "alternatives": sql_data.get("alternatives", ""),
-                        "model": self.model,
-                        "provider": config.LLM_PROVIDER,
-                        "structured": False
-                    }
-                else:
-                    # Último recurso: retornar como antes pero con logging
-                    logger.error(f"Failed to parse JSON from {config.LLM_PROVIDER}: {content}")
-                    return {
-                        "success": True,
-                        "sql_query": content,
-                        "explanation": "",
-                        "considerations": "",
-                        "alternatives": "",
-                        "model": self.model,
-                        "provider": config.LLM_PROVIDER,
-                        "structured": False
-                    }
+            }
+        else:
+            # Forzar formato JSON para modelos locales
+            kwargs["response_format"] = {"type": "json_object"} if backend.provider != "openai" else None
+        
+        hints = self._prompt_cache_hints(backend, prompt_cache_key)
+        if hints:
+            kwargs["extra_body"] = hints
+        
+        return kwargs
+    
+    def _build_result(self, content: str, backend: LLMBackend) -> Dict[str, Any]:
+        """Turn the raw completion text into a generation result"""
+        if self._supports_structured_output(backend):
+            # Parsear respuesta JSON estructurada
+            sql_data = json.loads(content)
             
-        except Exception as e:
-            logger.error(f"Error generating SQL: {e}")
             return {
-                "success": False,
-                "error": str(e),
-                "model": self.model,
-                "provider": config.LLM_PROVIDER
+                "success": True,
+                "sql_query": sql_data["sql_query"],
+                "explanation": sql_data["explanation"],
+                "considerations": sql_data["considerations"], 
+                "alternatives": sql_data["alternatives"],
+                "model": backend.model,
+                "provider": backend.provider,
+                "backend": backend.name,
+                "structured": True,
+                "parse": "structured"
+            }
+        
+        # Fallback para modelos que no soportan structured outputs
+        content = content.strip()
+        logger.info(f"Raw response from {backend.name}: {content[:200]}...")
+        
+        # Extracción tolerante en una sola pasada (fences, texto extra, comillas, salida truncada)
+        sql_data, method = extract_json_object(content)
+        
+        if sql_data is not None:
+            if method != "json":
+                logger.warning(f"Used {method} JSON parsing for {backend.name}")
+            return {
+                "success": True,
+                "sql_query": _text_field(sql_data.get("sql_query", "")),
+                "explanation": _text_field(sql_data.get("explanation", "")),
+                "considerations": _text_field(sql_data.get("considerations", "")),
+                "alternatives": _text_field(sql_data.get("alternatives", "")),
+                "model": backend.model,
+                "provider": backend.provider,
+                "backend": backend.name,
+                "structured": False,
+                "parse": method
             }
+        
+        # Último recurso: retornar como antes pero con logging
+        logger.error(f"Failed to parse JSON from {backend.name}: {content}")
+        return {
+            "success": True,
+            "sql_query": strip_code_fence(content),
+            "explanation": "",
+            "considerations": "",
+            "alternatives": "",
+            "model": backend.model,
+            "provider": backend.provider,
+            "backend": backend.name,
+            "structured": False,
+            "parse": "raw"
+        }
+    
+    def result_from_completion(self, completion: Dict[str, Any], backend: LLMBackend) -> Dict[str, Any]:
+        """Generation result from a recorded chat completion body (see ``models.llm_transport``)"""
+        response = ChatCompletion.model_validate(completion)
+        return self._timed_result(
+            response.choices[0].message.content,
+            backend,
+            time.perf_counter(),
+            _usage(response.usage, response)
+        )
+    
+    def _timed_result(self, content: str, backend: LLMBackend, started: float,
+                      usage: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """``_build_result`` plus LLM/parse timings (seconds) and token usage for metrics"""
+        received = time.perf_counter()
+        result = self._build_result(content, backend)
+        result["timings"] = {"llm": received - started, "parse": time.perf_counter() - received}
+        result["usage"] = usage
+        return result
     
-    def _robust_json_parse(self, content: str) -> Dict[str, str]:
-        """Parse JSON with multiple fallback strategies"""
-        if not content:
+    async def _reserve_tokens(self, user_query: str, system_prompt: str, priority: str) -> Optional[int]:
+        """Wait for rate-limit budget for this request; returns the reserved tokens"""
+        if self.rate_limiter is None:
             return None
-            
-        # Strategy 1: Direct JSON parsing
+        estimate = self.rate_limiter.estimate(system_prompt + user_query, MAX_COMPLETION_TOKENS)
+        return await self.rate_limiter.acquire(estimate, priority)
+    
+    def _settle_tokens(self, reserved: Optional[int], usage: Optional[Dict[str, int]], sent: bool):
+        """Replace the reservation with the reported usage (refund it if nothing was sent)"""
+        if reserved is None:
+            return
+        if not sent:
+            self.rate_limiter.settle(reserved, 0)
+        elif usage is None:
+            self.rate_limiter.settle(reserved, None)
+        else:
+            self.rate_limiter.settle(
+                reserved, usage["prompt_tokens"] + usage["completion_tokens"], usage["completion_tokens"]
+            )
+    
+    def _provider_rate_limited(self, error: openai.RateLimitError) -> float:
+        """Pause the local limiter after a provider 429; returns the seconds to wait"""
         try:
-            return json.loads(content)
-        except json.JSONDecodeError:
-            pass
-            
-        # Strategy 2: Clean and try again
+            retry_after = float(error.response.headers.get("retry-after", 1))
+        except (AttributeError, TypeError, ValueError):
+            retry_after = 1.0
+        retry_after = max(1.0, retry_after)
+        if self.rate_limiter is not None:
+            self.rate_limiter.penalize(retry_after)
+        return retry_after
+    
+    def _error_result(self, error: Exception, backend: Optional[LLMBackend] = None) -> Dict[str, Any]:
+        """Failure result for a generation error on ``backend`` (the last one tried, else the primary)"""
+        backend = backend or self.router.primary
+        result = {
+            "success": False,
+            "error": str(error),
+            "model": backend.model,
+            "provider": backend.provider,
+            "backend": backend.name
+        }
+        if isinstance(error, SchedulerError):
+            result["error_code"] = error.error_code
+            if error.retry_after is not None:
+                result["retry_after"] = error.retry_after
+        elif isinstance(error, openai.RateLimitError):
+            result["error_code"] = RateLimitedError.error_code
+            result["retry_after"] = self._provider_rate_limited(error)
+        return result
+    
+    async def generate_sql(self, user_query: str, system_prompt: str,
+                           prompt_cache_key: Optional[str] = None,
+                           priority: str = "interactive") -> Dict[str, Any]:
+        """Generate SQL query from natural language with structured JSON output.
+        
+        ``prompt_cache_key`` identifies the static prompt prefix (see
+        ``prefix_version``) for provider-side prompt caching. ``priority``
+        ("interactive" or "batch") orders requests waiting for rate-limit budget.
+        """
+        started = time.perf_counter()
+        reserved = usage = tried = None
+        sent = False
+        
+        def create(backend: LLMBackend):
+            nonlocal sent, tried
+            sent, tried = True, backend
+            return backend.client.chat.completions.create(
+                **self._completion_kwargs(user_query, system_prompt, backend, prompt_cache_key)
+            )
+        
         try:
-            # Remove markdown code blocks if present
-            cleaned = re.sub(r'```(?:json)?\s*', '', content)
-            cleaned = re.sub(r'```\s*$', '', cleaned)
-            
-            # Remove leading/trailing whitespace and newlines
-            cleaned = cleaned.strip()
+            reserved = await self._reserve_tokens(user_query, system_prompt, priority)
+            response, backend = await self.scheduler.run(lambda: self.router.call(create))
+            tried = backend
+            usage = _usage(response.usage, response)
+            return self._timed_result(response.choices[0].message.content, backend, started, usage)
             
-            return json.loads(cleaned)
-        except json.JSONDecodeError:
-            pass
-            
-        # Strategy 3: Extract JSON from text using regex
+        except SchedulerError as e:
+            logger.warning(f"LLM scheduler rejected request: {e}")
+            return self._error_result(e, tried)
+        except Exception as e:
+            logger.error(f"Error generating SQL: {e}")
+            return self._error_result(e, tried)
+        finally:
+            self._settle_tokens(reserved, usage, sent)
+    
+    async def stream_sql(self, user_query: str, system_prompt: str,
+                         prompt_cache_key: Optional[str] = None,
+                         priority: str = "interactive") -> AsyncIterator[Dict[str, Any]]:
+        """Stream a SQL generation.
+        
+        Yields ``{"type": "field", "field": ..., "value": ...}`` as soon as each
+        top-level JSON field is complete, then one ``{"type": "result", ...}``
+        with the same payload ``generate_sql`` would return.
+        """
+        parser = IncrementalJSONFieldParser()
+        parts = []
+        usage = reserved = tried = None
+        sent = False
+        started = time.perf_counter()
+        
+        def create(backend: LLMBackend):
+            nonlocal sent, tried
+            sent, tried = True, backend
+            return backend.client.chat.completions.create(
+                stream=True,
+                stream_options={"include_usage": True},
+                **self._completion_kwargs(user_query, system_prompt, backend, prompt_cache_key)
+            )
+        
         try:
-            # Find JSON object in the text
-            json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', content, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                return json.loads(json_str)
-        except (json.JSONDecodeError, AttributeError):
-            pass
+            reserved = await self._reserve_tokens(user_query, system_prompt, priority)
+            async with self.scheduler.slot():
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + self.scheduler.request_timeout
+                # Fail over while opening the stream; hedging a stream would duplicate tokens
+                stream, backend = await asyncio.wait_for(
+                    self.router.call(
+                        create,
+                        hedge=False,
+                        record_latency=False
+                    ),
+                    self.scheduler.request_timeout
+                )
+                tried = backend
+                try:
+                    async for chunk in stream:
+                        if loop.time() > deadline:
+                            raise SchedulerTimeoutError(
+                                f"LLM stream exceeded {self.scheduler.request_timeout}s"
+                            )
+                        if chunk.usage is not None:
+                            usage = _usage(chunk.usage, chunk)
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content or ""
+                        parts.append(delta)
+                        for field, value in parser.feed(delta):
+                            yield {"type": "field", "field": field, "value": value}
+                finally:
+                    # Also when the consumer goes away: stop the upstream completion and free the connection
+                    await stream.close()
             
-        # Strategy 4: Try to extract individual fields if JSON structure is broken
-        try:
-            result = {}
+            yield {"type": "result", "result": self._timed_result("".join(parts), backend, started, usage)}
             
-            # Extract sql_query
-            sql_match = re.search(r'["\']sql_query["\']\s*:\s*["\']([^"\']*)["\'"]', content, re.DOTALL)
-            if sql_match:
-                result["sql_query"] = sql_match.group(1)
-                
-            # Extract explanation
-            exp_match = re.search(r'["\']explanation["\']\s*:\s*["\']([^"\']*)["\'"]', content, re.DOTALL)
-            if exp_match:
-                result["explanation"] = exp_match.group(1)
-                
-            # Extract considerations
-            con_match = re.search(r'["\']considerations["\']\s*:\s*["\']([^"\']*)["\'"]', content, re.DOTALL)
-            if con_match:
-                result["considerations"] = con_match.group(1)
-                
-            # Extract alternatives
-            alt_match = re.search(r'["\']alternatives["\']\s*:\s*["\']([^"\']*)["\'"]', content, re.DOTALL)
-            if alt_match:
-                result["alternatives"] = alt_match.group(1)
-                
-            # Return if we got at least sql_query
-            if "sql_query" in result and result["sql_query"]:
-                logger.warning(f"Used regex fallback parsing for {config.LLM_PROVIDER}")
-                return result
-                
+        except asyncio.TimeoutError:
+            error = SchedulerTimeoutError(f"LLM request exceeded {self.scheduler.request_timeout}s")
+            logger.warning(f"LLM stream timed out: {error}")
+            yield {"type": "result", "result": self._error_result(error, tried)}
+        except SchedulerError as e:
+            logger.warning(f"LLM scheduler rejected stream: {e}")
+            yield {"type": "result", "result": self._error_result(e, tried)}
         except Exception as e:
-            logger.error(f"Regex parsing failed: {e}")
-            
-        # All strategies failed
-        logger.error(f"All JSON parsing strategies failed for content: {content[:500]}...")
-        return None
+            logger.error(f"Error streaming SQL: {e}")
+            yield {"type": "result", "result": self._error_result(e, tried)}
+        finally:
+            self._settle_tokens(reserved, usage, sent)
     
-    def test_connection(self) -> Dict[str, Any]:
+    async def test_connection(self) -> Dict[str, Any]:
         """Test LLM client connection - full test"""
         try:
             test_messages = [
                 {"role": "user", "content": "Test connection. Respond with 'OK'"}
             ]
             
-            response = self.client.chat.completions.create(
+            response = await self._create_completion(
                 model=self.model,
                 messages=test_messages,
                 max_tokens=10
@@ -247,47 +540,48 @@ class LLMClient:
                 "error": str(e)
             }
     
-    def test_connection_fast(self) -> Dict[str, Any]:
-        """Fast connection test for health checks"""
+    def _health_url(self, backend: LLMBackend) -> str:
+        """Health endpoint next to the backend's OpenAI-compatible API root"""
+        base_url = str(backend.client.base_url).rstrip("/")
+        if base_url.endswith("/v1"):
+            base_url = base_url[:-len("/v1")]
+        return f"{base_url}/health"
+    
+    async def _probe_backend(self, backend: LLMBackend) -> Dict[str, Any]:
+        """Cheap reachability check of one backend over the shared pool"""
+        result = {"backend": backend.name, "provider": backend.provider, "model": backend.model}
+        started = time.perf_counter()
+        
+        # For OpenAI, just verify client is configured
+        if backend.provider == "openai":
+            if not config.OPENAI_API_KEY or config.OPENAI_API_KEY == "your_openai_api_key_here":
+                return dict(result, success=False, error="OpenAI API key not configured")
+            return dict(result, success=True)
+        
+        # For Docker Runner and other local servers, test if the service is reachable
         try:
-            # For OpenAI, just verify client is configured
-            if config.LLM_PROVIDER == "openai":
-                if not config.OPENAI_API_KEY or config.OPENAI_API_KEY == "your_openai_api_key_here":
-                    return {
-                        "success": False,
-                        "provider": config.LLM_PROVIDER,
-                        "model": self.model,
-                        "error": "OpenAI API key not configured"
-                    }
-            
-            # For Docker Runner, test if service is reachable
-            elif config.LLM_PROVIDER == "docker_runner":
-                import requests
-                try:
-                    # Quick ping to model runner health endpoint
-                    response = requests.get(f"{config.DOCKER_RUNNER_BASE_URL.rstrip('/v1/')}/health", timeout=3)
-                    if response.status_code != 200:
-                        return {
-                            "success": False,
-                            "provider": config.LLM_PROVIDER,
-                            "model": self.model,
-                            "error": f"Docker Model Runner not healthy: {response.status_code}"
-                        }
-                except requests.exceptions.RequestException as e:
-                    return {
-                        "success": False,
-                        "provider": config.LLM_PROVIDER,
-                        "model": self.model,
-                        "error": f"Docker Model Runner unreachable: {str(e)}"
-                    }
-            
-            # If basic checks pass, return success
-            return {
-                "success": True,
+            response = await self.http.client.get(self._health_url(backend), timeout=config.HEALTH_PROBE_TIMEOUT)
+            result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            if response.status_code != 200:
+                return dict(result, success=False, error=f"{backend.name} not healthy: {response.status_code}")
+        except httpx.HTTPError as e:
+            return dict(result, success=False, error=f"{backend.name} unreachable: {e!r}")
+        return dict(result, success=True)
+    
+    async def test_connection_fast(self) -> Dict[str, Any]:
+        """Fast connection test for health checks (no completion; backends probed concurrently)"""
+        try:
+            probes = await asyncio.gather(*(self._probe_backend(b) for b in self.router.backends))
+            result = {
+                "success": any(probe["success"] for probe in probes),
                 "provider": config.LLM_PROVIDER,
                 "model": self.model,
-                "test_type": "fast"
+                "test_type": "fast",
+                "backends": probes
             }
+            if not result["success"]:
+                result["error"] = probes[0]["error"]
+            return result
             
         except Exception as e:
             return {
@@ -295,4 +589,8 @@ class LLMClient:
                 "provider": config.LLM_PROVIDER,
                 "model": self.model,
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+    
+    async def aclose(self):
+        """Close the shared HTTP connection pool"""
+        await self.http.aclose()
@@ -0,0 +1,281 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_digest(text: str) -> str:
+    """Short hash identifying a system prompt in recordings"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _request_json(request: httpx.Request) -> Optional[Dict[str, Any]]:
+    try:
+        payload = json.loads(request.content or b"null")
+    except ValueError:
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def request_key(request: httpx.Request) -> str:
+    """Identity of an LLM request: method, API route and the canonical JSON body.
+
+    Host and base path are left out (``/engines/llama.cpp/v1/chat/completions``
+    keys as ``chat/completions``) so a recording made against one server
+    replays against another serving the same model.
+    """
+    payload = _request_json(request)
+    body = (
+        json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        if payload is not None else request.content
+    )
+    route = request.url.path.rsplit("/v1/", 1)[-1].lstrip("/")
+    digest = hashlib.sha256(f"{request.method} {route}\n".encode("utf-8"))
+    digest.update(body)
+    return digest.hexdigest()[:32]
+
+
+def _describe_request(payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Model, system prompt digest and user message of a chat request (for seeding and tools)"""
+    if not payload or not isinstance(payload.get("messages"), list):
+        return {}
+    described = {"m": payload.get("model")}
+    for message in payload["messages"]:
+        if message.get("role") == "system":
+            described["p"] = prompt_digest(message.get("content") or "")
+        elif message.get("role") == "user":
+            described["q"] = message.get("content")
+    return described
+
+
+def load_exchanges(path: str, on_error: Optional[Callable[[int, Exception], None]] = None
+                   ) -> Iterator[Dict[str, Any]]:
+    """Exchanges of a recording in file order (``meta`` lines are skipped).
+
+    Lines that are not JSON objects (e.g. cut short by a killed recorder) are
+    skipped and reported to ``on_error`` with their line number, or logged.
+    """
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("not a JSON object")
+            except ValueError as e:
+                if on_error is not None:
+                    on_error(number, e)
+                else:
+                    logger.warning(f"Skipping malformed line {number} of {path}: {e}")
+                continue
+            if "k" in record:
+                yield record
+
+
+def read_meta(path: str) -> Dict[str, Any]:
+    """Backends described by the last recording session in the file"""
+    meta: Dict[str, Any] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith('{"meta"'):
+                meta = json.loads(line)["meta"]
+    return meta
+
+
+class _RecordingStream(httpx.AsyncByteStream):
+    """Passes the upstream body through chunk by chunk and records it once read to the end"""
+
+    def __init__(self, transport: "RecordingTransport", request: httpx.Request, response: httpx.Response,
+                 started: float):
+        self._transport = transport
+        self._request = request
+        self._response = response
+        self._started = started
+        self._chunks: List[bytes] = []
+        self._complete = False
+
+    async def __aiter__(self):
+        async for chunk in self._response.stream:
+            self._chunks.append(chunk)
+            yield chunk
+        self._complete = True
+
+    async def aclose(self):
+        await self._response.aclose()
+        # A body the client stopped reading halfway is not a replayable answer
+        if self._complete:
+            self._complete = False
+            await self._transport._record(self._request, self._response, b"".join(self._chunks), self._started)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Forwards LLM requests to the network and appends each exchange to ``path``.
+
+    One JSON line per exchange: request key (``k``), model, system prompt
+    digest and user message, status, the response body (parsed when it is
+    JSON, raw text otherwise, e.g. a streamed completion) and the latency to
+    the last byte. Bodies pass through as they arrive, so streamed
+    completions still stream; the exchange is written when the response is
+    closed after being read to the end.
+    Request bodies are not stored; the prompt is the bulk of them and the key
+    already identifies them. The file is only ever appended to, one
+    ``write`` per line, so several worker processes can record into it.
+    """
+
+    mode = "record"
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, path: str):
+        self._transport = transport
+        self.path = path
+        self.meta: Dict[str, Any] = {}
+        self.recorded = 0
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _append(self, record: Dict[str, Any]):
+        lines = []
+        if not self._started:
+            self._started = True
+            lines.append(json.dumps({"meta": self.meta, "started": time.strftime("%Y-%m-%dT%H:%M:%S")}))
+        lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self._transport.handle_async_request(request)
+        if request.method != "POST":
+            return response
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(self, request, response, started),
+            extensions=response.extensions,
+            request=request
+        )
+
+    async def _record(self, request: httpx.Request, response: httpx.Response, body: bytes, started: float):
+        encoding = response.headers.get("content-encoding")
+        if encoding:
+            # The raw chunks are still compressed; replay serves plain bodies
+            body = httpx.Response(200, headers={"content-encoding": encoding}, content=body).content
+        record = {"k": request_key(request)}
+        record.update(_describe_request(_request_json(request)))
+        record["s"] = response.status_code
+        content_type = response.headers.get("content-type", "")
+        record["t"] = content_type
+        if "json" in content_type:
+            try:
+                record["j"] = json.loads(body)
+            except ValueError:
+                record["b"] = body.decode("utf-8", "replace")
+        else:
+            record["b"] = body.decode("utf-8", "replace")
+        record["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        await asyncio.to_thread(self._append, record)
+        self.recorded += 1
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "file": self.path, "recorded": self.recorded}
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves recorded exchanges by request key without touching the network.
+
+    A request recorded several times gets the recordings in turn. The answer
+    is delayed by ``latency_ms`` plus the recorded latency times
+    ``latency_scale`` (both 0 by default: instant). Unknown requests get a
+    404 ``not_recorded`` error, and GET requests (health probes) a 200, so
+    a replaying process never depends on a live model.
+    """
+
+    mode = "replay"
+
+    def __init__(self, path: str, latency_scale: float = 0.0, latency_ms: float = 0.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.path = path
+        self.latency_scale = latency_scale
+        self.latency_ms = latency_ms
+        self.meta = read_meta(path)
+        self._transport = transport
+        self._exchanges: Dict[str, List[Dict[str, Any]]] = {}
+        for exchange in load_exchanges(path):
+            self._exchanges.setdefault(exchange["k"], []).append(exchange)
+        self._served: Dict[str, int] = {}
+        self.replayed = 0
+        self.misses = 0
+        self.missed_queries: List[str] = []
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(200, json={"object": "list", "data": []}, request=request)
+        key = request_key(request)
+        recorded = self._exchanges.get(key)
+        if not recorded:
+            self.misses += 1
+            query = _describe_request(_request_json(request)).get("q")
+            if query is not None and len(self.missed_queries) < 100:
+                self.missed_queries.append(query)
+            logger.warning(f"LLM request {key} is not in the recording {self.path}")
+            return httpx.Response(
+                404,
+                json={"error": {"message": f"Request {key} not in the recording", "type": "not_recorded"}},
+                request=request
+            )
+        turn = self._served.get(key, 0)
+        self._served[key] = turn + 1
+        exchange = recorded[turn % len(recorded)]
+        delay = (self.latency_ms + exchange.get("ms", 0.0) * self.latency_scale) / 1000
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.replayed += 1
+        if "j" in exchange:
+            content = json.dumps(exchange["j"], ensure_ascii=False).encode("utf-8")
+        else:
+            content = exchange.get("b", "").encode("utf-8")
+        return httpx.Response(
+            exchange["s"],
+            headers={"content-type": exchange.get("t") or "application/json"},
+            content=content,
+            request=request
+        )
+
+    async def aclose(self):
+        if self._transport is not None:
+            await self._transport.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "file": self.path,
+            "requests_recorded": len(self._exchanges),
+            "replayed": self.replayed,
+            "misses": self.misses,
+            "latency_scale": self.latency_scale,
+            "latency_ms": self.latency_ms,
+        }
+
+
+def create_transport(mode: str, path: str, network: httpx.AsyncBaseTransport,
+                     latency_scale: float = 0.0, latency_ms: float = 0.0) -> httpx.AsyncBaseTransport:
+    """Wrap (``record``) or replace (``replay``) the network transport of the LLM pool"""
+    if mode == "record":
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        return RecordingTransport(network, path)
+    if mode == "replay":
+        return ReplayTransport(path, latency_scale=latency_scale, latency_ms=latency_ms, transport=network)
+    return network
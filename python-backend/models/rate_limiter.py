@@ -0,0 +1,220 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from typing import Any, Dict, List, Optional
+
+from models.scheduler import SchedulerError
+
+# Lower rank is served first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class RateLimitedError(SchedulerError):
+    """Raised when a request would wait longer than allowed for the TPM/RPM budget"""
+    error_code = "llm_rate_limited"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+class TokenBucket:
+    """Continuously refilled bucket holding at most one minute of budget"""
+
+    def __init__(self, per_minute: float, clock=time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` (capped at the capacity) can be taken"""
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        """Remove ``amount``; the level may go negative (debt repaid by refills)"""
+        self._refill()
+        self.level -= amount
+
+    def give(self, amount: float):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """Keeps LLM traffic under a tokens-per-minute and requests-per-minute budget.
+
+    ``acquire`` reserves a request's estimated tokens (prompt plus expected
+    completion) and waits while either bucket is short, so bursts are
+    spread out locally instead of being answered with provider 429s.
+    Waiters are served strictly in priority order (interactive before
+    batch, FIFO within a priority). ``settle`` corrects the reservation with
+    the usage the provider reports, and ``penalize`` pauses admission after
+    a provider 429. A request that would wait longer than ``max_wait`` is
+    rejected with ``RateLimitedError``.
+    """
+
+    def __init__(self, tokens_per_minute: float = 0, requests_per_minute: float = 0,
+                 max_wait: float = 30.0, completion_estimate: int = 400, clock=time.monotonic):
+        self.tokens = TokenBucket(tokens_per_minute, clock) if tokens_per_minute > 0 else None
+        self.requests = TokenBucket(requests_per_minute, clock) if requests_per_minute > 0 else None
+        self.max_wait = max_wait
+        self._clock = clock
+        self._completion_estimate = float(completion_estimate)
+        self._paused_until = 0.0
+        self._waiters: List[list] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._waiting = {priority: 0 for priority in PRIORITIES}
+        self._admitted = {priority: 0 for priority in PRIORITIES}
+        self._waited_seconds = 0.0
+        self._rejected = 0
+        self._provider_limited = 0
+
+    def estimate(self, prompt_text: str, max_completion: int) -> int:
+        """Tokens to reserve: the prompt plus the typical completion (capped at ``max_completion``)"""
+        return estimate_tokens(prompt_text) + int(min(self._completion_estimate, max_completion))
+
+    def _wait_time(self, tokens: int) -> float:
+        wait = max(0.0, self._paused_until - self._clock())
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(tokens))
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1))
+        return wait
+
+    def _expected_wait(self, tokens: int, rank: int) -> float:
+        """Wait for ``tokens`` behind the waiters that would be served first"""
+        wait = self._wait_time(tokens)
+        if self.tokens is not None:
+            ahead = sum(entry[2] for entry in self._waiters if entry[0] <= rank and not entry[3].done())
+            wait = max(wait, (ahead + tokens - self.tokens.level) / self.tokens.rate)
+        if self.requests is not None:
+            ahead = sum(1 for entry in self._waiters if entry[0] <= rank and not entry[3].done())
+            wait = max(wait, (ahead + 1 - self.requests.level) / self.requests.rate)
+        return wait
+
+    def _take(self, tokens: int):
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+        if self.requests is not None:
+            self.requests.take(1)
+
+    def _give(self, tokens: int):
+        if self.tokens is not None:
+            self.tokens.give(tokens)
+        if self.requests is not None:
+            self.requests.give(1)
+
+    async def acquire(self, tokens: int, priority: str = "interactive") -> int:
+        """Wait for budget for ``tokens``; returns the reserved amount to pass to ``settle``"""
+        rank = PRIORITIES.get(priority, PRIORITIES["batch"])
+        priority = "interactive" if rank == 0 else "batch"
+        if not self._waiters and self._wait_time(tokens) == 0:
+            self._take(tokens)
+            self._admitted[priority] += 1
+            return tokens
+
+        wait = self._expected_wait(tokens, rank)
+        if wait > self.max_wait:
+            self._rejected += 1
+            raise RateLimitedError(
+                f"LLM token budget exhausted (expected wait {wait:.1f}s exceeds {self.max_wait}s)",
+                retry_after=float(math.ceil(wait))
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [rank, next(self._sequence), tokens, future]
+        heapq.heappush(self._waiters, entry)
+        self._waiting[priority] += 1
+        started = self._clock()
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            # The budget may have been granted just as the wait ran out; then proceed
+            if not future.done():
+                self._rejected += 1
+                raise RateLimitedError(
+                    f"Timed out after {self.max_wait}s waiting for LLM token budget",
+                    retry_after=float(math.ceil(self._wait_time(tokens)) or 1)
+                )
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Cancelled after ``_dispatch`` took the budget for us: hand it to the next waiter
+                self._give(tokens)
+                self._dispatch()
+            raise
+        finally:
+            self._waiting[priority] -= 1
+            if not future.done():
+                # Cancelled or timed out: leave the queue so the next waiter is not held up
+                future.cancel()
+                self._dispatch()
+        self._admitted[priority] += 1
+        self._waited_seconds += self._clock() - started
+        return tokens
+
+    def _dispatch(self):
+        """Admit waiters from the head of the queue while the budget allows"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            wait = self._wait_time(tokens)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self._take(tokens)
+            future.set_result(None)
+
+    def settle(self, reserved: int, actual_total: Optional[int], completion_tokens: Optional[int] = None):
+        """Replace a reservation with the tokens actually used (None: keep the reservation)"""
+        if completion_tokens is not None:
+            self._completion_estimate += 0.1 * (completion_tokens - self._completion_estimate)
+        if self.tokens is None or actual_total is None:
+            return
+        difference = reserved - actual_total
+        if difference > 0:
+            self.tokens.give(difference)
+        elif difference < 0:
+            self.tokens.take(-difference)
+        if difference > 0 and self._waiters:
+            self._dispatch()
+
+    def penalize(self, seconds: float):
+        """Pause admission after the provider answered 429"""
+        self._provider_limited += 1
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        admitted = sum(self._admitted.values())
+        return {
+            "tokens_per_minute": self.tokens.capacity if self.tokens is not None else None,
+            "requests_per_minute": self.requests.capacity if self.requests is not None else None,
+            "tokens_available": round(self.tokens.level) if self.tokens is not None else None,
+            "requests_available": round(self.requests.level, 1) if self.requests is not None else None,
+            "completion_estimate": round(self._completion_estimate),
+            "waiting": dict(self._waiting),
+            "admitted": dict(self._admitted),
+            "avg_wait_seconds": round(self._waited_seconds / admitted, 3) if admitted else 0.0,
+            "rejected": self._rejected,
+            "provider_rate_limited": self._provider_limited,
+            "paused_for": round(max(0.0, self._paused_until - self._clock()), 1),
+        }
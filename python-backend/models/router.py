@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from models.scheduler import SchedulerError, SchedulerTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Client errors that would fail the same way on any backend (bad request, auth)
+_NON_RETRYABLE_STATUS = range(400, 500)
+_RETRYABLE_STATUS = (408, 409, 429)
+
+
+class NoBackendAvailableError(SchedulerError):
+    """Raised when every backend's circuit breaker is open"""
+    error_code = "llm_unavailable"
+
+
+def _consume_result(task: asyncio.Task):
+    """Retrieve the outcome of an abandoned attempt so asyncio does not log it"""
+    if not task.cancelled():
+        task.exception()
+
+
+def _is_retryable(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None)
+    return not (status in _NON_RETRYABLE_STATUS and status not in _RETRYABLE_STATUS)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Opens after ``failure_threshold`` failures in a row; while open the
+    backend is skipped. After ``reset_timeout`` seconds one trial call is let
+    through (half-open): success closes the breaker, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.times_opened = 0
+
+    def seconds_until_trial(self) -> float:
+        """Seconds until an open breaker lets a trial call through (0 when not open)"""
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def available(self) -> bool:
+        """Whether a call could be let through now (does not claim the half-open trial)"""
+        if self.state == "open":
+            return self._clock() - self._opened_at >= self.reset_timeout
+        if self.state == "half_open":
+            return not self._trial_in_flight
+        return True
+
+    def begin(self) -> bool:
+        """Claim permission for one call"""
+        if not self.available():
+            return False
+        if self.state == "open":
+            self.state = "half_open"
+        if self.state == "half_open":
+            self._trial_in_flight = True
+        return True
+
+    def record_success(self):
+        self.state = "closed"
+        self._failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self._opened_at = self._clock()
+
+    def record_cancelled(self):
+        """A call abandoned before it finished (e.g. it lost a hedge) says nothing about health"""
+        self._trial_in_flight = False
+
+
+class LLMBackend:
+    """One OpenAI-compatible endpoint with its rolling latency and error window"""
+
+    def __init__(self, name: str, provider: str, client: Any, model: str,
+                 window: int = 100, breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.provider = provider
+        self.client = client
+        self.model = model
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies = deque(maxlen=max(1, window))
+        self._outcomes = deque(maxlen=max(1, window))
+        self.requests = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.wins = 0
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Latency percentile in seconds over the window (None before any sample)"""
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def score(self) -> float:
+        """Expected cost of sending a request here; unmeasured backends score 0 so they get tried"""
+        p50 = self.percentile(0.5)
+        if p50 is None:
+            return float("inf") if self.error_rate else 0.0
+        return p50 * (1 + 4 * self.error_rate)
+
+    def record_success(self, elapsed: float, latency: bool = True):
+        self.requests += 1
+        if latency:
+            self._latencies.append(elapsed)
+        self._outcomes.append(True)
+        self.breaker.record_success()
+
+    def record_failure(self):
+        self.requests += 1
+        self.failures += 1
+        self._outcomes.append(False)
+        self.breaker.record_failure()
+
+    def record_cancelled(self, elapsed: float):
+        # A hedge loser was at least this slow: keep it as a (censored) sample so a
+        # hanging backend drifts down the ranking instead of staying unmeasured
+        self.requests += 1
+        self.cancelled += 1
+        self._latencies.append(elapsed)
+        self.breaker.record_cancelled()
+
+    def stats(self) -> Dict[str, Any]:
+        p50 = self.percentile(0.5)
+        p95 = self.percentile(0.95)
+        return {
+            "name": self.name,
+            "provider": self.provider,
+            "model": self.model,
+            "state": self.breaker.state,
+            "requests": self.requests,
+            "failures": self.failures,
+            "cancelled": self.cancelled,
+            "wins": self.wins,
+            "error_rate": round(self.error_rate, 4),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "breaker_opened": self.breaker.times_opened,
+        }
+
+
+class LLMRouter:
+    """Sends each call to the best available backend, with hedging and failover.
+
+    Backends are ranked by rolling p50 latency inflated by their error rate
+    (configuration order breaks ties). If the chosen backend has not answered
+    after ``hedge_delay`` seconds the same call is started on the next one and
+    the first success wins; the loser is cancelled. A failure moves on to the
+    next backend at once. Backends whose circuit breaker is open are skipped.
+    """
+
+    def __init__(self, backends: List[LLMBackend], hedge_delay: float = 0.0,
+                 attempt_timeout: float = 0.0):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = backends
+        self.hedge_delay = hedge_delay
+        self.attempt_timeout = attempt_timeout
+        self._calls = 0
+        self._hedged = 0
+        self._hedge_wins = 0
+        self._failovers = 0
+        self._exhausted = 0
+
+    @property
+    def primary(self) -> LLMBackend:
+        return self.backends[0]
+
+    def ranked(self) -> List[LLMBackend]:
+        """Available backends, best first"""
+        order = {backend.name: position for position, backend in enumerate(self.backends)}
+        candidates = [backend for backend in self.backends if backend.breaker.available()]
+        return sorted(candidates, key=lambda backend: (backend.score(), order[backend.name]))
+
+    async def _attempt(self, call: Callable[[LLMBackend], Awaitable[Any]], backend: LLMBackend) -> Any:
+        if self.attempt_timeout > 0:
+            return await asyncio.wait_for(call(backend), self.attempt_timeout)
+        return await call(backend)
+
+    async def call(self, call: Callable[[LLMBackend], Awaitable[Any]],
+                   hedge: bool = True, record_latency: bool = True) -> Tuple[Any, LLMBackend]:
+        """Run ``call(backend)`` on the best backend; returns ``(result, backend)``"""
+        self._calls += 1
+        loop = asyncio.get_running_loop()
+        candidates = iter(self.ranked())
+        pending: Dict[asyncio.Task, Tuple[LLMBackend, float]] = {}
+        hedges = set()
+        hedge_at = loop.time() + self.hedge_delay if hedge and self.hedge_delay > 0 else None
+        last_error: Optional[BaseException] = None
+
+        def launch() -> Optional[asyncio.Task]:
+            for backend in candidates:
+                if backend.breaker.begin():
+                    task = asyncio.ensure_future(self._attempt(call, backend))
+                    task.add_done_callback(_consume_result)
+                    pending[task] = (backend, loop.time())
+                    return task
+            return None
+
+        if launch() is None:
+            self._exhausted += 1
+            retry_after = min(b.breaker.seconds_until_trial() for b in self.backends)
+            raise NoBackendAvailableError(
+                "No LLM backend available (all circuit breakers open)",
+                retry_after=max(1.0, math.ceil(retry_after))
+            )
+
+        try:
+            while pending:
+                timeout = max(0.0, hedge_at - loop.time()) if hedge_at is not None else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The hedge timer fired before any answer
+                    hedge_at = None
+                    hedge_task = launch()
+                    if hedge_task is not None:
+                        self._hedged += 1
+                        hedges.add(hedge_task)
+                    continue
+
+                for task in done:
+                    backend, started = pending.pop(task)
+                    elapsed = loop.time() - started
+                    error = task.exception()
+                    if error is None:
+                        backend.record_success(elapsed, latency=record_latency)
+                        backend.wins += 1
+                        if task in hedges:
+                            self._hedge_wins += 1
+                        return task.result(), backend
+                    if not _is_retryable(error):
+                        # The backend answered; the request itself is at fault
+                        backend.record_success(elapsed, latency=False)
+                        raise error
+                    backend.record_failure()
+                    last_error = error
+                    logger.warning(f"LLM backend {backend.name} failed after {elapsed:.2f}s: {error!r}")
+
+                if not pending:
+                    if launch() is None:
+                        break
+                    self._failovers += 1
+        finally:
+            for task, (backend, started) in pending.items():
+                task.cancel()
+                backend.record_cancelled(loop.time() - started)
+
+        self._exhausted += 1
+        if isinstance(last_error, asyncio.TimeoutError):
+            raise SchedulerTimeoutError(f"All LLM backends failed (last: attempt timed out after {self.attempt_timeout}s)")
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        """Router counters and per-backend latency, error rate and breaker state"""
+        return {
+            "hedge_delay": self.hedge_delay,
+            "attempt_timeout": self.attempt_timeout,
+            "calls": self._calls,
+            "hedged": self._hedged,
+            "hedge_wins": self._hedge_wins,
+            "failovers": self._failovers,
+            "exhausted": self._exhausted,
+            "backends": [backend.stats() for backend in self.backends],
+        }
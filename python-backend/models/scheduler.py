@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerError(Exception):
+    """Base error raised by the LLM scheduler"""
+    error_code = "llm_scheduler_error"
+
+    def __init__(self, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message)
+        # Seconds after which a retry is likely to be admitted (sent as Retry-After)
+        self.retry_after = retry_after
+
+
+class SchedulerQueueFullError(SchedulerError):
+    """Raised when the wait queue is already at capacity"""
+    error_code = "llm_queue_full"
+
+
+class SchedulerTimeoutError(SchedulerError):
+    """Raised when a request waits or runs longer than allowed"""
+    error_code = "llm_timeout"
+
+
+class LLMScheduler:
+    """Bounded concurrency limiter with a wait queue for LLM calls.
+
+    At most ``max_concurrency`` calls run at once; up to ``max_queue`` more
+    wait for a slot for at most ``queue_timeout`` seconds. Each call is
+    cancelled after ``request_timeout`` seconds. A request whose predicted
+    wait (queue position times the recent call duration) already exceeds
+    ``queue_timeout`` is rejected at once instead of queueing; rejections
+    carry a ``retry_after`` estimate.
+
+    With ``shared`` (a ``SharedState``), ``max_concurrency`` is a budget for
+    all worker processes together: each call also holds a lease in the
+    shared store, and waits in the queue while other workers use the budget.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int,
+                 queue_timeout: float, request_timeout: float, shared: Any = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.request_timeout = request_timeout
+        self.shared = shared
+        self._call_seconds: Optional[float] = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self._peak_in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a concurrency slot for the duration of the block (e.g. a stream)"""
+        if not self._semaphore.locked():
+            # A slot is free: acquiring completes without yielding to the loop
+            await self._semaphore.acquire()
+        else:
+            await self._wait_for_slot()
+        try:
+            lease = await self._lease_shared_slot()
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+        self._in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        started = time.perf_counter()
+        try:
+            yield
+            self._completed += 1
+            self._record_duration(time.perf_counter() - started)
+        except SchedulerTimeoutError:
+            raise
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+            if lease is not None:
+                self.shared.release(lease)
+
+    async def run(self, call: Callable[[], Awaitable[Any]],
+                  timeout: Optional[float] = None) -> Any:
+        """Run ``call()`` once a slot is free, enforcing queue and request timeouts"""
+        request_timeout = timeout if timeout is not None else self.request_timeout
+        async with self.slot():
+            try:
+                return await asyncio.wait_for(call(), request_timeout)
+            except asyncio.TimeoutError:
+                self._timed_out += 1
+                raise SchedulerTimeoutError(
+                    f"LLM request exceeded {request_timeout}s"
+                )
+
+    def _record_duration(self, seconds: float):
+        # Exponentially weighted mean of recent call durations
+        if self._call_seconds is None:
+            self._call_seconds = seconds
+        else:
+            self._call_seconds += 0.2 * (seconds - self._call_seconds)
+
+    def expected_wait(self) -> Optional[float]:
+        """Predicted seconds until a new request gets a slot (None before any call has finished)"""
+        if self._call_seconds is None:
+            return None
+        return self._call_seconds * (self._waiting + 1) / self.max_concurrency
+
+    def _retry_after(self) -> float:
+        wait = self.expected_wait()
+        return float(min(60, max(1, math.ceil(wait)))) if wait is not None else 1.0
+
+    def _admit_to_queue(self):
+        """Reject a request that would wait in a full queue or longer than ``queue_timeout``"""
+        if self._waiting >= self.max_queue:
+            self._rejected += 1
+            raise SchedulerQueueFullError(
+                f"LLM queue is full ({self._waiting} waiting, "
+                f"{self._in_flight} in flight)",
+                retry_after=self._retry_after()
+            )
+        wait = self.expected_wait()
+        if wait is not None and wait > self.queue_timeout:
+            self._rejected += 1
+            raise SchedulerQueueFullError(
+                f"LLM is saturated (expected wait {wait:.1f}s exceeds {self.queue_timeout}s)",
+                retry_after=self._retry_after()
+            )
+
+    async def _lease_shared_slot(self) -> Optional[int]:
+        """Lease a slot of the cross-worker budget, waiting in the queue while other workers use it"""
+        if self.shared is None:
+            return None
+        ttl = self.request_timeout + self.queue_timeout
+        self.shared.incr("llm_requests")
+        lease = self.shared.try_acquire("llm", self.max_concurrency, ttl)
+        if lease is not None:
+            return lease
+
+        self._admit_to_queue()
+        self._waiting += 1
+        try:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.queue_timeout
+            delay = 0.01
+            while True:
+                await asyncio.sleep(delay)
+                lease = self.shared.try_acquire("llm", self.max_concurrency, ttl)
+                if lease is not None:
+                    return lease
+                if loop.time() >= deadline:
+                    self._timed_out += 1
+                    raise SchedulerTimeoutError(
+                        f"Timed out after {self.queue_timeout}s waiting for an LLM slot (all workers busy)",
+                        retry_after=self._retry_after()
+                    )
+                delay = min(delay * 2, 0.1)
+        finally:
+            self._waiting -= 1
+
+    async def _wait_for_slot(self):
+        """Queue for a slot, rejecting when the queue is full or the wait times out"""
+        self._admit_to_queue()
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._timed_out += 1
+            raise SchedulerTimeoutError(
+                f"Timed out after {self.queue_timeout}s waiting for an LLM slot",
+                retry_after=self._retry_after()
+            )
+        finally:
+            self._waiting -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Current scheduler counters"""
+        stats = {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "peak_in_flight": self._peak_in_flight,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "timed_out": self._timed_out,
+            "avg_call_seconds": round(self._call_seconds, 3) if self._call_seconds is not None else None,
+            "expected_wait": round(self.expected_wait(), 3) if self._call_seconds is not None else None,
+        }
+        if self.shared is not None:
+            stats["shared"] = dict(
+                self.shared.stats(),
+                in_flight_all_workers=self.shared.live("llm"),
+                requests_per_minute_all_workers=self.shared.counter("llm_requests")
+            )
+        return stats
@@ -0,0 +1,193 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Lease id returned when the store is unusable: admission fails open instead of rejecting everything
+UNTRACKED_LEASE = -1
+
+
+class SharedState:
+    """Slot leases and rate counters shared by worker processes through one SQLite file.
+
+    Each worker opens the same file (WAL mode, so readers never block).
+    ``try_acquire`` grants a lease while fewer than ``limit`` leases with
+    that name are live across all workers; leases expire after their TTL, so
+    a worker that dies while holding some does not shrink the budget for
+    good. ``incr`` maintains fixed-window counters (e.g. requests per
+    minute across workers) and ``bump``/``generations`` per-name generation
+    numbers (e.g. one per table, so every worker notices an invalidation
+    made by another). Every operation is a single short transaction;
+    when another worker holds the write lock longer than ``busy_timeout``
+    the call reports "not now" rather than blocking the event loop.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 0.05):
+        self.path = path
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._window_floor: Dict[str, int] = {}
+        self.granted = 0
+        self.denied = 0
+        self.busy = 0
+        self.errors = 0
+        self._db = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, "
+            "pid INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS counters ("
+            "name TEXT NOT NULL, window INTEGER NOT NULL, value INTEGER NOT NULL, "
+            "PRIMARY KEY (name, window))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS generations (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        # Leases left by an earlier process with the same pid are stale
+        self._db.execute("DELETE FROM leases WHERE pid = ?", (self.pid,))
+        logger.info(f"Shared worker state at {path}")
+
+    def try_acquire(self, name: str, limit: int, ttl: float) -> Optional[int]:
+        """Lease id if a slot of the ``limit``-sized budget is free, otherwise None"""
+        now = time.time()
+        with self._lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    self._db.execute("DELETE FROM leases WHERE name = ? AND expires_at < ?", (name, now))
+                    live = self._db.execute("SELECT COUNT(*) FROM leases WHERE name = ?", (name,)).fetchone()[0]
+                    lease = None
+                    if live < limit:
+                        lease = self._db.execute(
+                            "INSERT INTO leases (name, pid, expires_at) VALUES (?, ?, ?)",
+                            (name, self.pid, now + ttl)
+                        ).lastrowid
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+            except sqlite3.OperationalError as e:
+                if "locked" in str(e) or "busy" in str(e):
+                    self.busy += 1
+                    return None
+                return self._fail_open(e)
+            except sqlite3.Error as e:
+                return self._fail_open(e)
+        if lease is None:
+            self.denied += 1
+        else:
+            self.granted += 1
+        return lease
+
+    def _fail_open(self, error: Exception) -> int:
+        self.errors += 1
+        logger.warning(f"Shared state unavailable, admitting without a lease: {error}")
+        return UNTRACKED_LEASE
+
+    def release(self, lease: Optional[int]):
+        if lease is None or lease == UNTRACKED_LEASE:
+            return
+        with self._lock:
+            try:
+                self._db.execute("DELETE FROM leases WHERE id = ?", (lease,))
+            except sqlite3.Error as e:
+                # The lease expires on its own after its TTL
+                self.errors += 1
+                logger.warning(f"Could not release shared lease {lease}: {e}")
+
+    def live(self, name: str) -> Optional[int]:
+        """Live leases for ``name`` across all workers"""
+        with self._lock:
+            try:
+                return self._db.execute(
+                    "SELECT COUNT(*) FROM leases WHERE name = ? AND expires_at >= ?", (name, time.time())
+                ).fetchone()[0]
+            except sqlite3.Error:
+                return None
+
+    def incr(self, name: str, window: float = 60.0, amount: int = 1) -> Optional[int]:
+        """Add to the current fixed-window counter and return its new value"""
+        current = int(time.time() // window)
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT INTO counters (name, window, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name, window) DO UPDATE SET value = value + excluded.value",
+                    (name, current, amount)
+                )
+                value = self._db.execute(
+                    "SELECT value FROM counters WHERE name = ? AND window = ?", (name, current)
+                ).fetchone()[0]
+                if self._window_floor.get(name, current) < current:
+                    self._db.execute("DELETE FROM counters WHERE name = ? AND window < ?", (name, current - 1))
+                self._window_floor[name] = current
+                return value
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.warning(f"Shared counter {name} not updated: {e}")
+                return None
+
+    def counter(self, name: str, window: float = 60.0) -> Dict[str, int]:
+        """Values of the current and previous windows"""
+        current = int(time.time() // window)
+        with self._lock:
+            try:
+                rows = dict(self._db.execute(
+                    "SELECT window, value FROM counters WHERE name = ? AND window >= ?", (name, current - 1)
+                ).fetchall())
+            except sqlite3.Error:
+                rows = {}
+        return {"current": rows.get(current, 0), "previous": rows.get(current - 1, 0)}
+
+    def bump(self, names: Iterable[str]) -> bool:
+        """Advance the generation of each name; False if the store could not be updated"""
+        with self._lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    self._db.executemany(
+                        "INSERT INTO generations (name, value) VALUES (?, 1) "
+                        "ON CONFLICT (name) DO UPDATE SET value = value + 1",
+                        [(name,) for name in names]
+                    )
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+                return True
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.warning(f"Shared generations not advanced: {e}")
+                return False
+
+    def generations(self, names: Iterable[str]) -> Optional[Dict[str, int]]:
+        """Current generation of each name (0 if never bumped), or None if the store is unreadable"""
+        names = list(names)
+        with self._lock:
+            try:
+                rows = dict(self._db.execute(
+                    f"SELECT name, value FROM generations WHERE name IN ({', '.join('?' * len(names))})", names
+                ).fetchall()) if names else {}
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.warning(f"Shared generations not readable: {e}")
+                return None
+        return {name: rows.get(name, 0) for name in names}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "pid": self.pid,
+            "granted": self.granted,
+            "denied": self.denied,
+            "busy": self.busy,
+            "errors": self.errors,
+        }
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from services.normalization import normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class BatchRunner:
+    """Runs many natural language queries through ``SQLAgent.process_query``.
+
+    Identical normalized queries are generated once and the rest fan out with
+    at most ``parallelism`` generations in flight. Generations run at batch
+    priority, so interactive requests go first when the LLM rate limit is tight.
+    """
+
+    def __init__(self, sql_agent, parallelism: int, client_id: Optional[str] = None):
+        self.sql_agent = sql_agent
+        self.parallelism = max(1, parallelism)
+        self.client_id = client_id
+
+    async def iter_results(self, queries: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield one item per input query as results complete, then a summary"""
+        started = time.perf_counter()
+        groups: Dict[str, List[int]] = {}
+        for index, query in enumerate(queries):
+            groups.setdefault(normalize_query(query), []).append(index)
+
+        semaphore = asyncio.Semaphore(self.parallelism)
+
+        async def run_one(indexes: List[int]):
+            async with semaphore:
+                item_start = time.perf_counter()
+                result = await self.sql_agent.process_query(
+                    queries[indexes[0]], client_id=self.client_id, priority="batch"
+                )
+                return indexes, result, (time.perf_counter() - item_start) * 1000
+
+        tasks = [asyncio.create_task(run_one(indexes)) for indexes in groups.values()]
+        latencies: List[float] = []
+        succeeded = failed = cache_hits = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                indexes, result, elapsed_ms = await next_done
+                latencies.append(elapsed_ms)
+                if (result.get("cache") or {}).get("hit"):
+                    cache_hits += 1
+                for position, index in enumerate(indexes):
+                    item = {
+                        "type": "item",
+                        "index": index,
+                        "query": queries[index],
+                        "elapsed_ms": round(elapsed_ms, 2),
+                        "result": dict(result, natural_query=queries[index]),
+                    }
+                    if position > 0:
+                        item["duplicate_of"] = indexes[0]
+                    if result.get("success"):
+                        succeeded += 1
+                    else:
+                        failed += 1
+                    yield item
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        latencies.sort()
+        yield {
+            "type": "summary",
+            "total": len(queries),
+            "unique": len(groups),
+            "deduplicated": len(queries) - len(groups),
+            "succeeded": succeeded,
+            "failed": failed,
+            "cache_hits": cache_hits,
+            "parallelism": self.parallelism,
+            "wall_ms": round((time.perf_counter() - started) * 1000, 2),
+            "generation_ms_total": round(sum(latencies), 2),
+            "latency_ms": {
+                "p50": round(_percentile(latencies, 0.50), 2),
+                "p95": round(_percentile(latencies, 0.95), 2),
+                "max": round(latencies[-1], 2) if latencies else 0.0,
+            },
+        }
+
+    async def run(self, queries: List[str]) -> Dict[str, Any]:
+        """Collect every result (in input order) and the summary"""
+        items: List[Dict[str, Any]] = [None] * len(queries)
+        summary: Dict[str, Any] = {}
+        async for item in self.iter_results(queries):
+            if item["type"] == "summary":
+                summary = item
+            else:
+                items[item["index"]] = item
+        summary = {key: value for key, value in summary.items() if key != "type"}
+        return {
+            "results": [{key: value for key, value in item.items() if key != "type"} for item in items],
+            "stats": summary,
+        }
@@ -0,0 +1,497 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.schema_catalog import SchemaCatalog
+from services.sql_validator import KEYWORDS, SQLValidator, tokenize
+
+AGGREGATE_FUNCTIONS = frozenset([
+    "COUNT", "SUM", "AVG", "MIN", "MAX", "GROUP_CONCAT", "STD", "STDDEV", "VARIANCE", "BIT_AND", "BIT_OR"
+])
+
+# Textbook (System R) selectivities, used because there are no column statistics offline.
+# Equality on a key is estimated from the number of distinct keys instead (see _key_selectivity).
+SELECTIVITY = {
+    "eq": 0.1,
+    "range": 1 / 3,
+    "between": 0.25,
+    "like": 0.1,
+    "null": 0.1,
+    "not_null": 0.9,
+    "ne": 0.9,
+    "function": 0.1,
+    "subquery": 1 / 3,
+}
+
+DEFAULT_TABLE_ROWS = 1000
+
+
+class CostEstimator:
+    """Offline cardinality and cost estimate for generated SELECT statements.
+
+    Row counts come from the data dump and index definitions from the schema
+    catalog, so no database connection is needed. Equality on a primary,
+    unique or foreign key matches rows / distinct keys (a foreign key has as
+    many distinct values as the referenced table has rows); other predicates
+    get textbook selectivities, joins are assumed to follow foreign keys (the many side
+    drives the result size) and each table is classified as index access,
+    index lookup (join) or full scan. Queries expected to return too many
+    rows get a ``LIMIT`` rewrite; full scans get index suggestions.
+    """
+
+    def __init__(self, catalog: SchemaCatalog, row_counts: Dict[str, int],
+                 max_result_rows: int = 1000, max_scan_rows: int = 10000, default_limit: int = 100):
+        self.catalog = catalog
+        self.row_counts = row_counts
+        self.max_result_rows = max_result_rows
+        self.max_scan_rows = max_scan_rows
+        self.default_limit = default_limit
+        self.validator = SQLValidator(catalog)
+
+    def estimate(self, sql_query: str) -> Dict[str, Any]:
+        """Estimated result/scanned rows, access path per table, suggestions and rewrite"""
+        tokens = tokenize(sql_query)
+        statement: List[Tuple[str, str]] = []
+        for token in tokens:
+            if token[0] == "semi":
+                if statement:
+                    break
+                continue
+            statement.append(token)
+
+        analysis = self.validator.analyze(statement)
+        alias_map = analysis["alias_map"]
+        tables = self._outer_tables(statement, alias_map)
+        facts = self._collect(statement, alias_map, tables)
+        rows = {t: self.row_counts.get(t, DEFAULT_TABLE_ROWS) for t in tables}
+
+        plan = self._plan_access(tables, rows, facts)
+        estimated = self._estimate_result(tables, rows, plan, facts, analysis["shape"])
+        suggestions = self._suggestions(plan, facts)
+
+        rewrite = None
+        limited = facts["limit"] is not None
+        if not limited and estimated > self.max_result_rows:
+            rewrite = {
+                "sql": self._inject_limit(sql_query, self.default_limit),
+                "original_sql": sql_query,
+                "reason": (
+                    f"Se estiman {estimated} filas (máximo {self.max_result_rows}); "
+                    f"se añade LIMIT {self.default_limit}"
+                ),
+            }
+
+        scanned = plan["scanned_rows"]
+        returned = min(estimated, self.default_limit) if rewrite else estimated
+        if scanned > self.max_scan_rows or returned > self.max_result_rows:
+            risk = "high"
+        elif scanned > self.max_scan_rows // 10 or returned > self.max_result_rows // 10:
+            risk = "medium"
+        else:
+            risk = "low"
+
+        return {
+            "estimated_rows": estimated,
+            "scanned_rows": scanned,
+            "risk": risk,
+            "tables": plan["tables"],
+            "suggestions": suggestions,
+            "rewrite": rewrite,
+        }
+
+    def _outer_tables(self, tokens: List[Tuple[str, str]], alias_map: Dict[str, str]) -> List[str]:
+        """Catalog tables in the FROM/JOIN list of the outer query (subqueries excluded)"""
+        tables: List[str] = []
+        depth = 0
+        expect_table = False
+        for kind, text in tokens:
+            if kind == "lp":
+                depth += 1
+                expect_table = False
+            elif kind == "rp":
+                depth -= 1
+            elif depth != 0:
+                continue
+            elif kind == "id" and text.upper() in ("FROM", "JOIN", "STRAIGHT_JOIN"):
+                expect_table = True
+            elif kind == "comma":
+                expect_table = expect_table or bool(tables)
+            elif kind == "id" and text.upper() in KEYWORDS:
+                expect_table = False
+            elif expect_table and kind in ("id", "qid"):
+                table = alias_map.get(text.lower())
+                if table is not None and table == text.lower() and self.catalog.has_table(table):
+                    if table not in tables:
+                        tables.append(table)
+                    expect_table = False
+        return tables
+
+    def _resolve(self, qualifier: Optional[str], column: str, alias_map: Dict[str, str],
+                 tables: List[str]) -> Optional[str]:
+        """Table owning a column reference, or None for aliases and unknown names"""
+        if qualifier is not None:
+            table = alias_map.get(qualifier.lower())
+            return table if table is not None and self.catalog.has_column(table, column) else None
+        for table in tables:
+            if self.catalog.has_column(table, column):
+                return table
+        return None
+
+    def _column_ref(self, tokens: List[Tuple[str, str]], i: int):
+        """``(qualifier, column, next_index)`` if a column reference starts at ``i``"""
+        n = len(tokens)
+        kind, text = tokens[i]
+        if kind not in ("id", "qid") or (kind == "id" and text.upper() in KEYWORDS):
+            return None
+        next_kind = tokens[i + 1][0] if i + 1 < n else None
+        if next_kind == "lp" or (i > 0 and tokens[i - 1][0] == "dot"):
+            return None
+        if next_kind == "dot":
+            if i + 2 < n and tokens[i + 2][0] in ("id", "qid"):
+                return text, tokens[i + 2][1].lower(), i + 3
+            return None
+        return None, text.lower(), i + 1
+
+    def _collect(self, tokens: List[Tuple[str, str]], alias_map: Dict[str, str],
+                 tables: List[str]) -> Dict[str, Any]:
+        """Predicates, join columns, grouping and LIMIT of the outer query"""
+        facts: Dict[str, Any] = {
+            "predicates": [],
+            "join_columns": set(),
+            "group_columns": [],
+            "having_columns": [],
+            "query_columns": {},
+            "wrapped_columns": [],
+            "leading_wildcards": [],
+            "has_aggregate": False,
+            "has_or": False,
+            "limit": None,
+        }
+        stack: List[str] = []
+        clause = None
+        limit_numbers: List[int] = []
+        limit_comma = False
+        n = len(tokens)
+        i = 0
+        while i < n:
+            kind, text = tokens[i]
+            in_subquery = "sub" in stack
+
+            if kind == "lp":
+                next_token = tokens[i + 1] if i + 1 < n else ("", "")
+                prev = tokens[i - 1] if i > 0 else ("", "")
+                if next_token[0] == "id" and next_token[1].upper() in ("SELECT", "WITH"):
+                    stack.append("sub")
+                elif prev[0] in ("id", "qid") and prev[1].upper() not in KEYWORDS:
+                    is_aggregate = prev[1].upper() in AGGREGATE_FUNCTIONS
+                    stack.append("agg" if is_aggregate else "call")
+                    if is_aggregate and clause == "SELECT" and not in_subquery:
+                        facts["has_aggregate"] = True
+                else:
+                    stack.append("group")
+                i += 1
+                continue
+            if kind == "rp":
+                if stack:
+                    stack.pop()
+                i += 1
+                continue
+            if in_subquery:
+                i += 1
+                continue
+
+            if kind == "id" and text.upper() in KEYWORDS:
+                upper = text.upper()
+                if not stack and upper in ("SELECT", "FROM", "JOIN", "WHERE", "GROUP", "HAVING",
+                                           "ORDER", "LIMIT", "ON", "USING", "UNION"):
+                    clause = "FROM" if upper == "JOIN" else upper
+                elif upper == "OR" and clause == "WHERE":
+                    facts["has_or"] = True
+                i += 1
+                continue
+
+            if clause == "LIMIT" and not stack:
+                if kind == "num":
+                    limit_numbers.append(int(float(text)))
+                elif kind == "comma":
+                    limit_comma = True
+                i += 1
+                continue
+
+            ref = self._column_ref(tokens, i) if clause not in (None, "FROM") else None
+            if ref is None:
+                i += 1
+                continue
+            qualifier, column, end = ref
+            table = self._resolve(qualifier, column, alias_map, tables)
+            if table is not None:
+                facts["query_columns"].setdefault(table, set()).add(column)
+                self._record(facts, clause, stack, table, column, tokens, end, alias_map, tables)
+            i = end
+
+        if limit_numbers:
+            facts["limit"] = limit_numbers[1] if limit_comma and len(limit_numbers) > 1 else limit_numbers[0]
+        return facts
+
+    def _record(self, facts: Dict[str, Any], clause: str, stack: List[str], table: str, column: str,
+                tokens: List[Tuple[str, str]], end: int, alias_map: Dict[str, str], tables: List[str]):
+        if clause == "GROUP":
+            facts["group_columns"].append((table, column))
+            return
+        if clause == "HAVING":
+            if "agg" not in stack:
+                facts["having_columns"].append((table, column))
+            return
+        if clause not in ("WHERE", "ON"):
+            return
+
+        if "call" in stack or "agg" in stack:
+            facts["wrapped_columns"].append((table, column))
+            if clause == "WHERE":
+                self._add_predicate(facts, table, column, "function", indexable=False)
+            return
+
+        n = len(tokens)
+        if end >= n:
+            return
+        kind, text = tokens[end]
+        rhs_index = end + 1
+        if kind == "op" and rhs_index < n:
+            rhs = self._column_ref(tokens, rhs_index)
+            if rhs is not None:
+                other = self._resolve(rhs[0], rhs[1], alias_map, tables)
+                if other is not None and other != table:
+                    facts["join_columns"].add((table, column))
+                    facts["join_columns"].add((other, rhs[1]))
+                return
+            if clause == "ON":
+                return
+            if text in ("=", "<=>"):
+                self._add_predicate(facts, table, column, "eq")
+            elif text in ("<", ">", "<=", ">="):
+                self._add_predicate(facts, table, column, "range")
+            elif text in ("!=", "<>"):
+                self._add_predicate(facts, table, column, "ne", indexable=False)
+            return
+        if kind != "id" or clause != "WHERE":
+            return
+
+        word = text.upper()
+        if word == "NOT":
+            self._add_predicate(facts, table, column, "ne", indexable=False)
+        elif word == "IN":
+            if rhs_index + 1 < n and tokens[rhs_index + 1][1].upper() in ("SELECT", "WITH"):
+                self._add_predicate(facts, table, column, "subquery")
+            else:
+                items = 1
+                depth = 0
+                for token_kind, _ in tokens[rhs_index:]:
+                    if token_kind == "lp":
+                        depth += 1
+                    elif token_kind == "rp":
+                        depth -= 1
+                        if depth == 0:
+                            break
+                    elif token_kind == "comma" and depth == 1:
+                        items += 1
+                key_selectivity = self._key_selectivity(table, column)
+                per_item = SELECTIVITY["eq"] if key_selectivity is None else key_selectivity
+                self._add_predicate(facts, table, column, "eq", selectivity=min(1.0, items * per_item))
+        elif word == "LIKE":
+            pattern = tokens[rhs_index][1] if rhs_index < n and tokens[rhs_index][0] == "str" else ""
+            leading_wildcard = pattern[1:2] in ("%", "_")
+            if leading_wildcard:
+                facts["leading_wildcards"].append((table, column))
+            self._add_predicate(facts, table, column, "like", indexable=not leading_wildcard)
+        elif word == "BETWEEN":
+            self._add_predicate(facts, table, column, "between")
+        elif word == "IS":
+            negated = rhs_index < n and tokens[rhs_index][1].upper() == "NOT"
+            self._add_predicate(facts, table, column, "not_null" if negated else "null", indexable=not negated)
+
+    def _add_predicate(self, facts: Dict[str, Any], table: str, column: str, kind: str,
+                       indexable: bool = True, selectivity: Optional[float] = None):
+        if kind == "eq" and selectivity is None:
+            selectivity = self._key_selectivity(table, column)
+            if selectivity is not None:
+                kind = "unique_eq" if self._is_unique(table, column) else "key_eq"
+        facts["predicates"].append({
+            "table": table,
+            "column": column,
+            "kind": kind,
+            "selectivity": SELECTIVITY.get(kind, 1.0) if selectivity is None else selectivity,
+            "indexable": indexable,
+        })
+
+    def _is_unique(self, table: str, column: str) -> bool:
+        definition = self.catalog.tables[table]
+        if definition["primary_key"] == [column]:
+            return True
+        return any(index["unique"] and index["columns"] == [column] for index in definition["indexes"])
+
+    def _key_selectivity(self, table: str, column: str) -> Optional[float]:
+        """1 / distinct keys for a unique or single-column foreign key, None for other columns"""
+        if self._is_unique(table, column):
+            return 1.0 / max(self.row_counts.get(table, DEFAULT_TABLE_ROWS), 1)
+        for fk in self.catalog.tables[table]["foreign_keys"]:
+            if fk["columns"] == [column]:
+                return 1.0 / max(self.row_counts.get(fk["ref_table"], DEFAULT_TABLE_ROWS), 1)
+        return None
+
+    def _index_for(self, table: str, column: str) -> Optional[List[str]]:
+        """An index (or primary key) whose leading column is ``column``"""
+        for prefix in self.catalog.indexed_prefixes(table):
+            if prefix and prefix[0] == column:
+                return prefix
+        return None
+
+    def _distinct_values(self, table: str, column: str, filtered_rows: float) -> float:
+        """Rough number of distinct values of a column, used for GROUP BY"""
+        if self._is_unique(table, column):
+            return filtered_rows
+        for fk in self.catalog.tables[table]["foreign_keys"]:
+            if fk["columns"] == [column]:
+                return min(filtered_rows, self.row_counts.get(fk["ref_table"], DEFAULT_TABLE_ROWS))
+        return max(1.0, filtered_rows * SELECTIVITY["eq"])
+
+    def _plan_access(self, tables: List[str], rows: Dict[str, int], facts: Dict[str, Any]) -> Dict[str, Any]:
+        """Selectivity and access path per table; the cheapest table drives the join"""
+        per_table: Dict[str, Dict[str, Any]] = {}
+        for table in tables:
+            predicates = [p for p in facts["predicates"] if p["table"] == table]
+            selectivity = 1.0
+            index = None
+            access_rows = float(rows[table])
+            if predicates and facts["has_or"]:
+                # An OR can match through any branch: add up and assume no single index helps
+                selectivity = min(1.0, sum(p["selectivity"] for p in predicates))
+            elif predicates:
+                indexed_selectivity = 1.0
+                for predicate in predicates:
+                    selectivity *= predicate["selectivity"]
+                    candidate = self._index_for(table, predicate["column"]) if predicate["indexable"] else None
+                    if candidate is not None:
+                        index = index or candidate
+                        indexed_selectivity *= predicate["selectivity"]
+                if index is not None:
+                    access_rows = rows[table] * indexed_selectivity
+            per_table[table] = {
+                "selectivity": selectivity,
+                "filtered_rows": max(1.0, rows[table] * selectivity) if predicates else float(rows[table]),
+                "index": index,
+                "access_rows": max(1.0, access_rows),
+            }
+
+        summary: Dict[str, Dict[str, Any]] = {}
+        scanned = 0.0
+        if tables:
+            driver = min(tables, key=lambda t: (per_table[t]["access_rows"], tables.index(t)))
+            scanned += per_table[driver]["access_rows"]
+            for table in tables:
+                info = per_table[table]
+                if table == driver:
+                    access = "index" if info["index"] else "full_scan"
+                    index = info["index"]
+                else:
+                    join_index = next(
+                        (self._index_for(t, c) for t, c in facts["join_columns"]
+                         if t == table and self._index_for(t, c) is not None), None
+                    )
+                    if info["index"] is not None:
+                        access, index = "index", info["index"]
+                    elif join_index is not None:
+                        access, index = "index_lookup", join_index
+                    else:
+                        access, index = "full_scan", None
+                    scanned += info["filtered_rows"] if access != "full_scan" else rows[table]
+                summary[table] = {
+                    "rows": rows[table],
+                    "estimated_rows": int(round(info["filtered_rows"])),
+                    "access": access,
+                    "index": index,
+                }
+        return {"tables": summary, "per_table": per_table, "scanned_rows": int(round(scanned))}
+
+    def _estimate_result(self, tables: List[str], rows: Dict[str, int], plan: Dict[str, Any],
+                         facts: Dict[str, Any], shape: Dict[str, Any]) -> int:
+        per_table = plan["per_table"]
+        if not tables:
+            estimated = 1.0
+        elif len(tables) == 1:
+            estimated = per_table[tables[0]]["filtered_rows"]
+        elif shape["cartesian_product"] and not facts["join_columns"]:
+            estimated = 1.0
+            for table in tables:
+                estimated *= per_table[table]["filtered_rows"]
+        else:
+            # Foreign-key joins keep the cardinality of the many side, filtered by every table
+            estimated = float(max(rows[t] for t in tables))
+            for table in tables:
+                estimated *= per_table[table]["selectivity"]
+
+        if facts["group_columns"]:
+            # Columns grouped next to a table's key are functionally dependent on it
+            group_tables: Dict[str, List[str]] = {}
+            for table, column in facts["group_columns"]:
+                group_tables.setdefault(table, []).append(column)
+            groups = 1.0
+            for table, columns in group_tables.items():
+                filtered_rows = per_table[table]["filtered_rows"]
+                if any(self._is_unique(table, column) for column in columns):
+                    groups *= filtered_rows
+                    continue
+                table_groups = 1.0
+                for column in columns:
+                    table_groups *= self._distinct_values(table, column, filtered_rows)
+                groups *= min(table_groups, filtered_rows)
+            estimated = min(estimated, groups)
+        elif facts["has_aggregate"]:
+            estimated = 1.0
+        if facts["limit"] is not None:
+            estimated = min(estimated, facts["limit"])
+        return max(int(round(estimated)), 0 if facts["limit"] == 0 else 1)
+
+    def _suggestions(self, plan: Dict[str, Any], facts: Dict[str, Any]) -> List[str]:
+        suggestions: List[str] = []
+        for table, info in plan["tables"].items():
+            if info["access"] != "full_scan" or info["rows"] <= self.max_scan_rows // 10:
+                continue
+            filter_columns = list(dict.fromkeys(
+                p["column"] for p in facts["predicates"]
+                if p["table"] == table and p["indexable"] and p["kind"] != "not_null"
+            ))
+            if not filter_columns:
+                continue
+            columns = filter_columns + sorted(facts["query_columns"].get(table, set()) - set(filter_columns))
+            if len(columns) <= 4 and len(columns) > len(filter_columns):
+                suggestions.append(
+                    f"Índice de cobertura sugerido: CREATE INDEX idx_{table}_{'_'.join(filter_columns)}_cov "
+                    f"ON {table} ({', '.join(columns)})"
+                )
+            else:
+                suggestions.append(
+                    f"Índice sugerido: CREATE INDEX idx_{table}_{'_'.join(filter_columns)} "
+                    f"ON {table} ({', '.join(filter_columns)})"
+                )
+        for table, column in dict.fromkeys(facts["leading_wildcards"]):
+            suggestions.append(
+                f"LIKE con comodín inicial sobre {table}.{column} no puede usar índices"
+            )
+        for table, column in dict.fromkeys(facts["wrapped_columns"]):
+            if self._index_for(table, column) is not None:
+                suggestions.append(
+                    f"Una función sobre {table}.{column} impide usar su índice; "
+                    f"conviene comparar la columna directamente (p. ej. con un rango de fechas)"
+                )
+        for table, column in dict.fromkeys(facts["having_columns"]):
+            suggestions.append(
+                f"La condición sobre {table}.{column} en HAVING no usa agregados; "
+                f"moverla a WHERE filtra antes de agrupar"
+            )
+        return suggestions
+
+    @staticmethod
+    def _inject_limit(sql_query: str, limit: int) -> str:
+        """Append a LIMIT, keeping the trailing semicolon (newline ends any -- comment)"""
+        body = sql_query.rstrip()
+        had_semicolon = body.endswith(";")
+        body = body.rstrip(";").rstrip()
+        return f"{body}\nLIMIT {limit}" + (";" if had_semicolon else "")
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Probes the LLM backends in the background and keeps the latest health in memory.
+
+    One probe runs every ``interval`` seconds (randomized by ``jitter`` so
+    replicas do not probe in lockstep); after failures the delay doubles up
+    to ``max_backoff``. A failed probe, or one where only some backends
+    answer, makes the state ``degraded``; ``down_after`` failures in a row
+    make it ``down``; ``recover_after`` clean probes in a row bring it back
+    to ``healthy``. Readers call ``snapshot`` and never trigger a probe, so
+    probe traffic is the same however often ``/health`` is polled.
+    """
+
+    def __init__(self, probe: Callable[[], Awaitable[Dict[str, Any]]], interval: float = 15.0,
+                 jitter: float = 0.2, max_backoff: float = 120.0, timeout: float = 5.0,
+                 down_after: int = 3, recover_after: int = 2, history: int = 100):
+        self.probe = probe
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max(interval, max_backoff)
+        self.timeout = timeout
+        self.down_after = max(1, down_after)
+        self.recover_after = max(1, recover_after)
+        self.state = "starting"
+        self._since = time.time()
+        self._last_result: Optional[Dict[str, Any]] = None
+        self._last_check: Optional[float] = None
+        self._next_check: Optional[float] = None
+        self._history = deque(maxlen=max(1, history))
+        self._transitions = deque(maxlen=20)
+        self._consecutive_failures = 0
+        self._consecutive_successes = 0
+        self._checks = 0
+        self._failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the probe loop on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.check()
+            delay = self._next_delay()
+            self._next_check = time.time() + delay
+            await asyncio.sleep(delay)
+
+    def _next_delay(self) -> float:
+        base = self.interval
+        if self._consecutive_failures:
+            base = min(self.max_backoff, self.interval * 2 ** (self._consecutive_failures - 1))
+        return base * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def check(self) -> Dict[str, Any]:
+        """Run one probe now and update the state machine"""
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self.probe(), self.timeout)
+        except asyncio.TimeoutError:
+            result = {"success": False, "error": f"Health probe timed out after {self.timeout}s"}
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        self._record(result, latency_ms)
+        return result
+
+    def _record(self, result: Dict[str, Any], latency_ms: float):
+        self._checks += 1
+        self._last_check = time.time()
+        self._last_result = result
+        ok = bool(result.get("success"))
+        partial = ok and any(not backend.get("success") for backend in result.get("backends", []))
+        self._history.append((self._last_check, latency_ms, ok))
+
+        if ok and not partial:
+            self._consecutive_failures = 0
+            self._consecutive_successes += 1
+            if self.state == "starting" or self._consecutive_successes >= self.recover_after:
+                self._transition("healthy")
+            return
+        if not ok:
+            self._failures += 1
+            self._consecutive_failures += 1
+        self._consecutive_successes = 0
+        if self._consecutive_failures >= self.down_after:
+            self._transition("down")
+        elif self.state != "down":
+            self._transition("degraded")
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning(f"LLM health: {self.state} -> {state}")
+        self._transitions.append({"from": self.state, "to": state, "at": time.time()})
+        self.state = state
+        self._since = time.time()
+
+    def _latency_percentile(self, q: float) -> Optional[float]:
+        latencies = sorted(latency for _, latency, _ in self._history)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Latest health, answered from memory"""
+        now = time.time()
+        last_latency = self._history[-1][1] if self._history else None
+        return {
+            "state": self.state,
+            "since": round(self._since, 3),
+            "last_check_age_s": round(now - self._last_check, 1) if self._last_check else None,
+            "next_check_in_s": round(max(0.0, self._next_check - now), 1) if self._next_check else None,
+            "last_result": self._last_result,
+            "consecutive_failures": self._consecutive_failures,
+            "checks": self._checks,
+            "failures": self._failures,
+            "latency_ms": {
+                "last": last_latency,
+                "p50": self._latency_percentile(0.5),
+                "p95": self._latency_percentile(0.95),
+            },
+            "transitions": list(self._transitions),
+        }
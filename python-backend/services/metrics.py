@@ -0,0 +1,233 @@
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Seconds; spans sub-millisecond parsing/validation up to slow local models
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGES = ("plan", "llm", "parse", "repair", "validate", "cost", "total")
+PARSE_MODES = ("structured", "json", "tolerant", "truncated", "raw")
+SOURCES = ("llm", "cache", "similarity", "coalesced")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Child for these label values; bind it once and reuse it on the hot path"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic counter; increments are plain attribute updates (no locks)"""
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, child in self._children.items():
+            lines.append(f"{self.name}{_label_text(self.labelnames, values)} {_number(child.value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; ``observe`` is a bisect and three additions"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), child.counts):
+                cumulative += count
+                le = _label_text(self.labelnames, values, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _label_text(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Gauge (or counter) read from a callback at scrape time, e.g. from a component's stats()"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 callback: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]], kind: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, value in self.callback():
+            if value is None:
+                continue
+            lines.append(f"{self.name}{_label_text(self.labelnames, values)} {_number(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, labelnames: Sequence[str],
+                 callback: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]],
+                 kind: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, labelnames, callback, kind))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+class AgentMetrics:
+    """Metrics of the /generate-sql pipeline.
+
+    Label children for the fixed label sets (stages, parse modes, sources)
+    are bound once here, so recording on the request path is a dict lookup
+    and an in-place update with no allocation.
+    """
+
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        stage_seconds = self.registry.histogram(
+            "sql_agent_stage_seconds", "Time spent in each stage of SQL generation", ["stage"]
+        )
+        self.stage = {stage: stage_seconds.labels(stage) for stage in STAGES}
+        queries = self.registry.counter(
+            "sql_agent_queries_total", "Answered queries by source (LLM call, cache tier or coalesced with an identical in-flight query)", ["source"]
+        )
+        self.queries = {source: queries.labels(source) for source in SOURCES}
+        parses = self.registry.counter(
+            "sql_agent_llm_parse_total",
+            "LLM responses by parsing path (structured output, valid JSON, tolerant, truncated, raw text)",
+            ["mode"]
+        )
+        self.parses = {mode: parses.labels(mode) for mode in PARSE_MODES}
+        validations = self.registry.counter(
+            "sql_agent_validation_total", "Generated SQL by validation outcome", ["valid"]
+        )
+        self.validations = {True: validations.labels("true"), False: validations.labels("false")}
+        self.tokens = self.registry.counter(
+            "sql_agent_llm_tokens_total", "Tokens reported by the LLM usage field (cached: prompt tokens served from the provider's prompt cache)", ["backend", "kind"]
+        )
+        self.errors = self.registry.counter(
+            "sql_agent_llm_errors_total", "Failed generations by provider, model and error code",
+            ["provider", "model", "code"]
+        )
+
+    def record_generation(self, result: Dict[str, Any]):
+        """Count one LLM result: stage timings, parse mode, token usage or error"""
+        if not result["success"]:
+            self.errors.labels(
+                result.get("provider", ""), result.get("model", ""), result.get("error_code") or "error"
+            ).inc()
+            return
+        timings = result.get("timings")
+        if timings:
+            self.stage["llm"].observe(timings["llm"])
+            self.stage["parse"].observe(timings["parse"])
+        parse = self.parses.get(result.get("parse"))
+        if parse is not None:
+            parse.inc()
+        usage = result.get("usage")
+        if usage:
+            backend = result.get("backend", "")
+            self.tokens.labels(backend, "prompt").inc(usage.get("prompt_tokens") or 0)
+            self.tokens.labels(backend, "completion").inc(usage.get("completion_tokens") or 0)
+            self.tokens.labels(backend, "cached").inc(usage.get("cached_tokens") or 0)
+
+    def render(self) -> str:
+        return self.registry.render()
@@ -0,0 +1,24 @@
+import re
+import unicodedata
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " \t\r\n¿?¡!.;,:"
+
+
+def strip_accents(text: str) -> str:
+    """Remove diacritics (película -> pelicula) keeping the base letters"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a natural language query used for cache keys.
+
+    Lowercases, strips accents, collapses whitespace and trims the
+    question/exclamation marks and punctuation around the query.
+    """
+    if not text:
+        return ""
+    normalized = strip_accents(text.lower())
+    normalized = _WHITESPACE_RE.sub(" ", normalized)
+    return normalized.strip(_EDGE_PUNCTUATION)
@@ -0,0 +1,213 @@
+import hashlib
+import heapq
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from services.normalization import normalize_query
+from services.schema_catalog import SchemaCatalog
+
+_WORD_RE = re.compile(r"[a-z0-9_]+")
+_LETTERS_RE = re.compile(r"[^\W\d_]+")
+
+# Word stems (accent-free, lowercase) that point to each Sakila table.
+# A query word matches when it starts with one of the stems, so a stem must
+# not be the start of another table's word ("local" would match "localidad").
+TABLE_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "actor": ("actor", "actri", "reparto", "interpret", "protagoni"),
+    "pelicula": ("pelicul", "film", "titulo", "cine", "estreno", "lanzamiento",
+                 "clasificacion", "duracion", "trailer", "sinopsis"),
+    "categoria": ("categori", "genero", "accion", "comedia", "drama", "terror", "horror",
+                  "animacion", "documental", "infantil", "familia", "deporte", "ficcion",
+                  "clasic", "musica", "viajes", "extranjer"),
+    "cliente": ("client", "socio", "comprador", "usuario"),
+    "alquiler": ("alquil", "renta", "prestamo", "prestad", "devolu", "devuelt",
+                 "pendiente", "retras"),
+    "pago": ("pago", "pagad", "pagar", "ingreso", "factura", "importe", "dinero",
+             "recaud", "gast", "venta", "cobr"),
+    "inventario": ("inventario", "copia", "ejemplar", "stock", "disponib", "existencia"),
+    "almacen": ("almacen", "tienda", "sucursal"),
+    "empleado": ("emplead", "personal", "trabajador", "staff", "vendedor", "gerente", "jefe"),
+    "direccion": ("direccion", "domicilio", "distrito", "postal", "telefono"),
+    "ciudad": ("ciudad", "localidad", "municipio"),
+    "pais": ("pais", "paises", "nacion", "extranjero"),
+    "idioma": ("idioma", "lengua", "ingles", "espanol", "doblad", "doblaje"),
+    "film_text": ("fulltext", "texto completo"),
+}
+
+# Tables reached through a proper noun (e.g. "clientes de Madrid") when a
+# table with an address is selected
+LOCATION_TABLES = ("direccion", "ciudad", "pais")
+ADDRESS_TABLES = ("cliente", "empleado", "almacen")
+
+# Joining through these structural tables is a last resort when connecting
+# the selected tables (cliente -> pelicula should go through alquiler)
+HUB_TABLES = {"almacen": 1.5, "empleado": 1.5, "direccion": 1.2}
+
+SCHEMA_SECTION_MARKERS = ("ESQUEMA", "RELACIONES")
+
+# Bump when the order of the prompt sections changes (part of cache keys and prefix versions)
+PROMPT_LAYOUT_VERSION = 2
+
+
+def _has_proper_noun(text: str) -> bool:
+    """True if a capitalized word appears after the first word (e.g. a city name)"""
+    words = _LETTERS_RE.findall(text or "")
+    return any(word[0].isupper() and not word.isupper() for word in words[1:])
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for Spanish/SQL text)"""
+    return (len(text) + 3) // 4
+
+
+@lru_cache(maxsize=16)
+def prefix_version(prefix: str) -> str:
+    """Short identity of a static prompt prefix; equal versions mean byte-identical prefixes"""
+    digest = hashlib.sha256(f"{PROMPT_LAYOUT_VERSION}\x1f{prefix}".encode("utf-8")).hexdigest()
+    return f"v{PROMPT_LAYOUT_VERSION}-{digest[:12]}"
+
+
+class TableRanker:
+    """Keyword/synonym ranker selecting the Sakila tables a question needs"""
+
+    def __init__(self, catalog: SchemaCatalog, max_tables: int = 8):
+        self.catalog = catalog
+        self.max_tables = max_tables
+        self._keywords = [
+            (stem, table) for table, stems in TABLE_KEYWORDS.items()
+            if catalog.has_table(table) for stem in stems
+        ]
+
+    def score(self, natural_query: str) -> Dict[str, float]:
+        """Relevance score per table for a natural language query"""
+        normalized = normalize_query(natural_query)
+        words = _WORD_RE.findall(normalized)
+        scores: Dict[str, float] = {}
+        for word in words:
+            if self.catalog.has_table(word):
+                scores[word] = scores.get(word, 0.0) + 2.0
+            for stem, table in self._keywords:
+                if word.startswith(stem):
+                    scores[table] = scores.get(table, 0.0) + 1.0
+            owners = self.catalog.tables_with_column(word)
+            for table in owners:
+                scores[table] = scores.get(table, 0.0) + 0.5 / len(owners)
+        for stem, table in self._keywords:
+            if " " in stem and stem in normalized:
+                scores[table] = scores.get(table, 0.0) + 1.0
+
+        if _has_proper_noun(natural_query) and any(t in scores for t in ADDRESS_TABLES):
+            for table in LOCATION_TABLES:
+                if self.catalog.has_table(table):
+                    scores[table] = scores.get(table, 0.0) + 0.5
+        return scores
+
+    def select(self, natural_query: str) -> List[str]:
+        """Ranked seed tables plus the FK-graph tables needed to join them.
+
+        Seeds are added in rank order together with their join path while the
+        result stays within ``max_tables``; a seed whose path does not fit is
+        left out rather than its bridge tables, so every selected table can
+        be joined to the others.
+        """
+        scores = self.score(natural_query)
+        seeds = sorted(scores, key=lambda t: (-scores[t], t))
+        if not seeds:
+            return []
+        selected: List[str] = [seeds[0]]
+        for table in seeds[1:]:
+            if len(selected) >= self.max_tables:
+                break
+            path = [step for step in self._join_path(set(selected), table) if step not in selected]
+            if len(selected) + len(path) <= self.max_tables:
+                selected.extend(path)
+        return selected
+
+    def _join_path(self, connected: Set[str], target: str) -> List[str]:
+        """Cheapest FK path from any connected table to ``target`` (inclusive)"""
+        if target in connected:
+            return []
+        frontier = [(0.0, table, (table,)) for table in sorted(connected)]
+        heapq.heapify(frontier)
+        seen: Set[str] = set()
+        while frontier:
+            cost, table, path = heapq.heappop(frontier)
+            if table == target:
+                return list(path[1:])
+            if table in seen:
+                continue
+            seen.add(table)
+            for neighbor in sorted(self.catalog.neighbors(table)):
+                if neighbor not in seen:
+                    step_cost = HUB_TABLES.get(neighbor, 1.0)
+                    heapq.heappush(frontier, (cost + step_cost, neighbor, path + (neighbor,)))
+        return [target]
+
+
+class PromptBuilder:
+    """Builds a per-query system prompt containing only the relevant tables.
+
+    The static sections of ``system-prompt.md`` (role, rules, examples, JSON
+    format) are kept verbatim and placed first, as a byte-identical prefix
+    shared by every query, so provider prompt caches (OpenAI prompt caching,
+    llama.cpp's KV cache) can reuse it. The schema and relationship sections
+    are replaced by compact DDL of the selected tables and come last.
+    """
+
+    def __init__(self, base_prompt: str, catalog: SchemaCatalog, max_tables: int = 8):
+        self.base_prompt = base_prompt
+        self.catalog = catalog
+        self.ranker = TableRanker(catalog, max_tables=max_tables)
+        before_schema, after_schema = self._split_sections(base_prompt)
+        self.static_prefix = before_schema + after_schema.rstrip() + "\n\n"
+        self.prefix_version = prefix_version(self.static_prefix)
+        self.prefix_tokens = estimate_tokens(self.static_prefix)
+        self.full_prompt_tokens = estimate_tokens(base_prompt)
+        self._rendered = {name: catalog.render_table(name) for name in catalog.tables}
+
+    @staticmethod
+    def _split_sections(prompt: str) -> Tuple[str, str]:
+        """Split the prompt around its schema sections (level-2 headings)"""
+        sections = re.split(r"(?m)^(?=## )", prompt)
+        before: List[str] = []
+        after: List[str] = []
+        seen_schema = False
+        for section in sections:
+            heading = section.split("\n", 1)[0].upper()
+            if heading.startswith("## ") and any(m in heading for m in SCHEMA_SECTION_MARKERS):
+                seen_schema = True
+                continue
+            (after if seen_schema else before).append(section)
+        return "".join(before).rstrip() + "\n\n", "".join(after).lstrip()
+
+    def _schema_section(self, tables: List[str]) -> str:
+        lines = ["## ESQUEMA DE BASE DE DATOS Sakila_es (tablas relevantes para la consulta)", ""]
+        lines.append("```sql")
+        lines.append("\n\n".join(self._rendered[name] for name in tables))
+        lines.append("```")
+        relationships = self.catalog.render_relationships(tables)
+        if relationships:
+            lines.append("")
+            lines.append("### Relaciones")
+            lines.extend(f"- {rel}" for rel in relationships)
+        return "\n".join(lines) + "\n\n"
+
+    def build(self, natural_query: str, tables: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Return the pruned prompt, the selected tables and token estimates"""
+        if tables is None:
+            tables = self.ranker.select(natural_query)
+        if not tables:
+            # Nothing matched: fall back to every table, still in compact form
+            tables = list(self.catalog.tables)
+        prompt = self.static_prefix + self._schema_section(tables)
+        prompt_tokens = estimate_tokens(prompt)
+        return {
+            "prompt": prompt,
+            "tables": tables,
+            "prompt_tokens": prompt_tokens,
+            "full_prompt_tokens": self.full_prompt_tokens,
+            "tokens_saved": max(self.full_prompt_tokens - prompt_tokens, 0),
+            "prefix_version": self.prefix_version,
+            "prefix_tokens": self.prefix_tokens,
+        }
@@ -0,0 +1,168 @@
+import copy
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(normalized_query: str, prompt_hash: str, model: str, provider: str) -> str:
+    """Cache key for a generation: (normalized query, system prompt, model, provider)"""
+    raw = "\x1f".join([normalized_query, prompt_hash, model or "", provider or ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class QueryCache:
+    """Two-tier cache for generated SQL results.
+
+    Tier 1 is an in-process LRU with TTL. Tier 2 is an optional SQLite file
+    that survives restarts; disk hits are promoted back into memory. Lookups
+    run on the event loop, so a disk tier locked by another worker waits at
+    most ``disk_timeout`` seconds and then counts as a miss (or a skipped
+    write). Values are copied in and out: callers may modify what they get.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600,
+                 sqlite_path: Optional[str] = None, disk_timeout: float = 0.05):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.sqlite_path = sqlite_path or None
+        self.disk_timeout = max(0.0, disk_timeout)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "writes": 0,
+        }
+        if self.sqlite_path:
+            self._open_disk_tier()
+
+    def _open_disk_tier(self):
+        """Open (and create if needed) the SQLite tier"""
+        try:
+            # Workers starting together may contend for the file: wait longer while opening
+            self._db = sqlite3.connect(self.sqlite_path, timeout=5.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._db.execute(f"PRAGMA busy_timeout = {int(self.disk_timeout * 1000)}")
+            logger.info(f"Query cache disk tier at {self.sqlite_path}")
+        except sqlite3.Error as e:
+            logger.error(f"Could not open query cache database {self.sqlite_path}: {e}")
+            self._db = None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return ``{"value": ..., "tier": ...}`` for a live entry or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return {"value": copy.deepcopy(value), "tier": "memory"}
+                del self._memory[key]
+                self._counters["expirations"] += 1
+
+            value = self._disk_get(key, now)
+            if value is not None:
+                self._counters["disk_hits"] += 1
+                self._memory_set(key, copy.deepcopy(value), now)
+                return {"value": value, "tier": "disk"}
+
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """Store a result in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._memory_set(key, copy.deepcopy(value), now)
+            self._disk_set(key, value, now)
+            self._counters["writes"] += 1
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM query_cache")
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Query cache clear failed: {e}")
+
+    def _memory_set(self, key: str, value: Dict[str, Any], now: float):
+        self._memory[key] = (now + self.ttl, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _disk_get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM query_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._db.execute("DELETE FROM query_cache WHERE key = ?", (key,))
+                self._db.commit()
+                self._counters["expirations"] += 1
+                return None
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Query cache disk read failed: {e}")
+            return None
+
+    def _disk_set(self, key: str, value: Dict[str, Any], now: float):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO query_cache (key, value, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now + self.ttl)
+            )
+            self._db.commit()
+        except (sqlite3.Error, TypeError) as e:
+            logger.warning(f"Query cache disk write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and tier sizes"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+            stats["memory_entries"] = len(self._memory)
+            stats["max_entries"] = self.max_entries
+            stats["ttl"] = self.ttl
+            stats["disk_enabled"] = self._db is not None
+            if self._db is not None:
+                try:
+                    stats["disk_entries"] = self._db.execute(
+                        "SELECT COUNT(*) FROM query_cache"
+                    ).fetchone()[0]
+                except sqlite3.Error:
+                    stats["disk_entries"] = None
+            return stats
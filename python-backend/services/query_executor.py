@@ -0,0 +1,316 @@
+import asyncio
+import importlib.util
+import logging
+import sqlite3
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from services.sqlite_mirror import SQLiteMirror
+
+logger = logging.getLogger(__name__)
+
+
+# MySQL protocol column type codes (pymysql.constants.FIELD_TYPE) by portable type name
+_MYSQL_TYPES = {
+    0: "decimal", 246: "decimal",
+    1: "int", 2: "int", 3: "int", 8: "int", 9: "int", 13: "int",
+    4: "float", 5: "float",
+    10: "date", 7: "datetime", 12: "datetime", 11: "time",
+    245: "string", 247: "string", 248: "string",
+    16: "bytes", 255: "bytes",
+}
+# CHAR/VARCHAR/TEXT and BINARY/VARBINARY/BLOB share these codes; the charset tells them apart
+_MYSQL_TEXT_TYPES = {15, 249, 250, 251, 252, 253, 254}
+_MYSQL_BINARY_CHARSET = 63
+_MYSQL_BINARY_FLAG = 128
+
+
+def _mysql_column_type(description: tuple, field: Any = None) -> Optional[str]:
+    """Portable type of a result column from a DB-API description, None when unknown.
+
+    ``field`` is the driver's column descriptor (``charsetnr``, ``flags``);
+    without it text and binary columns are inferred from their values.
+    """
+    type_code = description[1]
+    if type_code in _MYSQL_TEXT_TYPES:
+        if field is None:
+            return None
+        charset = getattr(field, "charsetnr", None)
+        if charset is None:
+            binary = bool(getattr(field, "flags", 0) & _MYSQL_BINARY_FLAG)
+        else:
+            # The BINARY flag is also set on *_bin collations, which still decode to text
+            binary = charset == _MYSQL_BINARY_CHARSET
+        return "bytes" if binary else "string"
+    type_name = _MYSQL_TYPES.get(type_code)
+    if type_name == "decimal":
+        precision, scale = description[4], description[5]
+        return f"decimal({max(int(precision or 38), 1)},{int(scale or 0)})"
+    return type_name
+
+
+def _sqlite_column_types(columns: List[str], rows: List[Any]) -> List[Optional[str]]:
+    """Portable type per column from every returned value (SQLite types values, not columns)"""
+    seen: List[set] = [set() for _ in columns]
+    for row in rows:
+        for position, value in enumerate(row):
+            if value is not None:
+                seen[position].add(type(value))
+    types: List[Optional[str]] = []
+    for kinds in seen:
+        if not kinds:
+            types.append(None)
+        elif kinds <= {int}:
+            types.append("int")
+        elif kinds <= {int, float}:
+            types.append("float")
+        elif kinds == {bytes}:
+            types.append("bytes")
+        else:
+            types.append("string")
+    return types
+
+
+def aiomysql_available() -> bool:
+    return importlib.util.find_spec("aiomysql") is not None
+
+
+class QueryExecutionError(Exception):
+    """A query could not be run; ``error_code`` is db_error, db_timeout or db_unavailable"""
+
+    def __init__(self, message: str, error_code: str = "db_error"):
+        super().__init__(message)
+        self.error_code = error_code
+
+
+class _ExecutorStats:
+    def __init__(self):
+        self.executed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.truncated = 0
+        self.cancelled = 0
+        self.rows = 0
+        self.active = 0
+        self.peak_active = 0
+        self.elapsed_ms = 0.0
+
+    def started(self):
+        self.executed += 1
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "executed": self.executed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "truncated": self.truncated,
+            "cancelled": self.cancelled,
+            "rows_streamed": self.rows,
+            "active": self.active,
+            "peak_active": self.peak_active,
+            "avg_ms": round(self.elapsed_ms / self.executed, 2) if self.executed else 0.0,
+        }
+
+
+class MySQLExecutor:
+    """Runs read-only queries on MySQL through an ``aiomysql`` pool with server-side cursors.
+
+    Rows are read in batches of ``batch_size`` as the caller consumes them, so
+    a large result set is never held in memory. Sessions are read-only and
+    capped with ``max_execution_time``; the client also enforces the
+    timeout. When a stream stops early (row cap, timeout, client gone) the
+    connection is closed instead of draining the remaining rows.
+    """
+
+    backend = "mysql"
+
+    def __init__(self, host: str, port: int, user: str, password: str, database: str,
+                 min_size: int = 1, max_size: int = 10, timeout: float = 10.0, batch_size: int = 500):
+        self._connect_kwargs = {
+            "host": host, "port": port, "user": user, "password": password, "db": database,
+            "charset": "utf8mb4", "autocommit": True,
+            "init_command": (
+                f"SET SESSION max_execution_time = {int(timeout * 1000)}, SESSION transaction_read_only = 1"
+            ),
+        }
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+        self._stats = _ExecutorStats()
+
+    async def _get_pool(self):
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    import aiomysql
+                    try:
+                        self._pool = await asyncio.wait_for(
+                            aiomysql.create_pool(minsize=self.min_size, maxsize=self.max_size, **self._connect_kwargs),
+                            self.timeout
+                        )
+                    except (asyncio.TimeoutError, OSError, aiomysql.Error) as e:
+                        raise QueryExecutionError(f"MySQL no disponible: {e}", "db_unavailable") from e
+        return self._pool
+
+    async def stream(self, sql_query: str, max_rows: int) -> AsyncIterator[Dict[str, Any]]:
+        """Yield ``columns``, then ``rows`` batches, then ``end`` with the row count and truncation flag.
+
+        ``columns`` carries the column names and a portable type per column
+        (``int``, ``float``, ``decimal(p,s)``, ``date``, ``datetime``, ``time``, ``string``,
+        ``bytes`` or None when unknown), so typed outputs can fix their schema
+        before the first row.
+        """
+        import aiomysql
+        pool = await self._get_pool()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        started = time.perf_counter()
+        row_count = 0
+        finished = False
+        self._stats.started()
+        try:
+            conn = await asyncio.wait_for(pool.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._stats.active -= 1
+            self._stats.failed += 1
+            raise QueryExecutionError("No hay conexiones libres a MySQL", "db_unavailable")
+        try:
+            cursor = await conn.cursor(aiomysql.SSCursor)
+            await asyncio.wait_for(cursor.execute(sql_query), max(0.0, deadline - loop.time()))
+            description = cursor.description or ()
+            fields = getattr(getattr(cursor, "_result", None), "fields", None) or [None] * len(description)
+            yield {
+                "type": "columns",
+                "columns": [column[0] for column in description],
+                "types": [_mysql_column_type(column, field) for column, field in zip(description, fields)],
+            }
+            while row_count < max_rows:
+                size = min(self.batch_size, max_rows - row_count)
+                rows = await asyncio.wait_for(cursor.fetchmany(size), max(0.0, deadline - loop.time()))
+                if not rows:
+                    finished = True
+                    break
+                row_count += len(rows)
+                self._stats.rows += len(rows)
+                yield {"type": "rows", "rows": [list(row) for row in rows]}
+            truncated = False
+            if not finished:
+                # Cap reached: one more row tells whether anything was left out
+                truncated = bool(await asyncio.wait_for(cursor.fetchmany(1), max(0.0, deadline - loop.time())))
+                finished = not truncated
+                self._stats.truncated += int(truncated)
+            if finished:
+                await cursor.close()
+            yield {
+                "type": "end",
+                "row_count": row_count,
+                "truncated": truncated,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+            }
+        except asyncio.TimeoutError:
+            self._stats.timeouts += 1
+            raise QueryExecutionError(f"La consulta superó el tiempo máximo de {self.timeout}s", "db_timeout")
+        except aiomysql.Error as e:
+            self._stats.failed += 1
+            # 3024: max_execution_time exceeded on the server
+            code = "db_timeout" if getattr(e, "args", (None,))[0] == 3024 else "db_error"
+            if code == "db_timeout":
+                self._stats.timeouts += 1
+            raise QueryExecutionError(str(e), code) from e
+        except (GeneratorExit, asyncio.CancelledError):
+            self._stats.cancelled += 1
+            raise
+        finally:
+            self._stats.active -= 1
+            self._stats.elapsed_ms += (time.perf_counter() - started) * 1000
+            if not finished:
+                # Unread rows would have to be drained before reusing the connection
+                conn.close()
+            pool.release(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats.to_dict(), backend=self.backend, timeout=self.timeout)
+        if self._pool is not None:
+            stats["pool"] = {"size": self._pool.size, "free": self._pool.freesize, "max": self.max_size}
+        return stats
+
+    async def aclose(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+
+
+class SQLiteExecutor:
+    """Runs queries on the in-memory SQLite mirror of Sakila (with its data).
+
+    A stand-in for MySQL in development and tests: the query is translated
+    to SQLite, run in a worker thread with the same row cap and timeout, and
+    served in batches like ``MySQLExecutor``.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, mirror: SQLiteMirror, timeout: float = 10.0, batch_size: int = 500):
+        self.mirror = mirror
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self._stats = _ExecutorStats()
+
+    async def stream(self, sql_query: str, max_rows: int) -> AsyncIterator[Dict[str, Any]]:
+        """Same events as ``MySQLExecutor.stream``"""
+        started = time.perf_counter()
+        self._stats.started()
+        try:
+            try:
+                result = await asyncio.to_thread(self.mirror.execute, sql_query, max_rows, self.timeout)
+            except sqlite3.OperationalError as e:
+                if str(e) == "interrupted":
+                    self._stats.timeouts += 1
+                    raise QueryExecutionError(
+                        f"La consulta superó el tiempo máximo de {self.timeout}s", "db_timeout"
+                    ) from e
+                self._stats.failed += 1
+                raise QueryExecutionError(str(e)) from e
+            except (sqlite3.Error, sqlite3.Warning) as e:
+                self._stats.failed += 1
+                raise QueryExecutionError(str(e)) from e
+
+            rows: List[Any] = result["rows"]
+            yield {
+                "type": "columns",
+                "columns": result["columns"],
+                "types": _sqlite_column_types(result["columns"], rows),
+            }
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                self._stats.rows += len(batch)
+                yield {"type": "rows", "rows": [list(row) for row in batch]}
+            self._stats.truncated += int(result["truncated"])
+            yield {
+                "type": "end",
+                "row_count": len(rows),
+                "truncated": result["truncated"],
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+            }
+        except (GeneratorExit, asyncio.CancelledError):
+            self._stats.cancelled += 1
+            raise
+        finally:
+            self._stats.active -= 1
+            self._stats.elapsed_ms += (time.perf_counter() - started) * 1000
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            self._stats.to_dict(),
+            backend=self.backend,
+            timeout=self.timeout,
+            mirror_rows=self.mirror.rows_loaded
+        )
+
+    async def aclose(self):
+        pass
@@ -0,0 +1,248 @@
+import hashlib
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from services.sql_validator import tokenize
+
+_LITERALS = ("str", "num")
+
+# Generation name bumped when every result is invalidated
+ALL_TABLES = "*"
+
+
+def _canonical_string(literal: str) -> str:
+    """'abc' and "abc" are the same MySQL string literal"""
+    body = literal[1:-1]
+    if literal[0] == '"':
+        body = body.replace('""', '"').replace("'", "''")
+    return f"'{body}'"
+
+
+def _sorted_in_lists(tokens: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Sort and dedupe the items of ``IN (literal, ...)`` lists"""
+    out: List[Tuple[str, str]] = []
+    i = 0
+    while i < len(tokens):
+        out.append(tokens[i])
+        if tokens[i][1] == "in" and i + 1 < len(tokens) and tokens[i + 1][0] == "lp":
+            close = i + 2
+            while close < len(tokens) and tokens[close][0] in _LITERALS + ("comma",):
+                close += 1
+            items = tokens[i + 2:close:2]
+            separators = tokens[i + 3:close:2]
+            if (close < len(tokens) and tokens[close][0] == "rp" and items
+                    and all(kind in _LITERALS for kind, _ in items)
+                    and all(kind == "comma" for kind, _ in separators)
+                    and len(separators) == len(items) - 1):
+                out.append(tokens[i + 1])
+                for position, item in enumerate(sorted(set(items))):
+                    if position:
+                        out.append(("comma", ","))
+                    out.append(item)
+                out.append(tokens[close])
+                i = close + 1
+                continue
+        i += 1
+    return out
+
+
+def sql_fingerprint(sql_query: str) -> str:
+    """Identity of a query up to formatting.
+
+    Whitespace, comments, identifier and keyword casing, backticks, string
+    quote style, trailing semicolons and the order of literals in ``IN``
+    lists are normalized away; everything else (literal values, clause order)
+    is significant.
+    """
+    tokens = []
+    for kind, text in tokenize(sql_query or ""):
+        if kind in ("id", "qid"):
+            # Keywords and identifiers alike; Sakila table names are all lowercase
+            tokens.append(("id", text.lower()))
+        elif kind == "str":
+            tokens.append((kind, _canonical_string(text)))
+        else:
+            tokens.append((kind, text))
+    while tokens and tokens[-1][0] == "semi":
+        tokens.pop()
+    canonical = " ".join(text for _, text in _sorted_in_lists(tokens))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _payload_bytes(columns: List[str], data: List[tuple]) -> int:
+    size = sum(sys.getsizeof(name) for name in columns)
+    for values in data:
+        size += sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+    return size
+
+
+class _Entry:
+    __slots__ = ("columns", "types", "data", "row_count", "truncated", "tables", "size", "expires_at", "hits",
+                 "generations")
+
+    def __init__(self, columns, types, data, row_count, truncated, tables, size, expires_at, generations):
+        self.columns = columns
+        self.types = types
+        self.data = data
+        self.row_count = row_count
+        self.truncated = truncated
+        self.tables = tables
+        self.size = size
+        self.expires_at = expires_at
+        self.hits = 0
+        self.generations = generations
+
+
+class ResultCache:
+    """Result sets of executed queries keyed by ``sql_fingerprint``.
+
+    Rows are stored column-major (one tuple per column), which is smaller
+    than one list per row. The cache is an LRU bounded by entry count and by
+    approximate memory; entries expire after ``ttl`` and can be dropped by
+    table name (the tables the validator found in the query), so a data
+    change in one table does not discard unrelated results. A result that
+    was cut at the row cap only serves requests for at most as many rows.
+
+    With ``shared`` (a ``SharedState`` used by several worker processes),
+    ``invalidate`` also advances a generation number per table in the shared
+    store. Each entry remembers the generations of its tables from before
+    the query ran, and ``get`` drops it once any of them moved, so an
+    invalidation sent to one worker reaches all of them.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600,
+                 shared: Any = None):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.shared = shared
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_table: Dict[str, Set[str]] = {}
+        self.bytes = 0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "too_large": 0,
+            "shared_errors": 0,
+        }
+
+    def get(self, fingerprint: str, max_rows: int) -> Optional[Dict[str, Any]]:
+        """``{"columns", "types", "rows", "row_count", "truncated"}`` for up to ``max_rows`` rows, or None"""
+        entry = self._entries.get(fingerprint)
+        if entry is not None and entry.expires_at < time.time():
+            self._drop(fingerprint)
+            self._counters["expirations"] += 1
+            entry = None
+        if entry is not None and self.shared is not None and self.generations(entry.tables) != entry.generations:
+            # Invalidated by another worker (or the shared store is unreadable: do not risk stale rows)
+            self._drop(fingerprint)
+            self._counters["invalidations"] += 1
+            entry = None
+        if entry is None or (entry.truncated and max_rows > entry.row_count):
+            self._counters["misses"] += 1
+            return None
+        self._entries.move_to_end(fingerprint)
+        entry.hits += 1
+        self._counters["hits"] += 1
+        row_count = min(entry.row_count, max_rows)
+        return {
+            "columns": entry.columns,
+            "types": entry.types,
+            "rows": self._rows(entry, row_count),
+            "row_count": row_count,
+            "truncated": entry.truncated or entry.row_count > max_rows,
+        }
+
+    @staticmethod
+    def _rows(entry: _Entry, row_count: int) -> Iterator[List[Any]]:
+        if not entry.data:
+            return iter([[] for _ in range(row_count)])
+        return (list(row) for row in zip(*(values[:row_count] for values in entry.data)))
+
+    def generations(self, tables: Iterable[str]) -> Optional[Dict[str, int]]:
+        """Shared generations of ``tables`` to pass to ``set`` (read before running the query)"""
+        if self.shared is None:
+            return {}
+        generations = self.shared.generations(sorted({table.lower() for table in tables} | {ALL_TABLES}))
+        if generations is None:
+            self._counters["shared_errors"] += 1
+        return generations
+
+    def set(self, fingerprint: str, columns: List[str], rows: List[List[Any]], truncated: bool,
+            tables: Iterable[str], types: Optional[List[Optional[str]]] = None,
+            generations: Optional[Dict[str, int]] = None):
+        """Store a complete (or capped) result set.
+
+        ``types`` are the executor's column types; with a shared store,
+        ``generations`` must come from ``generations(tables)`` taken before
+        the query ran, and a result without them is not stored.
+        """
+        if self.shared is not None and generations is None:
+            return
+        data = [tuple(values) for values in zip(*rows)] if rows else [() for _ in columns]
+        size = _payload_bytes(columns, data)
+        if size > self.max_bytes // 4:
+            self._counters["too_large"] += 1
+            return
+        if fingerprint in self._entries:
+            self._drop(fingerprint)
+        tables = frozenset(table.lower() for table in tables)
+        self._entries[fingerprint] = _Entry(
+            list(columns), types, data, len(rows), truncated, tables, size, time.time() + self.ttl,
+            generations or {}
+        )
+        for table in tables:
+            self._by_table.setdefault(table, set()).add(fingerprint)
+        self.bytes += size
+        self._counters["stores"] += 1
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self._counters["evictions"] += 1
+
+    def _drop(self, fingerprint: str):
+        entry = self._entries.pop(fingerprint)
+        self.bytes -= entry.size
+        for table in entry.tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(fingerprint)
+                if not keys:
+                    del self._by_table[table]
+
+    def invalidate(self, tables: Optional[Iterable[str]] = None) -> int:
+        """Drop every result that read any of ``tables`` (all results when None); returns how many here.
+
+        With a shared store the other workers drop theirs on their next lookup.
+        """
+        if tables is None:
+            keys = set(self._entries)
+            names = [ALL_TABLES]
+        else:
+            names = sorted({table.lower() for table in tables})
+            keys = set()
+            for table in names:
+                keys |= self._by_table.get(table, set())
+        if self.shared is not None and not self.shared.bump(names):
+            self._counters["shared_errors"] += 1
+        for key in keys:
+            self._drop(key)
+        self._counters["invalidations"] += len(keys)
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._counters["hits"] + self._counters["misses"]
+        return dict(
+            self._counters,
+            entries=len(self._entries),
+            bytes=self.bytes,
+            max_bytes=self.max_bytes,
+            hit_rate=round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+            tables=sorted(self._by_table),
+        )
@@ -0,0 +1,164 @@
+import datetime
+import decimal
+import importlib.util
+import io
+import json
+import math
+from typing import Any, Dict, List, Optional
+
+# Media types of the /generate-and-run output formats
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def arrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def available_formats() -> List[str]:
+    return [name for name in MEDIA_TYPES if name != "arrow" or arrow_available()]
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time, datetime.timedelta)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", "replace")
+    return str(value)
+
+
+def ndjson_line(item: Dict[str, Any]) -> bytes:
+    """One NDJSON line (dates as strings, decimals as numbers)"""
+    return (json.dumps(item, ensure_ascii=False, default=_json_default) + "\n").encode("utf-8")
+
+
+class ResultEncodingError(ValueError):
+    """A batch of rows does not fit the schema of a stream already sent"""
+
+
+def _coerce(value: Any, type_name: str) -> Any:
+    """``value`` as the schema type when that loses nothing (3.0 -> 3, 2 -> Decimal(2)), else unchanged.
+
+    Raises ValueError for a fractional number in an integer column, which
+    pyarrow would silently truncate.
+    """
+    if value is None:
+        return None
+    if type_name == "int" and isinstance(value, (float, decimal.Decimal)):
+        if not math.isfinite(value) or value != int(value):
+            raise ValueError(f"{value} is not an integer")
+        return int(value)
+    if type_name.startswith("decimal") and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return decimal.Decimal(str(value))
+    return value
+
+
+class ArrowStreamEncoder:
+    """Encodes row batches as an Arrow IPC stream (requires the optional ``pyarrow`` package).
+
+    Column types come from ``types`` (the executor's portable names, see
+    ``MySQLExecutor.stream``); columns without one are inferred from the
+    first batch, and columns that are all NULL there become strings.
+    ``metadata`` (e.g. the generated SQL) is stored in the schema. Each call
+    returns only the bytes produced since the previous one, so batches can
+    be sent as they are encoded. A failure after the schema was sent is
+    reported with ``error``: an empty batch whose custom metadata holds
+    ``error`` and ``error_code``, and no end-of-stream marker.
+    """
+
+    def __init__(self, columns: List[str], metadata: Optional[Dict[str, str]] = None,
+                 types: Optional[List[Optional[str]]] = None):
+        import pyarrow
+        self._pa = pyarrow
+        self._columns = list(columns)
+        self._types = list(types) if types else [None] * len(self._columns)
+        self._metadata = metadata or {}
+        self._schema = None
+        self._buffer = io.BytesIO()
+        self._writer = None
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def _arrow_type(self, type_name: Optional[str], inferred: Any) -> Any:
+        pa = self._pa
+        if type_name == "int":
+            return pa.int64()
+        if type_name == "float":
+            return pa.float64()
+        if type_name and type_name.startswith("decimal("):
+            precision, scale = (int(part) for part in type_name[8:-1].split(","))
+            return pa.decimal128(min(precision, 38), scale)
+        if type_name == "date":
+            return pa.date32()
+        if type_name == "datetime":
+            return pa.timestamp("us")
+        if type_name == "time":
+            # MySQL TIME is an interval (negative or above 24h allowed), read as timedelta
+            return pa.duration("us")
+        if type_name == "bytes":
+            return pa.binary()
+        if type_name == "string" or inferred is None or pa.types.is_null(inferred):
+            return pa.string()
+        return inferred
+
+    def _open(self, inferred: List[Any]):
+        pa = self._pa
+        fields = [
+            pa.field(name, self._arrow_type(type_name, type_))
+            for name, type_name, type_ in zip(self._columns, self._types, inferred)
+        ]
+        self._schema = pa.schema(fields, metadata=self._metadata)
+        self._writer = pa.ipc.new_stream(self._buffer, self._schema)
+        # Inferred integer columns accept integral floats and decimals from later batches
+        self._types = [
+            "int" if type_name is None and pa.types.is_integer(field.type) else type_name
+            for field, type_name in zip(fields, self._types)
+        ]
+
+    def batch(self, rows: List[List[Any]]) -> bytes:
+        """IPC bytes for a batch of rows (the first call also carries the schema)"""
+        pa = self._pa
+        columns = [list(values) for values in zip(*rows)] if rows else [[] for _ in self._columns]
+        if self._schema is None:
+            self._open([
+                None if type_name else pa.array(values).type
+                for type_name, values in zip(self._types, columns)
+            ])
+        arrays = []
+        for field, type_name, values in zip(self._schema, self._types, columns):
+            try:
+                if pa.types.is_string(field.type):
+                    values = [None if value is None else str(value) for value in values]
+                elif type_name is not None:
+                    values = [_coerce(value, type_name) for value in values]
+                arrays.append(pa.array(values, type=field.type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, ValueError, TypeError, OverflowError) as e:
+                raise ResultEncodingError(f"Column {field.name!r} does not fit type {field.type}: {e}") from e
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self._schema))
+        return self._drain()
+
+    def error(self, message: str, error_code: str) -> bytes:
+        """Bytes reporting a failure mid-stream; nothing may be encoded afterwards"""
+        pa = self._pa
+        if self._schema is None:
+            self._open([pa.null() for _ in self._columns])
+        empty = pa.RecordBatch.from_arrays(
+            [pa.array([], type=field.type) for field in self._schema], schema=self._schema
+        )
+        self._writer.write_batch(empty, custom_metadata={"error": message, "error_code": error_code})
+        return self._drain()
+
+    def end(self) -> bytes:
+        """Remaining bytes: the schema if no batch was written, and the end-of-stream marker"""
+        if self._schema is None:
+            self._open([self._pa.null() for _ in self._columns])
+        self._writer.close()
+        return self._drain()
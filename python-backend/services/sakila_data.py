@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "database", "sakila-data-spanish.sql"
+)
+
+_INSERT_RE = re.compile(
+    r"INSERT\s+(?:IGNORE\s+)?INTO\s+`?(\w+)`?\s*(?:\([^)]*\)\s*)?VALUES\s*", re.IGNORECASE
+)
+# Quoted strings are matched whole so parentheses and semicolons inside them are skipped
+_VALUES_TOKEN_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|[();]", re.DOTALL)
+
+
+def iter_inserts(dump: str) -> Iterator[Tuple[str, str, int]]:
+    """Yield ``(table, values_sql, row_count)`` for each ``INSERT ... VALUES`` in a dump"""
+    position = 0
+    while True:
+        match = _INSERT_RE.search(dump, position)
+        if match is None:
+            return
+        start = match.end()
+        depth = rows = 0
+        end = len(dump)
+        for token in _VALUES_TOKEN_RE.finditer(dump, start):
+            text = token.group()
+            if text == "(":
+                if depth == 0:
+                    rows += 1
+                depth += 1
+            elif text == ")":
+                depth -= 1
+            elif text == ";" and depth == 0:
+                end = token.start()
+                break
+        yield match.group(1), dump[start:end], rows
+        position = end + 1
+
+
+def _row_counts_cache_path(path: str) -> str:
+    digest = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"sql-agent-rowcounts-{digest}.json")
+
+
+def _dump_signature(stat: os.stat_result) -> Dict[str, int]:
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _read_cached_counts(cache_path: str, signature: Dict[str, int]) -> Optional[Dict[str, int]]:
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("signature") != signature:
+        return None
+    return cached.get("counts")
+
+
+def _write_cached_counts(cache_path: str, signature: Dict[str, int], counts: Dict[str, int]):
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"signature": signature, "counts": counts}, f)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logger.debug(f"Row counts not cached at {cache_path}: {e}")
+
+
+def load_row_counts(path: Optional[str] = None, use_cache: bool = True) -> Dict[str, int]:
+    """Row count per table from the data dump, or an empty dict if it is not available.
+
+    Scanning the dump takes about half a second, so the counts are kept in a
+    small file in the temp dir and reused while the dump's size and
+    modification time are unchanged.
+    """
+    path = path or DEFAULT_DATA_PATH
+    try:
+        signature = _dump_signature(os.stat(path))
+    except OSError as e:
+        logger.warning(f"Data dump not available ({path}): {e}")
+        return {}
+    cache_path = _row_counts_cache_path(path)
+    if use_cache:
+        counts = _read_cached_counts(cache_path, signature)
+        if counts is not None:
+            logger.info(f"Loaded row counts for {len(counts)} tables from {cache_path}")
+            return counts
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            dump = f.read()
+    except OSError as e:
+        logger.warning(f"Data dump not available ({path}): {e}")
+        return {}
+    counts = {}
+    for table, _, rows in iter_inserts(dump):
+        counts[table] = counts.get(table, 0) + rows
+    logger.info(f"Loaded row counts for {len(counts)} tables from {path}")
+    if use_cache:
+        _write_cached_counts(cache_path, signature, counts)
+    return counts
@@ -0,0 +1,163 @@
+import hashlib
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCHEMA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "database", "sakila-schema-spanish.sql"
+)
+
+_CREATE_TABLE_RE = re.compile(
+    r"CREATE TABLE\s+`?(\w+)`?\s*\((.*?)\n\)\s*ENGINE", re.IGNORECASE | re.DOTALL
+)
+_COLUMN_RE = re.compile(r"^`?(\w+)`?\s+([A-Za-z]+)\s*(\([^)]*\))?")
+_PRIMARY_KEY_RE = re.compile(r"^PRIMARY KEY\s*\(([^)]*)\)", re.IGNORECASE)
+_INDEX_RE = re.compile(
+    r"^(UNIQUE\s+|FULLTEXT\s+)?KEY\s*`?(\w*)`?\s*\(([^)]*)\)", re.IGNORECASE
+)
+_FOREIGN_KEY_RE = re.compile(
+    r"^CONSTRAINT\s+`?(\w+)`?\s+FOREIGN KEY\s*\(([^)]*)\)\s*REFERENCES\s+`?(\w+)`?\s*\(([^)]*)\)",
+    re.IGNORECASE
+)
+
+
+def _split_columns(raw: str) -> List[str]:
+    return [c.strip().strip("`") for c in raw.split(",") if c.strip()]
+
+
+class SchemaCatalog:
+    """Tables, columns, keys and indexes parsed from the Sakila DDL dump.
+
+    ``tables`` maps each table name to a dict with ``columns`` (name -> SQL
+    type, in declaration order), ``primary_key``, ``foreign_keys`` and
+    ``indexes``.
+    """
+
+    def __init__(self, tables: Dict[str, Dict[str, Any]]):
+        self.tables = tables
+        self._column_tables: Dict[str, Set[str]] = {}
+        self._neighbors: Dict[str, Set[str]] = {name: set() for name in tables}
+        for name, table in tables.items():
+            for column in table["columns"]:
+                self._column_tables.setdefault(column, set()).add(name)
+            for fk in table["foreign_keys"]:
+                if fk["ref_table"] in self._neighbors:
+                    self._neighbors[name].add(fk["ref_table"])
+                    self._neighbors[fk["ref_table"]].add(name)
+        self.fingerprint = hashlib.sha256(
+            repr(sorted((n, list(t["columns"].items())) for n, t in tables.items())).encode("utf-8")
+        ).hexdigest()[:16]
+
+    @classmethod
+    def from_sql(cls, ddl: str) -> "SchemaCatalog":
+        """Parse ``CREATE TABLE`` statements from a MySQL DDL script"""
+        tables: Dict[str, Dict[str, Any]] = {}
+        for match in _CREATE_TABLE_RE.finditer(ddl):
+            name, body = match.group(1), match.group(2)
+            table = {"columns": {}, "primary_key": [], "foreign_keys": [], "indexes": []}
+            for line in body.splitlines():
+                line = line.strip().rstrip(",")
+                if not line:
+                    continue
+                pk = _PRIMARY_KEY_RE.match(line)
+                if pk:
+                    table["primary_key"] = _split_columns(pk.group(1))
+                    continue
+                fk = _FOREIGN_KEY_RE.match(line)
+                if fk:
+                    table["foreign_keys"].append({
+                        "name": fk.group(1),
+                        "columns": _split_columns(fk.group(2)),
+                        "ref_table": fk.group(3),
+                        "ref_columns": _split_columns(fk.group(4)),
+                    })
+                    continue
+                index = _INDEX_RE.match(line)
+                if index:
+                    kind = (index.group(1) or "").strip().upper()
+                    table["indexes"].append({
+                        "name": index.group(2) or None,
+                        "columns": _split_columns(index.group(3)),
+                        "unique": kind == "UNIQUE",
+                        "fulltext": kind == "FULLTEXT",
+                    })
+                    continue
+                column = _COLUMN_RE.match(line)
+                if column and column.group(1).upper() not in ("CONSTRAINT", "KEY", "INDEX"):
+                    table["columns"][column.group(1)] = column.group(2).upper() + (column.group(3) or "")
+            tables[name] = table
+        return cls(tables)
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> Optional["SchemaCatalog"]:
+        """Load the catalog from a DDL file, or None if it is not available"""
+        path = path or DEFAULT_SCHEMA_PATH
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                catalog = cls.from_sql(f.read())
+        except OSError as e:
+            logger.warning(f"Schema file not available ({path}): {e}")
+            return None
+        if not catalog.tables:
+            logger.warning(f"No CREATE TABLE statements found in {path}")
+            return None
+        logger.info(f"Loaded schema catalog with {len(catalog.tables)} tables from {path}")
+        return catalog
+
+    def has_table(self, name: str) -> bool:
+        return name in self.tables
+
+    def has_column(self, table: str, column: str) -> bool:
+        return table in self.tables and column in self.tables[table]["columns"]
+
+    def tables_with_column(self, column: str) -> Set[str]:
+        """Tables that declare a column with this name"""
+        return self._column_tables.get(column, set())
+
+    def neighbors(self, table: str) -> Set[str]:
+        """Tables linked to ``table`` by a foreign key in either direction"""
+        return self._neighbors.get(table, set())
+
+    def indexed_prefixes(self, table: str) -> List[List[str]]:
+        """Column lists of the primary key and every non-fulltext index"""
+        definition = self.tables.get(table)
+        if definition is None:
+            return []
+        prefixes = [definition["primary_key"]] if definition["primary_key"] else []
+        prefixes.extend(i["columns"] for i in definition["indexes"] if not i["fulltext"])
+        return prefixes
+
+    def render_table(self, name: str) -> str:
+        """Compact DDL for one table: types, keys and indexes without storage options"""
+        table = self.tables[name]
+        lines = []
+        for column, sql_type in table["columns"].items():
+            suffix = " PRIMARY KEY" if table["primary_key"] == [column] else ""
+            lines.append(f"  {column} {sql_type}{suffix}")
+        if len(table["primary_key"]) > 1:
+            lines.append(f"  PRIMARY KEY ({', '.join(table['primary_key'])})")
+        for fk in table["foreign_keys"]:
+            lines.append(
+                f"  FOREIGN KEY ({', '.join(fk['columns'])}) "
+                f"REFERENCES {fk['ref_table']} ({', '.join(fk['ref_columns'])})"
+            )
+        for index in table["indexes"]:
+            kind = "UNIQUE INDEX" if index["unique"] else "FULLTEXT INDEX" if index["fulltext"] else "INDEX"
+            label = f" {index['name']}" if index["name"] else ""
+            lines.append(f"  {kind}{label} ({', '.join(index['columns'])})")
+        return f"CREATE TABLE {name} (\n" + ",\n".join(lines) + "\n);"
+
+    def render_relationships(self, names: List[str]) -> List[str]:
+        """``a.col -> b.col`` lines for foreign keys between the given tables"""
+        selected = set(names)
+        relationships = []
+        for name in names:
+            for fk in self.tables[name]["foreign_keys"]:
+                if fk["ref_table"] in selected:
+                    for column, ref_column in zip(fk["columns"], fk["ref_columns"]):
+                        relationships.append(f"{name}.{column} -> {fk['ref_table']}.{ref_column}")
+        return relationships
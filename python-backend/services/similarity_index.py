@@ -0,0 +1,203 @@
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.normalization import strip_accents
+
+_TOKEN_RE = re.compile(r"'[^']*'|\"[^\"]*\"|[\wÀ-ÿ]+", re.UNICODE)
+_NUMBER_RE = re.compile(r"^\d+(?:[.,]\d+)?$")
+
+# Spanish function words that carry no meaning for matching Sakila questions.
+# Negations ("no", "sin", "ni"), prepositions that change a filter ("con",
+# "antes", "desde", "contra", "entre"), question words ("quien", "cuando",
+# "donde", "cual", "como", "cuantos"), conjunctions ("y", "o") and numerals
+# are left out on purpose: they change the SQL. Request verbs ("muestra",
+# "lista") are dropped because a question without a count already lists rows.
+SPANISH_STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante de del e el ella ellas ellos
+en era es esa esas ese eso esos esta estas este esto estos fue ha han hay la las
+le les lo los me mi mis muy nos os para pero por que se sea ser si son su sus
+tambien te tiene tienen toda todas todo todos tu un una unas unos ya
+dame dime muestra muestrame mostrar listar lista obtener quiero ver
+""".split())
+
+# Spelled-out numbers are literals like digits ("dos peliculas" == "2 peliculas")
+SPANISH_NUMERALS = {
+    "uno": "1", "dos": "2", "tres": "3", "cuatro": "4", "cinco": "5", "seis": "6", "siete": "7",
+    "ocho": "8", "nueve": "9", "diez": "10", "once": "11", "doce": "12", "quince": "15",
+    "veinte": "20", "treinta": "30", "cincuenta": "50", "cien": "100", "mil": "1000",
+}
+
+
+def _stem(token: str) -> str:
+    """Very light Spanish stemmer: folds plural endings (peliculas -> pelicula).
+
+    Only used for scoring; templates keep the plural, which changes the SQL
+    ("la pelicula mas alquilada" is one row, "las peliculas" a ranking).
+    """
+    if len(token) > 4 and token.endswith("es") and token[-3] not in "aeiou":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def analyze_query(text: str) -> Tuple[List[str], Tuple[str, ...]]:
+    """Split a question into template tokens and literal values.
+
+    Literals are numbers, quoted strings and capitalized words that do not
+    start the sentence (proper nouns such as cities or actor names). They are
+    replaced by placeholders in the template so "clientes de Madrid" and
+    "clientes de Sevilla" share the same template.
+    """
+    tokens: List[str] = []
+    literals: List[str] = []
+    for position, match in enumerate(_TOKEN_RE.finditer(text or "")):
+        raw = match.group(0)
+        if raw[0] in "'\"":
+            literals.append(strip_accents(raw[1:-1].lower()))
+            tokens.append("<str>")
+            continue
+        folded = strip_accents(raw.lower())
+        if _NUMBER_RE.match(folded) or folded in SPANISH_NUMERALS:
+            literals.append(SPANISH_NUMERALS.get(folded, folded))
+            tokens.append("<num>")
+            continue
+        if position > 0 and raw[0].isupper() and not raw.isupper():
+            literals.append(folded)
+            tokens.append("<name>")
+            continue
+        if folded in SPANISH_STOPWORDS:
+            continue
+        tokens.append(folded)
+    return tokens, tuple(literals)
+
+
+class SimilarityIndex:
+    """Offline TF-IDF inverted index over past natural language queries.
+
+    ``lookup`` returns the closest stored generation and whether it can be
+    reused as-is (identical template and literals, scoring above
+    ``reuse_threshold``) or should be adapted with a short prompt (above
+    ``adapt_threshold``). Bag-of-words scores ignore word order and rare
+    words, so a high score alone never reuses SQL.
+    """
+
+    def __init__(self, reuse_threshold: float = 0.97, adapt_threshold: float = 0.75,
+                 max_entries: int = 5000):
+        self.reuse_threshold = reuse_threshold
+        self.adapt_threshold = adapt_threshold
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._keys: Dict[Tuple[str, ...], int] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._counters = {"lookups": 0, "reuse": 0, "adapt": 0, "misses": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, natural_query: str, result: Dict[str, Any]):
+        """Index a successful generation"""
+        tokens, literals = analyze_query(natural_query)
+        if not tokens:
+            return
+        identity = tuple(tokens) + ("\x00",) + literals
+        with self._lock:
+            existing = self._keys.get(identity)
+            if existing is not None:
+                self._entries[existing]["result"] = result
+                self._entries.move_to_end(existing)
+                return
+
+            doc_id = self._next_id
+            self._next_id += 1
+            term_counts: Dict[str, int] = {}
+            for term in map(_stem, tokens):
+                term_counts[term] = term_counts.get(term, 0) + 1
+            for token, count in term_counts.items():
+                self._postings.setdefault(token, {})[doc_id] = count
+            self._entries[doc_id] = {
+                "query": natural_query,
+                "terms": term_counts,
+                "literals": literals,
+                "identity": identity,
+                "result": result,
+            }
+            self._keys[identity] = doc_id
+
+            while len(self._entries) > self.max_entries:
+                self._remove_oldest()
+
+    def _remove_oldest(self):
+        doc_id, entry = self._entries.popitem(last=False)
+        self._keys.pop(entry["identity"], None)
+        for token in entry["terms"]:
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[token]
+
+    def _idf(self, token: str, total: int) -> float:
+        return math.log((total + 1) / (len(self._postings.get(token, ())) + 1)) + 1.0
+
+    def lookup(self, natural_query: str) -> Optional[Dict[str, Any]]:
+        """Best match above ``adapt_threshold`` or None"""
+        tokens, literals = analyze_query(natural_query)
+        with self._lock:
+            self._counters["lookups"] += 1
+            if not tokens or not self._entries:
+                self._counters["misses"] += 1
+                return None
+
+            total = len(self._entries)
+            query_terms: Dict[str, int] = {}
+            for term in map(_stem, tokens):
+                query_terms[term] = query_terms.get(term, 0) + 1
+            idf = {token: self._idf(token, total) for token in query_terms}
+            query_weights = {t: c * idf[t] for t, c in query_terms.items()}
+            query_norm = math.sqrt(sum(w * w for w in query_weights.values()))
+
+            dots: Dict[int, float] = {}
+            for token, weight in query_weights.items():
+                for doc_id, count in self._postings.get(token, {}).items():
+                    dots[doc_id] = dots.get(doc_id, 0.0) + weight * count * idf[token]
+
+            best_id, best_score = None, 0.0
+            for doc_id, dot in dots.items():
+                terms = self._entries[doc_id]["terms"]
+                doc_norm = math.sqrt(sum(
+                    (count * self._idf(token, total)) ** 2 for token, count in terms.items()
+                ))
+                score = dot / (query_norm * doc_norm) if doc_norm else 0.0
+                if score > best_score:
+                    best_id, best_score = doc_id, score
+
+            if best_id is None or best_score < self.adapt_threshold:
+                self._counters["misses"] += 1
+                return None
+
+            entry = self._entries[best_id]
+            same_question = entry["identity"] == tuple(tokens) + ("\x00",) + literals
+            mode = "reuse" if best_score >= self.reuse_threshold and same_question else "adapt"
+            self._counters[mode] += 1
+            return {
+                "mode": mode,
+                "score": round(best_score, 4),
+                "matched_query": entry["query"],
+                "result": entry["result"],
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        """Index size and lookup outcome counters"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            stats["vocabulary"] = len(self._postings)
+            stats["reuse_threshold"] = self.reuse_threshold
+            stats["adapt_threshold"] = self.adapt_threshold
+            return stats
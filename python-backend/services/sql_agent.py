@@ -1,14 +1,246 @@
 import os
+import time
+import hashlib
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, Iterable, Optional
+from config import config
 from models.llm_client import LLMClient
+from models.llm_transport import load_exchanges, prompt_digest
+from services.normalization import normalize_query
+from services.query_cache import QueryCache, make_cache_key
+from services.similarity_index import SimilarityIndex
+from services.schema_catalog import SchemaCatalog
+from services.prompt_builder import PROMPT_LAYOUT_VERSION, PromptBuilder, estimate_tokens, prefix_version
+from services.sql_validator import SQLValidator
+from services.sakila_data import load_row_counts
+from services.cost_estimator import CostEstimator
+from services.sqlite_mirror import SQLiteMirror
+from services.sql_repair import SQLRepairer
+from services.health_monitor import HealthMonitor
+from services.metrics import AgentMetrics
+from services.single_flight import SingleFlight
+from services.usage_ledger import UsageLedger
+from services.query_executor import MySQLExecutor, SQLiteExecutor, aiomysql_available
+from services.result_cache import ResultCache, sql_fingerprint
 
 logger = logging.getLogger(__name__)
 
+# Query used to warm the LLM backend at startup (its answer is discarded)
+WARMUP_QUERY = "Lista los 5 primeros actores por apellido"
+
 class SQLAgent:
     def __init__(self):
         self.llm_client = LLMClient()
         self.system_prompt = self._load_system_prompt()
+        self.schema_catalog = SchemaCatalog.from_file(config.SAKILA_SCHEMA_PATH or None)
+        self.prompt_builder = self._create_prompt_builder()
+        self.validator = SQLValidator(self.schema_catalog)
+        self.cost_estimator = self._create_cost_estimator()
+        self.repairer = self._create_repairer()
+        self.system_prompt_hash = self._compute_prompt_hash()
+        self.cache = self._create_cache()
+        self.similarity_index = self._create_similarity_index()
+        self.single_flight = SingleFlight() if config.SINGLE_FLIGHT_ENABLED else None
+        self.usage = UsageLedger(
+            max_clients=config.USAGE_MAX_CLIENTS,
+            input_price=config.LLM_PRICE_INPUT,
+            cached_input_price=config.LLM_PRICE_CACHED_INPUT,
+            output_price=config.LLM_PRICE_OUTPUT
+        )
+        self.executor = self._create_executor()
+        self.result_cache = self._create_result_cache()
+        self.health_monitor = self._create_health_monitor()
+        self.metrics = self._create_metrics()
+    
+    def _create_prompt_builder(self) -> Optional[PromptBuilder]:
+        """Create the schema-aware prompt builder if enabled and the schema is available"""
+        if not config.PROMPT_PRUNING_ENABLED or self.schema_catalog is None:
+            return None
+        return PromptBuilder(
+            self.system_prompt,
+            self.schema_catalog,
+            max_tables=config.PROMPT_MAX_TABLES
+        )
+    
+    def _create_cost_estimator(self) -> Optional[CostEstimator]:
+        """Create the offline cost estimator if enabled and the schema is available"""
+        if not config.COST_ESTIMATION_ENABLED or self.schema_catalog is None:
+            return None
+        return CostEstimator(
+            self.schema_catalog,
+            load_row_counts(config.SAKILA_DATA_PATH or None),
+            max_result_rows=config.COST_MAX_RESULT_ROWS,
+            max_scan_rows=config.COST_MAX_SCAN_ROWS,
+            default_limit=config.COST_DEFAULT_LIMIT
+        )
+    
+    def _create_repairer(self) -> Optional[SQLRepairer]:
+        """Create the SQLite dry-run and repair stage if enabled and the schema is available"""
+        if not config.SQL_REPAIR_ENABLED or self.schema_catalog is None:
+            return None
+        mirror = SQLiteMirror(
+            self.schema_catalog,
+            data_path=config.SAKILA_DATA_PATH or None,
+            load_data=config.SQLITE_MIRROR_LOAD_DATA
+        )
+        return SQLRepairer(
+            self.llm_client,
+            mirror,
+            self.schema_catalog,
+            max_retries=config.SQL_REPAIR_MAX_RETRIES
+        )
+    
+    def _create_executor(self):
+        """Create the query executor for /generate-and-run if enabled (MySQL, else the SQLite mirror)"""
+        if not config.QUERY_EXECUTION_ENABLED:
+            return None
+        if config.EXECUTION_BACKEND == "mysql":
+            if aiomysql_available():
+                return MySQLExecutor(
+                    config.DB_HOST,
+                    config.DB_PORT,
+                    config.DB_USER,
+                    config.DB_PASSWORD,
+                    config.DB_NAME,
+                    min_size=config.DB_POOL_MIN_SIZE,
+                    max_size=config.DB_POOL_MAX_SIZE,
+                    timeout=config.EXECUTION_TIMEOUT,
+                    batch_size=config.EXECUTION_BATCH_ROWS
+                )
+            logger.warning("aiomysql is not installed; running queries on the SQLite mirror")
+        if self.schema_catalog is None:
+            logger.warning("Sakila schema not available; query execution disabled")
+            return None
+        if self.repairer is not None and self.repairer.mirror.rows_loaded:
+            mirror = self.repairer.mirror
+        else:
+            mirror = SQLiteMirror(self.schema_catalog, data_path=config.SAKILA_DATA_PATH or None, load_data=True)
+        return SQLiteExecutor(mirror, timeout=config.EXECUTION_TIMEOUT, batch_size=config.EXECUTION_BATCH_ROWS)
+    
+    def _create_result_cache(self) -> Optional[ResultCache]:
+        """Create the result set cache for executed queries if enabled"""
+        if self.executor is None or not config.RESULT_CACHE_ENABLED:
+            return None
+        # Several workers learn about each other's invalidations through the shared state store
+        shared = self.llm_client.scheduler.shared
+        if config.WORKERS > 1 and shared is None:
+            logger.warning("Result cache disabled: several workers but no shared state to invalidate it")
+            return None
+        return ResultCache(
+            max_entries=config.RESULT_CACHE_MAX_ENTRIES,
+            max_bytes=int(config.RESULT_CACHE_MAX_MB * 1024 * 1024),
+            ttl=config.RESULT_CACHE_TTL,
+            shared=shared
+        )
+    
+    def _create_health_monitor(self) -> Optional[HealthMonitor]:
+        """Create the background LLM health monitor if enabled (started by the app lifespan)"""
+        if not config.HEALTH_MONITOR_ENABLED:
+            return None
+        return HealthMonitor(
+            self.llm_client.test_connection_fast,
+            interval=config.HEALTH_CHECK_INTERVAL,
+            jitter=config.HEALTH_CHECK_JITTER,
+            max_backoff=config.HEALTH_MAX_BACKOFF,
+            timeout=config.HEALTH_PROBE_TIMEOUT + 1,
+            down_after=config.HEALTH_DOWN_AFTER,
+            recover_after=config.HEALTH_RECOVER_AFTER
+        )
+    
+    def _create_metrics(self) -> AgentMetrics:
+        """Pipeline metrics plus scrape-time gauges read from the components' stats()"""
+        metrics = AgentMetrics()
+        registry = metrics.registry
+        scheduler = self.llm_client.scheduler
+        router = self.llm_client.router
+        registry.callback(
+            "sql_agent_llm_in_flight", "LLM calls holding a scheduler slot", [],
+            lambda: [((), scheduler.stats()["in_flight"])]
+        )
+        registry.callback(
+            "sql_agent_llm_waiting", "LLM calls queued for a scheduler slot", [],
+            lambda: [((), scheduler.stats()["waiting"])]
+        )
+        registry.callback(
+            "sql_agent_llm_rejected_total", "LLM calls rejected because the queue was full", [],
+            lambda: [((), scheduler.stats()["rejected"])], kind="counter"
+        )
+        registry.callback(
+            "sql_agent_llm_backend_up", "1 unless the backend's circuit breaker is open", ["backend"],
+            lambda: [((b.name,), 0 if b.breaker.state == "open" else 1) for b in router.backends]
+        )
+        registry.callback(
+            "sql_agent_http_connections_opened_total", "TCP connections opened by the shared HTTP pool", [],
+            lambda: [((), self.llm_client.http.connections_opened)], kind="counter"
+        )
+        if self.cache is not None:
+            registry.callback(
+                "sql_agent_cache_lookups_total", "Result cache lookups by outcome", ["result"],
+                lambda: [((key,), value) for key, value in self.cache.stats().items()
+                         if key in ("memory_hits", "disk_hits", "misses")],
+                kind="counter"
+            )
+        if self.health_monitor is not None:
+            monitor = self.health_monitor
+            registry.callback(
+                "sql_agent_llm_health", "1 for the current LLM health state", ["state"],
+                lambda: [((state,), int(monitor.state == state)) for state in ("starting", "healthy", "degraded", "down")]
+            )
+        return metrics
+    
+    def _compute_prompt_hash(self) -> str:
+        """Identity of everything that shapes the prompt, used in cache keys"""
+        identity = f"{self.system_prompt}\x1flayout:{PROMPT_LAYOUT_VERSION}"
+        if self.prompt_builder is not None:
+            identity += f"\x1fpruned:{self.schema_catalog.fingerprint}"
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16]
+    
+    def _build_prompt(self, natural_language_query: str) -> Dict[str, Any]:
+        """System prompt for a query plus token accounting"""
+        if self.prompt_builder is not None:
+            return self.prompt_builder.build(natural_language_query)
+        full_tokens = estimate_tokens(self.system_prompt)
+        return {
+            "prompt": self.system_prompt,
+            "tables": None,
+            "prompt_tokens": full_tokens,
+            "full_prompt_tokens": full_tokens,
+            "tokens_saved": 0,
+            "prefix_version": prefix_version(self.system_prompt),
+            "prefix_tokens": full_tokens
+        }
+    
+    def _create_cache(self) -> Optional[QueryCache]:
+        """Create the result cache if enabled in configuration"""
+        if not config.QUERY_CACHE_ENABLED:
+            return None
+        return QueryCache(
+            max_entries=config.QUERY_CACHE_MAX_ENTRIES,
+            ttl=config.QUERY_CACHE_TTL,
+            sqlite_path=config.query_cache_path(),
+            disk_timeout=config.QUERY_CACHE_DISK_TIMEOUT
+        )
+    
+    def _create_similarity_index(self) -> Optional[SimilarityIndex]:
+        """Create the near-duplicate query index if enabled in configuration"""
+        if not config.SIMILARITY_INDEX_ENABLED:
+            return None
+        return SimilarityIndex(
+            reuse_threshold=config.SIMILARITY_REUSE_THRESHOLD,
+            adapt_threshold=config.SIMILARITY_ADAPT_THRESHOLD,
+            max_entries=config.SIMILARITY_MAX_ENTRIES
+        )
+    
+    def _cache_key(self, natural_language_query: str, model: Optional[str] = None,
+                   provider: Optional[str] = None) -> str:
+        """Cache key for a query under the current prompt and a model (the primary backend's by default)"""
+        primary = self.llm_client.router.primary
+        return make_cache_key(
+            normalize_query(natural_language_query),
+            self.system_prompt_hash,
+            model or primary.model,
+            provider or primary.provider
+        )
     
     def _load_system_prompt(self) -> str:
         """Load system prompt from file"""
@@ -36,8 +268,205 @@ Principales tablas: actor, cliente, pelicula, alquiler, pago, inventario, catego
 Responde SOLO con la consulta SQL, sin explicaciones adicionales.
 """
     
-    async def process_query(self, natural_language_query: str) -> Dict[str, Any]:
-        """Process natural language query and return SQL"""
+    def _get_adapt_system_prompt(self) -> str:
+        """Short system prompt used to adapt a previous generation to a similar query"""
+        return """
+Eres un especialista en SQL para la base de datos Sakila_es (MySQL, tablas y columnas en español).
+
+Recibirás una pregunta de referencia, la consulta SQL que la resuelve y una nueva pregunta muy parecida.
+Adapta la consulta SQL a la nueva pregunta cambiando solo lo necesario (valores literales, filtros, límites, orden).
+
+Responde EXCLUSIVAMENTE con JSON válido con las claves "sql_query", "explanation", "considerations" y "alternatives".
+"""
+    
+    def _build_adapt_query(self, natural_language_query: str, match: Dict[str, Any]) -> str:
+        """User message asking the LLM to adapt a previous generation"""
+        return (
+            f"Pregunta de referencia: {match['matched_query']}\n"
+            f"SQL de referencia: {match['result']['sql_query']}\n"
+            f"Nueva pregunta: {natural_language_query}"
+        )
+    
+    def _plan_query(self, natural_language_query: str) -> Dict[str, Any]:
+        """Resolve a query from the caches or prepare the prompt for the LLM (timed as the plan stage)"""
+        started = time.perf_counter()
+        plan = self._resolve_plan(natural_language_query)
+        self.metrics.stage["plan"].observe(time.perf_counter() - started)
+        response = plan["response"]
+        if response is not None:
+            source = "similarity" if response["cache"]["tier"] == "similarity" else "cache"
+            self.metrics.queries[source].inc()
+        return plan
+    
+    def _resolve_plan(self, natural_language_query: str) -> Dict[str, Any]:
+        """Cache and similarity lookups, then prompt assembly.
+        
+        Returns ``{"response": ...}`` on a cache or similarity hit, otherwise
+        the prompt to send plus the state needed by ``_finalize_result``.
+        """
+        cache_key = None
+        if self.cache is not None:
+            lookup_start = time.perf_counter()
+            cache_key = self._cache_key(natural_language_query)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                response = dict(cached["value"])
+                response["natural_query"] = natural_language_query
+                response["cache"] = {
+                    "hit": True,
+                    "tier": cached["tier"],
+                    "lookup_ms": round((time.perf_counter() - lookup_start) * 1000, 3)
+                }
+                return {"response": response}
+        
+        match = None
+        if self.similarity_index is not None:
+            match = self.similarity_index.lookup(natural_language_query)
+            if match is not None and match["mode"] == "reuse":
+                response = dict(match["result"])
+                response["natural_query"] = natural_language_query
+                response["cache"] = {
+                    "hit": True,
+                    "tier": "similarity",
+                    "score": match["score"],
+                    "matched_query": match["matched_query"]
+                }
+                return {"response": response}
+        
+        # Adapt a near-duplicate generation when available, otherwise use the full prompt
+        if match is not None:
+            adapt_prompt = self._get_adapt_system_prompt()
+            user_query = self._build_adapt_query(natural_language_query, match)
+            full_tokens = estimate_tokens(self.system_prompt)
+            prompt_tokens = estimate_tokens(adapt_prompt) + estimate_tokens(user_query)
+            prompt_info = {
+                "prompt": adapt_prompt,
+                "tables": None,
+                "prompt_tokens": prompt_tokens,
+                "full_prompt_tokens": full_tokens,
+                "tokens_saved": max(full_tokens - prompt_tokens, 0),
+                "prefix_version": prefix_version(adapt_prompt),
+                "prefix_tokens": estimate_tokens(adapt_prompt)
+            }
+        else:
+            user_query = natural_language_query
+            prompt_info = self._build_prompt(natural_language_query)
+        
+        return {
+            "response": None,
+            "cache_key": cache_key,
+            "match": match,
+            "prompt_info": prompt_info,
+            "user_query": user_query,
+            "system_prompt": prompt_info["prompt"]
+        }
+    
+    def _record_generation(self, client_id: Optional[str], result: Dict[str, Any]):
+        """Count an LLM result in the metrics and charge its tokens to ``client_id``"""
+        self.metrics.record_generation(result)
+        self.usage.record(client_id, result.get("usage"), success=result["success"])
+    
+    async def _repair_result(self, natural_language_query: str, result: Dict[str, Any],
+                             plan: Dict[str, Any], priority: str = "interactive",
+                             client_id: Optional[str] = None) -> Dict[str, Any]:
+        """Dry-run a successful generation and repair it if it fails against the schema"""
+        if self.repairer is None or not result["success"]:
+            return result
+        started = time.perf_counter()
+        repaired = await self.repairer.check(
+            natural_language_query,
+            result,
+            tables=plan["prompt_info"]["tables"],
+            priority=priority,
+            on_generation=lambda candidate: self._record_generation(client_id, candidate)
+        )
+        self.metrics.stage["repair"].observe(time.perf_counter() - started)
+        return repaired
+    
+    def _finalize_result(self, natural_language_query: str, result: Dict[str, Any],
+                         plan: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate an LLM result, build the response and store it in the caches"""
+        if not result["success"]:
+            return {
+                "success": False,
+                "error": result["error"],
+                "error_code": result.get("error_code"),
+                "retry_after": result.get("retry_after"),
+                "natural_query": natural_language_query
+            }
+        
+        sql_query = result["sql_query"]
+        
+        # Parser-based validation against the schema catalog
+        started = time.perf_counter()
+        validation_result = self._validate_sql(sql_query)
+        validated = time.perf_counter()
+        if "repair" in result:
+            validation_result["repair"] = result["repair"]
+        sql_query = self._apply_cost_estimate(sql_query, validation_result)
+        self.metrics.stage["validate"].observe(validated - started)
+        if self.cost_estimator is not None:
+            self.metrics.stage["cost"].observe(time.perf_counter() - validated)
+        self.metrics.validations[bool(validation_result.get("is_valid"))].inc()
+        
+        response = {
+            "success": True,
+            "sql_query": sql_query,
+            "natural_query": natural_language_query,
+            "explanation": result.get("explanation", ""),
+            "considerations": result.get("considerations", ""),
+            "alternatives": result.get("alternatives", ""),
+            "llm_info": {
+                "provider": result["provider"],
+                "model": result["model"],
+                "backend": result.get("backend"),
+                "parse": result.get("parse"),
+                "usage": result.get("usage"),
+                "prompt": {
+                    key: value for key, value in plan["prompt_info"].items() if key != "prompt"
+                }
+            },
+            "validation": validation_result
+        }
+        
+        match = plan["match"]
+        if match is not None:
+            response["llm_info"]["adapted_from"] = {
+                "query": match["matched_query"],
+                "score": match["score"]
+            }
+        
+        if self.similarity_index is not None:
+            self.similarity_index.add(natural_language_query, response)
+        
+        if plan["cache_key"] is not None:
+            # After a failover the answer is stored under the model that wrote it, not the primary's
+            self.cache.set(self._cache_key(natural_language_query, result["model"], result["provider"]), response)
+            response = dict(response, cache={"hit": False})
+        
+        return response
+    
+    async def _generate(self, natural_language_query: str, plan: Dict[str, Any],
+                        client_id: Optional[str] = None, priority: str = "interactive") -> Dict[str, Any]:
+        """Generate SQL with the LLM, repair it if needed and build the response"""
+        self.metrics.queries["llm"].inc()
+        result = await self.llm_client.generate_sql(
+            user_query=plan["user_query"],
+            system_prompt=plan["system_prompt"],
+            prompt_cache_key=plan["prompt_info"]["prefix_version"],
+            priority=priority
+        )
+        self._record_generation(client_id, result)
+        result = await self._repair_result(natural_language_query, result, plan, priority, client_id)
+        return self._finalize_result(natural_language_query, result, plan)
+    
+    async def process_query(self, natural_language_query: str, client_id: Optional[str] = None,
+                            priority: str = "interactive") -> Dict[str, Any]:
+        """Process natural language query and return SQL.
+        
+        ``client_id`` is charged for the LLM tokens used; ``priority``
+        ("interactive" or "batch") orders requests waiting for the LLM rate limit.
+        """
         try:
             if not natural_language_query or not natural_language_query.strip():
                 return {
@@ -45,37 +474,25 @@ Responde SOLO con la consulta SQL, sin explicaciones adicionales.
                     "error": "Query cannot be empty"
                 }
             
-            # Generate SQL using LLM
-            result = await self.llm_client.generate_sql(
-                user_query=natural_language_query,
-                system_prompt=self.system_prompt
-            )
+            started = time.perf_counter()
+            plan = self._plan_query(natural_language_query)
+            if plan["response"] is not None:
+                self.metrics.stage["total"].observe(time.perf_counter() - started)
+                return plan["response"]
             
-            if result["success"]:
-                sql_query = result["sql_query"]
-                
-                # Basic validation
-                validation_result = self._validate_sql(sql_query)
-                
-                return {
-                    "success": True,
-                    "sql_query": sql_query,
-                    "natural_query": natural_language_query,
-                    "explanation": result.get("explanation", ""),
-                    "considerations": result.get("considerations", ""),
-                    "alternatives": result.get("alternatives", ""),
-                    "llm_info": {
-                        "provider": result["provider"],
-                        "model": result["model"]
-                    },
-                    "validation": validation_result
-                }
+            if self.single_flight is None:
+                response = await self._generate(natural_language_query, plan, client_id, priority)
             else:
-                return {
-                    "success": False,
-                    "error": result["error"],
-                    "natural_query": natural_language_query
-                }
+                # Identical queries already being generated share that generation
+                key = plan["cache_key"] or self._cache_key(natural_language_query)
+                response, shared = await self.single_flight.do(
+                    key, lambda: self._generate(natural_language_query, plan, client_id, priority)
+                )
+                if shared:
+                    self.metrics.queries["coalesced"].inc()
+                    response = dict(response, natural_query=natural_language_query)
+            self.metrics.stage["total"].observe(time.perf_counter() - started)
+            return response
                 
         except Exception as e:
             logger.error(f"Error processing query: {e}")
@@ -85,51 +502,314 @@ Responde SOLO con la consulta SQL, sin explicaciones adicionales.
                 "natural_query": natural_language_query
             }
     
-    def _validate_sql(self, sql_query: str) -> Dict[str, Any]:
-        """Basic SQL validation"""
+    async def process_query_stream(self, natural_language_query: str,
+                                   client_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming variant of ``process_query``.
+        
+        Yields ``{"event": "field", "data": {"field", "value"}}`` as each JSON
+        field of the generation completes (``sql_query`` first when the model
+        emits it first) and finally ``{"event": "result", "data": response}``.
+        The ``sql_query`` of the result is the one to run: when a repair or an
+        added LIMIT changed the streamed one, another ``sql_query`` field event
+        with the final SQL precedes the result.
+        """
         try:
-            sql_lower = sql_query.lower().strip()
-            
-            # Check for dangerous operations
-            dangerous_keywords = ['drop', 'delete', 'truncate', 'alter', 'create']
-            has_dangerous = any(keyword in sql_lower for keyword in dangerous_keywords)
+            if not natural_language_query or not natural_language_query.strip():
+                yield {"event": "result", "data": {"success": False, "error": "Query cannot be empty"}}
+                return
             
-            # Check if it's a select query
-            is_select = sql_lower.startswith('select')
+            plan = self._plan_query(natural_language_query)
+            if plan["response"] is not None:
+                response = plan["response"]
+                yield {"event": "field", "data": {"field": "sql_query", "value": response["sql_query"]}}
+                yield {"event": "result", "data": response}
+                return
             
-            # Basic structure validation
-            has_semicolon = sql_query.strip().endswith(';')
+            self.metrics.queries["llm"].inc()
+            streamed_sql = None
+            stream = self.llm_client.stream_sql(
+                user_query=plan["user_query"],
+                system_prompt=plan["system_prompt"],
+                prompt_cache_key=plan["prompt_info"]["prefix_version"]
+            )
+            try:
+                async for item in stream:
+                    if item["type"] == "field":
+                        if item["field"] == "sql_query":
+                            streamed_sql = item["value"]
+                        yield {"event": "field", "data": {"field": item["field"], "value": item["value"]}}
+                    else:
+                        # Stream totals are not recorded in the total stage: they include client read time
+                        self._record_generation(client_id, item["result"])
+                        result = await self._repair_result(natural_language_query, item["result"], plan,
+                                                           client_id=client_id)
+                        response = self._finalize_result(natural_language_query, result, plan)
+                        final_sql = response.get("sql_query")
+                        if streamed_sql is not None and final_sql and final_sql.strip() != streamed_sql.strip():
+                            yield {"event": "field", "data": {"field": "sql_query", "value": final_sql}}
+                        yield {"event": "result", "data": response}
+            finally:
+                await stream.aclose()
             
-            return {
-                "is_select": is_select,
-                "has_dangerous_keywords": has_dangerous,
-                "has_semicolon": has_semicolon,
-                "is_valid": is_select and not has_dangerous,
-                "warnings": self._get_validation_warnings(sql_lower)
+        except Exception as e:
+            logger.error(f"Error streaming query: {e}")
+            yield {
+                "event": "result",
+                "data": {
+                    "success": False,
+                    "error": f"Internal error: {str(e)}",
+                    "natural_query": natural_language_query
+                }
             }
-            
+    
+    async def warm_up(self) -> Dict[str, Any]:
+        """Run one throwaway generation so the first real query does not pay for cold starts.
+        
+        A local runner loads the model weights and keeps the static prompt
+        prefix in its KV cache; the validation and cost stages run once too.
+        Nothing is cached, counted in metrics or charged to a client.
+        """
+        started = time.perf_counter()
+        prompt_info = self._build_prompt(WARMUP_QUERY)
+        result = await self.llm_client.generate_sql(
+            user_query=WARMUP_QUERY,
+            system_prompt=prompt_info["prompt"],
+            prompt_cache_key=prompt_info["prefix_version"],
+            priority="batch"
+        )
+        if result["success"]:
+            self._apply_cost_estimate(result["sql_query"], self._validate_sql(result["sql_query"]))
+        else:
+            logger.warning(f"LLM warm-up failed: {result['error']}")
+        return {
+            "success": result["success"],
+            "backend": result.get("backend"),
+            "error": result.get("error"),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+    
+    def seed_cache(self, path: str) -> Dict[str, Any]:
+        """Fill the query cache from an LLM recording (LLM_TRANSPORT=record) without calling the LLM.
+        
+        Each recorded generation whose question is not cached yet, whose
+        system prompt matches the current one for that question and whose
+        model is configured is parsed, validated and cached like a live
+        answer. Invalid SQL is left out: live traffic would have repaired it.
+        Records that cannot be read or parsed are counted as ``malformed`` and
+        skipped.
+        """
+        counts = {
+            "seeded": 0, "cached": 0, "stale_prompt": 0, "unknown_model": 0, "invalid": 0, "malformed": 0,
+            "skipped": 0
+        }
+        if self.cache is None:
+            return dict(counts, enabled=False)
+        backends = {backend.model: backend for backend in self.llm_client.router.backends}
+
+        def malformed_line(number: int, error: Exception):
+            counts["malformed"] += 1
+            logger.warning(f"Seed file {path} line {number} is not valid JSON: {error}")
+
+        for exchange in load_exchanges(path, on_error=malformed_line):
+            try:
+                outcome = self._seed_exchange(exchange, backends)
+            except Exception as e:
+                # One bad recording must not cost the rest of the seed
+                logger.warning(f"Could not seed recorded exchange {exchange.get('k')}: {e}")
+                outcome = "malformed"
+            counts[outcome] += 1
+        logger.info(f"Seeded query cache from {path}: {counts}")
+        return dict(counts, enabled=True, file=path)
+    
+    def _seed_exchange(self, exchange: Dict[str, Any], backends: Dict[str, Any]) -> str:
+        """Cache one recorded generation; returns the ``seed_cache`` count it falls under"""
+        question, completion = exchange.get("q"), exchange.get("j")
+        if not question or exchange.get("s") != 200 or not isinstance(completion, dict) or "choices" not in completion:
+            return "skipped"
+        backend = backends.get(exchange.get("m"))
+        if backend is None:
+            return "unknown_model"
+        cache_key = self._cache_key(question, backend.model, backend.provider)
+        if self.cache.get(cache_key) is not None:
+            return "cached"
+        prompt_info = self._build_prompt(question)
+        if exchange.get("p") != prompt_digest(prompt_info["prompt"]):
+            return "stale_prompt"
+        result = self.llm_client.result_from_completion(completion, backend)
+        if not self._validate_sql(result["sql_query"]).get("is_valid"):
+            return "invalid"
+        plan = {
+            "cache_key": cache_key,
+            "match": None,
+            "prompt_info": prompt_info,
+            "user_query": question,
+            "system_prompt": prompt_info["prompt"]
+        }
+        self._finalize_result(question, result, plan)
+        return "seeded"
+    
+    def _validate_sql(self, sql_query: str) -> Dict[str, Any]:
+        """Parse the generated SQL and check it against the schema catalog"""
+        try:
+            return self.validator.validate(sql_query)
         except Exception as e:
             return {
                 "is_valid": False,
                 "error": f"Validation error: {str(e)}"
             }
     
-    def _get_validation_warnings(self, sql_lower: str) -> list:
-        """Get validation warnings"""
-        warnings = []
+    def _apply_cost_estimate(self, sql_query: str, validation: Dict[str, Any]) -> str:
+        """Add the cost estimate to ``validation`` and return the SQL to serve (maybe with LIMIT)"""
+        if self.cost_estimator is None or not validation.get("is_valid"):
+            return sql_query
+        try:
+            cost = self.cost_estimator.estimate(sql_query)
+        except Exception as e:
+            logger.warning(f"Cost estimation failed: {e}")
+            return sql_query
+        validation["cost"] = cost
+        rewrite = cost["rewrite"]
+        if rewrite is None:
+            return sql_query
+        rewrite["applied"] = config.COST_AUTO_LIMIT
+        if not config.COST_AUTO_LIMIT:
+            rewrite["reason"] = rewrite["reason"].replace("se añade", "conviene añadir")
+        validation["warnings"].append(rewrite["reason"])
+        return rewrite["sql"] if config.COST_AUTO_LIMIT else sql_query
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Result cache counters"""
+        if self.cache is None:
+            return {"enabled": False}
+        stats = dict(self.cache.stats(), enabled=True)
+        if self.similarity_index is not None:
+            stats["similarity_index"] = self.similarity_index.stats()
+        return stats
+    
+    def repair_stats(self) -> Dict[str, Any]:
+        """Dry-run and self-repair counters"""
+        if self.repairer is None:
+            return {"enabled": False}
+        return self.repairer.stats()
+    
+    def coalescing_stats(self) -> Dict[str, Any]:
+        """Single-flight counters for concurrent identical queries"""
+        if self.single_flight is None:
+            return {"enabled": False}
+        return dict(self.single_flight.stats(), enabled=True)
+    
+    async def execute_sql(self, sql_query: str, max_rows: int,
+                          tables: Iterable[str] = ()) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the rows of a validated query: ``columns``, ``rows`` batches and ``end`` events.
         
-        if not sql_lower.startswith('select'):
-            warnings.append("Solo se permiten consultas SELECT por seguridad")
-            
-        if 'drop' in sql_lower or 'delete' in sql_lower:
-            warnings.append("Consulta contiene operaciones peligrosas")
-            
-        return warnings
+        With the result cache, a query already run (up to formatting) is served
+        from memory and ``end`` carries ``cached: true``; a fresh result is
+        stored once it has been streamed completely, indexed by ``tables``.
+        """
+        if self.result_cache is None:
+            async for event in self.executor.stream(sql_query, max_rows):
+                yield event
+            return
+        
+        started = time.perf_counter()
+        fingerprint = sql_fingerprint(sql_query)
+        hit = self.result_cache.get(fingerprint, max_rows)
+        if hit is not None:
+            yield {"type": "columns", "columns": hit["columns"], "types": hit["types"]}
+            batch = []
+            for row in hit["rows"]:
+                batch.append(row)
+                if len(batch) == config.EXECUTION_BATCH_ROWS:
+                    yield {"type": "rows", "rows": batch}
+                    batch = []
+            if batch:
+                yield {"type": "rows", "rows": batch}
+            yield {
+                "type": "end",
+                "row_count": hit["row_count"],
+                "truncated": hit["truncated"],
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+                "cached": True,
+            }
+            return
+        
+        tables = list(tables)
+        columns, types, rows = [], None, []
+        # Read before running, so an invalidation during the query discards its result
+        generations = self.result_cache.generations(tables)
+        stream = self.executor.stream(sql_query, max_rows)
+        try:
+            async for event in stream:
+                if event["type"] == "columns":
+                    columns, types = event["columns"], event.get("types")
+                elif event["type"] == "rows":
+                    rows.extend(event["rows"])
+                elif event["type"] == "end":
+                    # Only results read to the end (or to the row cap) are stored
+                    self.result_cache.set(
+                        fingerprint, columns, rows, event["truncated"], tables, types, generations
+                    )
+                    event = dict(event, cached=False)
+                yield event
+        finally:
+            await stream.aclose()
+    
+    def execution_stats(self) -> Dict[str, Any]:
+        """Query execution counters"""
+        if self.executor is None:
+            return {"enabled": False}
+        return dict(self.executor.stats(), enabled=True)
+    
+    def result_cache_stats(self) -> Dict[str, Any]:
+        """Result set cache counters"""
+        if self.result_cache is None:
+            return {"enabled": False}
+        return dict(self.result_cache.stats(), enabled=True, ttl=config.RESULT_CACHE_TTL)
+    
+    def invalidate_results(self, tables: Optional[Iterable[str]] = None) -> int:
+        """Drop cached result sets that read any of ``tables`` (all when None)"""
+        if self.result_cache is None:
+            return 0
+        return self.result_cache.invalidate(tables)
+    
+    def usage_stats(self) -> Dict[str, Any]:
+        """LLM token usage and cost per client"""
+        return self.usage.stats()
     
-    def test_connection(self) -> Dict[str, Any]:
+    def rate_limit_stats(self) -> Dict[str, Any]:
+        """Local TPM/RPM budget counters"""
+        if self.llm_client.rate_limiter is None:
+            return {"enabled": False}
+        return dict(self.llm_client.rate_limiter.stats(), enabled=True)
+    
+    def router_stats(self) -> Dict[str, Any]:
+        """LLM router and per-backend counters"""
+        return self.llm_client.router.stats()
+    
+    async def test_connection(self) -> Dict[str, Any]:
         """Test LLM connection"""
-        return self.llm_client.test_connection()
+        return await self.llm_client.test_connection()
+    
+    def metrics_text(self) -> str:
+        """Prometheus text exposition of the pipeline metrics"""
+        return self.metrics.render()
     
-    def test_connection_fast(self) -> Dict[str, Any]:
+    def health_status(self) -> Optional[Dict[str, Any]]:
+        """Latest background health snapshot (None when the monitor is disabled)"""
+        if self.health_monitor is None:
+            return None
+        return self.health_monitor.snapshot()
+    
+    async def test_connection_fast(self) -> Dict[str, Any]:
         """Fast LLM connection test for health checks"""
-        return self.llm_client.test_connection_fast()
\ No newline at end of file
+        return await self.llm_client.test_connection_fast()
+    
+    def transport_stats(self) -> Dict[str, Any]:
+        """Record/replay transport counters (``{"mode": "live"}`` when off)"""
+        if self.llm_client.transport is None:
+            return {"mode": "live"}
+        return self.llm_client.transport.stats()
+    
+    def http_stats(self) -> Dict[str, Any]:
+        """Shared HTTP connection pool counters"""
+        return self.llm_client.http.stats()
\ No newline at end of file
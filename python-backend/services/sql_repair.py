@@ -0,0 +1,181 @@
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from services.schema_catalog import SchemaCatalog
+from services.sql_validator import SQLValidator, tokenize
+from services.sqlite_mirror import SQLiteMirror
+
+logger = logging.getLogger(__name__)
+
+USAGE_KEYS = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+REPAIR_SYSTEM_PROMPT = """
+Eres un especialista en SQL para la base de datos Sakila_es (MySQL, tablas y columnas en español).
+
+Una consulta SQL generada falla contra el esquema. Corrígela usando SOLO las tablas y columnas de este esquema:
+
+```sql
+{schema}
+```
+
+Responde EXCLUSIVAMENTE con JSON válido con las claves "sql_query", "explanation", "considerations" y "alternatives".
+"""
+
+
+def add_usage(*usages: Optional[Dict[str, int]]) -> Optional[Dict[str, int]]:
+    """Token counts of several LLM calls added up (None when none reported any)"""
+    reported = [usage for usage in usages if usage]
+    if not reported:
+        return None
+    return {key: sum(usage.get(key) or 0 for usage in reported) for key in USAGE_KEYS}
+
+
+class SQLRepairer:
+    """Dry-runs generated SQL on the SQLite mirror and asks the LLM to fix it on error.
+
+    Only schema errors (unknown table or column, ambiguous names, misused
+    aggregates) trigger a repair; errors from MySQL syntax the mirror does
+    not translate are reported but left alone. The repair prompt carries the
+    failing SQL, the error message and the DDL of the tables involved, so it
+    is a fraction of the full system prompt.
+    """
+
+    def __init__(self, llm_client, mirror: SQLiteMirror, catalog: SchemaCatalog, max_retries: int = 1):
+        self.llm_client = llm_client
+        self.mirror = mirror
+        self.catalog = catalog
+        self.max_retries = max(0, max_retries)
+        self.validator = SQLValidator(catalog)
+        self._checked = 0
+        self._passed = 0
+        self._failed = 0
+        self._repaired = 0
+        self._unrepaired = 0
+        self._unverified = 0
+        self._retries = 0
+        self._dry_run_ms = 0.0
+        self._repair_ms = 0.0
+
+    def _repair_tables(self, sql_query: str, tables: Optional[List[str]]) -> List[str]:
+        """Tables referenced by the failed SQL plus the ones chosen for the original prompt"""
+        statement = []
+        for token in tokenize(sql_query):
+            if token[0] == "semi":
+                break
+            statement.append(token)
+        analysis = self.validator.analyze(statement)
+        referenced = [t for t in analysis["tables"] if t not in analysis["derived"]]
+        if not referenced or any(not self.catalog.has_table(t) for t in referenced):
+            # A misspelled table name leaves nothing to anchor on: send every table
+            return list(self.catalog.tables)
+        return list(dict.fromkeys(referenced + [t for t in tables or [] if self.catalog.has_table(t)]))
+
+    def _repair_prompt(self, tables: List[str]) -> str:
+        schema = "\n\n".join(self.catalog.render_table(name) for name in tables)
+        relationships = self.catalog.render_relationships(tables)
+        if relationships:
+            schema += "\n\n-- Relaciones\n" + "\n".join(f"-- {rel}" for rel in relationships)
+        return REPAIR_SYSTEM_PROMPT.format(schema=schema)
+
+    @staticmethod
+    def _repair_query(natural_query: str, sql_query: str, error: str) -> str:
+        return (
+            f"Pregunta: {natural_query}\n"
+            f"SQL con error: {sql_query}\n"
+            f"Error: {error}"
+        )
+
+    async def check(self, natural_query: str, result: Dict[str, Any],
+                    tables: Optional[List[str]] = None, priority: str = "interactive",
+                    on_generation: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Return ``result`` (or a repaired copy) with a ``repair`` report attached.
+
+        Each repair generation is passed to ``on_generation`` (to charge and
+        count it); the returned ``usage`` adds their tokens to the original's.
+        """
+        if not result.get("sql_query", "").strip():
+            return result
+        self._checked += 1
+        dry_run = self.mirror.dry_run(result["sql_query"])
+        self._dry_run_ms += dry_run["elapsed_ms"]
+        report: Dict[str, Any] = {
+            "checked": True,
+            "ok": dry_run["ok"],
+            "attempts": 0,
+            "repaired": False,
+            "dry_run_ms": dry_run["elapsed_ms"],
+            "repair_ms": 0.0,
+        }
+
+        if dry_run["ok"]:
+            self._passed += 1
+            return dict(result, repair=report)
+        report["errors"] = [dry_run["error"]]
+        if dry_run["error_kind"] != "schema":
+            self._unverified += 1
+            report["unverified"] = True
+            return dict(result, repair=report)
+
+        self._failed += 1
+        started = time.perf_counter()
+        attempts_sql = [result["sql_query"]]
+        error = dry_run["error"]
+        repaired_result = None
+        repair_usage = None
+        for _ in range(self.max_retries):
+            report["attempts"] += 1
+            self._retries += 1
+            system_prompt = self._repair_prompt(self._repair_tables(attempts_sql[-1], tables))
+            candidate = await self.llm_client.generate_sql(
+                user_query=self._repair_query(natural_query, attempts_sql[-1], error),
+                system_prompt=system_prompt,
+                priority=priority
+            )
+            if on_generation is not None:
+                on_generation(candidate)
+            repair_usage = add_usage(repair_usage, candidate.get("usage"))
+            if not candidate["success"]:
+                report["errors"].append(candidate["error"])
+                break
+            attempts_sql.append(candidate["sql_query"])
+            dry_run = self.mirror.dry_run(candidate["sql_query"])
+            self._dry_run_ms += dry_run["elapsed_ms"]
+            if dry_run["ok"]:
+                repaired_result = candidate
+                break
+            error = dry_run["error"]
+            report["errors"].append(error)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._repair_ms += elapsed_ms
+        report["repair_ms"] = round(elapsed_ms, 2)
+        report["usage"] = repair_usage
+        usage = add_usage(result.get("usage"), repair_usage)
+        if repaired_result is None:
+            self._unrepaired += 1
+            logger.info(f"SQL repair failed after {report['attempts']} attempt(s): {error}")
+            return dict(result, usage=usage, repair=report)
+
+        self._repaired += 1
+        report.update({"ok": True, "repaired": True, "original_sql": result["sql_query"]})
+        return dict(repaired_result, usage=usage, repair=report)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of dry-runs and repairs"""
+        attempted = self._repaired + self._unrepaired
+        return {
+            "enabled": True,
+            "max_retries": self.max_retries,
+            "checked": self._checked,
+            "passed": self._passed,
+            "failed": self._failed,
+            "unverified": self._unverified,
+            "repaired": self._repaired,
+            "unrepaired": self._unrepaired,
+            "retries": self._retries,
+            "success_rate": round(self._repaired / attempted, 4) if attempted else 0.0,
+            "dry_run_ms_total": round(self._dry_run_ms, 2),
+            "repair_ms_total": round(self._repair_ms, 2),
+            "mirror_build_ms": self.mirror.build_ms,
+        }
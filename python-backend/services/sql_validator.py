@@ -0,0 +1,369 @@
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from services.schema_catalog import SchemaCatalog
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|\#[^\n]*|/\*.*?(?:\*/|$))
+  | (?P<str>'(?:[^'\\]|\\.|'')*(?:'|$)|"(?:[^"\\]|\\.|"")*(?:"|$))
+  | (?P<qid>`(?:[^`]|``)*`)
+  | (?P<num>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+)
+  | (?P<var>@@?[\w.$]*|\?)
+  | (?P<id>[^\W\d][\w$]*)
+  | (?P<op><=>|<=|>=|<>|!=|:=|\|\||&&|<<|>>|[-+*/%=<>!~^&|])
+  | (?P<semi>;)
+  | (?P<lp>\()
+  | (?P<rp>\))
+  | (?P<comma>,)
+  | (?P<dot>\.)
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+KEYWORDS = frozenset("""
+ACCESSIBLE ALL AND ANY AS ASC BETWEEN BINARY BOTH BY CASE CAST CHAR CHARACTER COLLATE
+CONVERT CROSS CURRENT CURRENT_DATE CURRENT_TIME CURRENT_TIMESTAMP DATE DATETIME DAY
+DAY_HOUR DAY_MINUTE DAY_SECOND DECIMAL DESC DISTINCT DISTINCTROW DIV DOUBLE DUMPFILE ELSE END
+ESCAPE EXISTS FALSE FIRST FLOAT FOLLOWING FOR FORCE FROM FULL GROUP HAVING HOUR
+HOUR_MINUTE HOUR_SECOND IGNORE IN INDEX INNER INT INTEGER INTERVAL INTO IS JOIN JSON KEY
+LAST LATERAL LEADING LEFT LIKE LIMIT LOCALTIME LOCALTIMESTAMP MICROSECOND MINUTE
+MINUTE_SECOND MOD MONTH NATURAL NCHAR NOT NULL NULLS OFFSET ON OR ORDER OUTER OUTFILE OVER
+PARTITION PRECEDING QUARTER RANGE RECURSIVE REGEXP RIGHT RLIKE ROLLUP ROW ROWS SECOND
+SELECT SEPARATOR SIGNED SOME SOUNDS STRAIGHT_JOIN THEN TIME TIMESTAMP TO TRAILING TRUE
+UNBOUNDED UNION UNKNOWN UNSIGNED USE USING VALUES WEEK WHEN WHERE WINDOW WITH XOR YEAR
+YEAR_MONTH
+""".split())
+
+# Statements that modify data, schema or server state
+DANGEROUS_KEYWORDS = frozenset("""
+ALTER ANALYZE CALL CREATE DEALLOCATE DELETE DO DROP EXECUTE FLUSH GRANT HANDLER INSERT
+INSTALL KILL LOAD LOCK OPTIMIZE PREPARE PURGE RENAME REPAIR REPLACE RESET REVOKE SET
+SHUTDOWN TRUNCATE UNINSTALL UNLOCK UPDATE
+""".split())
+
+# Functions that read files or stall the server
+DANGEROUS_FUNCTIONS = frozenset(["LOAD_FILE", "SLEEP", "BENCHMARK", "GET_LOCK", "SYS_EXEC", "SYS_EVAL"])
+
+# Tables large enough that an unfiltered scan is worth a warning
+LARGE_TABLES = ("alquiler", "pago")
+
+
+def tokenize(sql: str) -> List[Tuple[str, str]]:
+    """Significant ``(kind, text)`` tokens of a MySQL statement (no whitespace/comments)"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        if kind == "ws":
+            continue
+        text = match.group(kind)
+        if kind == "comment":
+            if text.startswith("/*!"):
+                # MySQL executes version comments: keep them visible to the checks
+                tokens.append(("exec_comment", text))
+            continue
+        if kind == "qid":
+            text = text[1:-1].replace("``", "`")
+        tokens.append((kind, text))
+    return tokens
+
+
+class SQLValidator:
+    """Tokenizer-based validator for the MySQL SELECT subset.
+
+    Rejects non-SELECT and multi-statement input, dangerous keywords used as
+    statements (not substrings, so ``fecha_creacion`` or ``ultima_actualizacion``
+    are fine), ``INTO OUTFILE``-style exports and references to tables or
+    columns missing from the schema catalog. It also reports the query shape
+    (joins, subqueries, ``SELECT *``, unfiltered scans on large tables).
+    """
+
+    def __init__(self, catalog: Optional[SchemaCatalog] = None, large_tables=LARGE_TABLES):
+        self.catalog = catalog
+        self.large_tables = tuple(large_tables)
+        self._columns: Dict[str, Set[str]] = {}
+        if catalog is not None:
+            self._columns = {
+                name.lower(): {column.lower() for column in table["columns"]}
+                for name, table in catalog.tables.items()
+            }
+
+    def validate(self, sql_query: str) -> Dict[str, Any]:
+        """Validate one generated query and describe its shape"""
+        errors: List[str] = []
+        warnings: List[str] = []
+        stripped = (sql_query or "").strip()
+        tokens = tokenize(stripped)
+
+        statements = self._split_statements(tokens)
+        statement_count = len(statements)
+        if statement_count > 1:
+            errors.append("La consulta contiene varias sentencias; solo se permite una")
+        if not statements:
+            errors.append("La consulta está vacía")
+        statement = statements[0] if statements else []
+
+        first = statement[0] if statement else ("", "")
+        is_select = first[0] == "lp" or (first[0] == "id" and first[1].upper() in ("SELECT", "WITH"))
+        if not is_select:
+            warnings.append("Solo se permiten consultas SELECT por seguridad")
+
+        dangerous = self._find_dangerous(tokens)
+        if dangerous:
+            warnings.append("Consulta contiene operaciones peligrosas")
+            errors.append(f"Operaciones no permitidas: {', '.join(dangerous)}")
+
+        analysis = self.analyze(statement)
+        tables = analysis["tables"]
+        if is_select and self.catalog is not None:
+            errors.extend(self._check_schema(statement, analysis))
+
+        shape = analysis["shape"]
+        if shape["select_star"]:
+            warnings.append("SELECT * devuelve todas las columnas; conviene listar solo las necesarias")
+        if shape["large_tables_scanned"]:
+            warnings.append(
+                "Recorrido completo sin WHERE ni LIMIT sobre tablas grandes: "
+                + ", ".join(shape["large_tables_scanned"])
+            )
+        if shape["cartesian_product"]:
+            warnings.append("Tablas separadas por comas sin WHERE: posible producto cartesiano")
+
+        return {
+            "is_select": is_select,
+            "has_dangerous_keywords": bool(dangerous),
+            "has_semicolon": stripped.endswith(";"),
+            "is_valid": is_select and not errors,
+            "statement_count": statement_count,
+            "tables": tables,
+            "shape": shape,
+            "errors": errors,
+            "warnings": warnings,
+        }
+
+    @staticmethod
+    def _split_statements(tokens: List[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+        statements: List[List[Tuple[str, str]]] = []
+        current: List[Tuple[str, str]] = []
+        for token in tokens:
+            if token[0] == "semi":
+                if current:
+                    statements.append(current)
+                current = []
+            else:
+                current.append(token)
+        if current:
+            statements.append(current)
+        return statements
+
+    @staticmethod
+    def _find_dangerous(tokens: List[Tuple[str, str]]) -> List[str]:
+        found: List[str] = []
+        for i, (kind, text) in enumerate(tokens):
+            if kind == "exec_comment":
+                found.append("comentario ejecutable /*!")
+                continue
+            if kind != "id":
+                continue
+            upper = text.upper()
+            prev_is_dot = i > 0 and tokens[i - 1][0] == "dot"
+            next_kind = tokens[i + 1][0] if i + 1 < len(tokens) else None
+            if prev_is_dot or next_kind == "dot":
+                continue
+            if upper in DANGEROUS_KEYWORDS and next_kind != "lp":
+                found.append(upper)
+            elif upper in DANGEROUS_FUNCTIONS and next_kind == "lp":
+                found.append(upper)
+            elif upper == "INTO":
+                target = tokens[i + 1] if i + 1 < len(tokens) else ("", "")
+                if target[0] == "var":
+                    found.append("INTO @variable")
+                else:
+                    found.append(f"INTO {target[1].upper()}".strip())
+        return list(dict.fromkeys(found))
+
+    def analyze(self, tokens: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """Collect table references, aliases, CTE names and shape counters"""
+        tables: List[str] = []
+        alias_map: Dict[str, str] = {}
+        derived: Set[str] = set()
+        ctes: Set[str] = set()
+        output_aliases: Set[str] = set()
+        clause: List[Optional[str]] = [None]
+        expect_table = False
+        joins = comma_joins = selects = 0
+        select_star = has_where = has_limit = has_group_by = has_order_by = False
+        closed_subquery = False
+
+        i = 0
+        n = len(tokens)
+        while i < n:
+            kind, text = tokens[i]
+            upper = text.upper() if kind == "id" else text
+            depth = len(clause) - 1
+
+            if kind == "lp":
+                # Function arguments ("EXTRACT(YEAR FROM fecha)") are not a FROM clause
+                prev = tokens[i - 1] if i > 0 else ("", "")
+                is_call = prev[0] in ("id", "qid") and prev[1].upper() not in KEYWORDS
+                clause.append("CALL" if is_call else None)
+                expect_table = False
+                i += 1
+                continue
+            if kind == "rp":
+                if len(clause) > 1:
+                    inner = clause.pop()
+                    closed_subquery = inner not in (None, "CALL")
+                i += 1
+                # Alias after a parenthesised expression or derived table
+                if i < n and tokens[i][0] == "id" and tokens[i][1].upper() == "AS":
+                    i += 1
+                if i < n and tokens[i][0] in ("id", "qid") and tokens[i][1].upper() not in KEYWORDS:
+                    alias = tokens[i][1].lower()
+                    output_aliases.add(alias)
+                    if closed_subquery:
+                        derived.add(alias)
+                    i += 1
+                continue
+
+            if kind == "id" and upper in KEYWORDS:
+                if upper == "SELECT":
+                    selects += 1
+                    clause[depth] = "SELECT"
+                elif upper == "WITH":
+                    clause[depth] = "WITH"
+                elif upper == "FROM" and clause[depth] != "CALL":
+                    clause[depth] = "FROM"
+                    expect_table = True
+                elif upper == "JOIN" or upper == "STRAIGHT_JOIN":
+                    joins += 1
+                    clause[depth] = "FROM"
+                    expect_table = True
+                elif upper in ("WHERE", "GROUP", "ORDER", "HAVING", "LIMIT", "ON", "USING", "UNION", "WINDOW"):
+                    clause[depth] = upper
+                    if depth == 0:
+                        has_where = has_where or upper == "WHERE"
+                        has_limit = has_limit or upper == "LIMIT"
+                        has_group_by = has_group_by or upper == "GROUP"
+                        has_order_by = has_order_by or upper == "ORDER"
+                    elif upper == "WHERE":
+                        has_where = True
+                elif upper == "AS" and i + 1 < n and tokens[i + 1][0] in ("id", "qid"):
+                    output_aliases.add(tokens[i + 1][1].lower())
+                i += 1
+                continue
+
+            if clause[depth] == "WITH" and kind in ("id", "qid") and i + 1 < n and (
+                    tokens[i + 1][0] == "lp" or tokens[i + 1][1].upper() == "AS"):
+                ctes.add(text.lower())
+                i += 1
+                continue
+
+            if expect_table and kind in ("id", "qid"):
+                name = text
+                j = i + 1
+                if j + 1 < n and tokens[j][0] == "dot" and tokens[j + 1][0] in ("id", "qid"):
+                    name = tokens[j + 1][1]
+                    j += 2
+                table = name.lower()
+                if table not in tables:
+                    tables.append(table)
+                alias_map[table] = table
+                if j < n and tokens[j][0] == "id" and tokens[j][1].upper() == "AS":
+                    j += 1
+                if j < n and tokens[j][0] in ("id", "qid") and tokens[j][1].upper() not in KEYWORDS:
+                    alias_map[tokens[j][1].lower()] = table
+                    j += 1
+                expect_table = False
+                i = j
+                continue
+
+            if kind == "comma":
+                if clause[depth] == "FROM":
+                    expect_table = True
+                    comma_joins += 1
+                i += 1
+                continue
+
+            if kind == "op" and text == "*" and clause[depth] == "SELECT" and i > 0:
+                prev = tokens[i - 1]
+                if prev[0] in ("comma", "dot") or prev[1].upper() in ("SELECT", "DISTINCT"):
+                    select_star = True
+
+            # Implicit alias: "SUM(x) total" or "c.nombre cliente" in the select list
+            if (kind in ("id", "qid") and clause[depth] == "SELECT" and i > 0 and i + 1 <= n
+                    and tokens[i - 1][0] in ("id", "qid", "num", "str")
+                    and (tokens[i - 1][0] != "id" or tokens[i - 1][1].upper() not in KEYWORDS)
+                    and (i + 1 == n or tokens[i + 1][0] in ("comma",)
+                         or tokens[i + 1][1].upper() == "FROM")):
+                output_aliases.add(text.lower())
+            i += 1
+
+        filtered = has_where or has_limit
+        scanned = [] if filtered else [t for t in tables if t in self.large_tables]
+        return {
+            "tables": tables,
+            "alias_map": alias_map,
+            "derived": derived | ctes,
+            "output_aliases": output_aliases,
+            "shape": {
+                "joins": joins + comma_joins,
+                "subqueries": max(selects - 1, 0),
+                "select_star": select_star,
+                "has_where": has_where,
+                "has_limit": has_limit,
+                "has_group_by": has_group_by,
+                "has_order_by": has_order_by,
+                "large_tables_scanned": scanned,
+                "cartesian_product": comma_joins > 0 and not has_where,
+            },
+        }
+
+    def _check_schema(self, tokens: List[Tuple[str, str]], analysis: Dict[str, Any]) -> List[str]:
+        """Errors for unknown tables, aliases and columns"""
+        errors: List[str] = []
+        derived = analysis["derived"]
+        alias_map = analysis["alias_map"]
+        real_tables = [t for t in analysis["tables"] if t not in derived]
+
+        for table in real_tables:
+            if table not in self._columns:
+                errors.append(f"Tabla desconocida: {table}")
+
+        known_tables = [t for t in real_tables if t in self._columns]
+        resolvable = len(known_tables) == len(analysis["tables"])
+        visible_columns: Set[str] = set()
+        for table in known_tables:
+            visible_columns |= self._columns[table]
+        ignored = analysis["output_aliases"] | set(alias_map) | derived
+
+        unknown: List[str] = []
+        n = len(tokens)
+        for i, (kind, text) in enumerate(tokens):
+            if kind not in ("id", "qid"):
+                continue
+            next_kind = tokens[i + 1][0] if i + 1 < n else None
+            if next_kind == "lp" or (kind == "id" and text.upper() in KEYWORDS):
+                continue
+            lowered = text.lower()
+
+            if next_kind == "dot":
+                # qualifier.column
+                if i + 2 < n and tokens[i + 2][0] in ("id", "qid"):
+                    column = tokens[i + 2][1].lower()
+                    table = alias_map.get(lowered)
+                    if table is None:
+                        if lowered not in derived and not self.catalog.has_table(lowered):
+                            unknown.append(f"{text}.{tokens[i + 2][1]} (alias desconocido)")
+                    elif table in self._columns and column not in self._columns[table]:
+                        unknown.append(f"{text}.{tokens[i + 2][1]}")
+                continue
+            if i > 0 and tokens[i - 1][0] == "dot":
+                continue
+            if lowered in ignored or not resolvable:
+                continue
+            if lowered not in visible_columns:
+                unknown.append(text)
+
+        for column in dict.fromkeys(unknown):
+            errors.append(f"Columna desconocida: {column}")
+        return errors
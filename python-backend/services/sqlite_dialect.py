@@ -0,0 +1,544 @@
+"""MySQL to SQLite translation for running generated Sakila queries offline.
+
+``translate`` rewrites the syntax SQLite does not understand (backticks,
+``INTERVAL`` arithmetic, ``CAST`` types, ``GROUP_CONCAT ... SEPARATOR``,
+index hints, ``||`` as OR...) at token level, and ``register_functions``
+adds the MySQL functions generated queries use (``YEAR``, ``DATE_FORMAT``,
+``DATEDIFF``, ``CONCAT``...) as Python UDFs on a connection.
+"""
+import calendar
+import datetime
+import math
+import random
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.sql_validator import KEYWORDS, tokenize
+
+# MySQL functions whose SQLite name differs or is a reserved word
+FUNCTION_RENAMES = {
+    "LEFT": "MYSQL_LEFT",
+    "RIGHT": "MYSQL_RIGHT",
+    "IF": "IIF",
+    "FORMAT": "MYSQL_FORMAT",
+    "CHAR_LENGTH": "LENGTH",
+    "CHARACTER_LENGTH": "LENGTH",
+    "LCASE": "LOWER",
+    "UCASE": "UPPER",
+    "GREATEST": "MAX",
+    "LEAST": "MIN",
+    "SUBSTRING_INDEX": "MYSQL_SUBSTRING_INDEX",
+}
+
+OPERATOR_RENAMES = {"||": "OR", "&&": "AND", "<=>": "IS", "!": "NOT"}
+
+# Functions whose first argument is a unit keyword
+UNIT_FIRST_FUNCTIONS = frozenset(["EXTRACT", "TIMESTAMPDIFF", "TIMESTAMPADD"])
+
+# Modifiers and hints with no SQLite equivalent (dropped)
+DROPPED_KEYWORDS = frozenset([
+    "SQL_CALC_FOUND_ROWS", "SQL_NO_CACHE", "SQL_CACHE", "HIGH_PRIORITY", "SQL_SMALL_RESULT",
+    "SQL_BIG_RESULT", "SQL_BUFFER_RESULT",
+])
+
+CAST_TYPES = {
+    "SIGNED": "INTEGER", "UNSIGNED": "INTEGER", "INT": "INTEGER", "INTEGER": "INTEGER",
+    "DECIMAL": "REAL", "DOUBLE": "REAL", "FLOAT": "REAL",
+    "CHAR": "TEXT", "NCHAR": "TEXT", "DATE": "TEXT", "DATETIME": "TEXT", "TIME": "TEXT", "JSON": "TEXT",
+}
+
+_INTERVAL_UNITS = frozenset([
+    "MICROSECOND", "SECOND", "MINUTE", "HOUR", "DAY", "WEEK", "MONTH", "QUARTER", "YEAR",
+])
+
+_MYSQL_ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+
+
+def unescape_string(literal: str) -> str:
+    """Value of a MySQL string literal (single or double quoted, backslash escapes)"""
+    quote, body = literal[0], literal[1:-1] if len(literal) > 1 and literal[-1] == literal[0] else literal[1:]
+    body = body.replace(quote * 2, quote)
+    if "\\" not in body:
+        return body
+    return re.sub(r"\\(.)", lambda m: _MYSQL_ESCAPES.get(m.group(1), m.group(1)), body, flags=re.DOTALL)
+
+
+def sqlite_string(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _matching_paren(tokens: List[Tuple[str, str]], start: int) -> int:
+    """Index of the ``)`` closing the ``(`` at ``start`` (or the last token)"""
+    depth = 0
+    for i in range(start, len(tokens)):
+        if tokens[i][0] == "lp":
+            depth += 1
+        elif tokens[i][0] == "rp":
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(tokens) - 1
+
+
+def _operand_start(kinds: List[str]) -> int:
+    """Start (in the output so far) of the operand just before a binary operator"""
+    i = len(kinds) - 1
+    if i < 0 or kinds[i] == "expr":
+        return max(i, 0)
+    if kinds[i] == "rp":
+        depth = 0
+        while i >= 0:
+            if kinds[i] == "rp":
+                depth += 1
+            elif kinds[i] == "lp":
+                depth -= 1
+                if depth == 0:
+                    break
+            i -= 1
+        if i > 0 and kinds[i - 1] == "id":
+            i -= 1
+        return max(i, 0)
+    while i >= 2 and kinds[i - 1] == "dot":
+        i -= 2
+    return i
+
+
+def translate(sql: str) -> str:
+    """Rewrite one MySQL SELECT statement into SQLite syntax"""
+    tokens = [t for t in tokenize(sql) if t[0] != "exec_comment"]
+    while tokens and tokens[-1][0] == "semi":
+        tokens.pop()
+    out: List[str] = []
+    kinds: List[str] = []
+
+    def emit(text: str, kind: str):
+        out.append(text)
+        kinds.append(kind)
+
+    # Open GROUP_CONCAT calls: {"depth", "distinct", "skip"}
+    group_concats: List[Dict[str, Any]] = []
+    depth = 0
+    i = 0
+    n = len(tokens)
+    while i < n:
+        kind, text = tokens[i]
+        upper = text.upper() if kind == "id" else text
+        next_token = tokens[i + 1] if i + 1 < n else ("", "")
+        current = group_concats[-1] if group_concats else None
+
+        if kind == "lp":
+            depth += 1
+        elif kind == "rp":
+            if current is not None and current["depth"] == depth:
+                group_concats.pop()
+                current = None
+            depth -= 1
+
+        if current is not None and current["skip"] and not (kind == "id" and upper == "SEPARATOR"):
+            i += 1
+            continue
+
+        if kind == "qid":
+            emit('"' + text.replace('"', '""') + '"', "id")
+        elif kind == "str":
+            emit(sqlite_string(unescape_string(text)), "str")
+        elif kind == "op":
+            if text in OPERATOR_RENAMES:
+                emit(OPERATOR_RENAMES[text], "id")
+            elif text in ("+", "-") and next_token[0] == "id" and next_token[1].upper() == "INTERVAL":
+                # fecha - INTERVAL 30 DAY  ->  DATE_ADD(fecha, '-30 DAY')
+                amount, unit, end = _read_interval(tokens, i + 1)
+                if unit is None:
+                    emit(text, kind)
+                else:
+                    start = _operand_start(kinds)
+                    operand = " ".join(out[start:])
+                    del out[start:], kinds[start:]
+                    sign = "-" if text == "-" else ""
+                    emit(f"DATE_ADD({operand}, {sqlite_string(f'{sign}{amount} {unit}')})", "expr")
+                    i = end
+                    continue
+            else:
+                emit(text, kind)
+        elif kind != "id":
+            emit(text, kind)
+        elif upper in DROPPED_KEYWORDS or (upper == "BINARY" and next_token[0] != "lp"):
+            pass
+        elif upper == "STRAIGHT_JOIN":
+            # Join order hint, or a SELECT modifier right after SELECT
+            if not out or out[-1].upper() != "SELECT":
+                emit("JOIN", "id")
+        elif upper in ("USE", "FORCE", "IGNORE") and next_token[1].upper() in ("INDEX", "KEY"):
+            # Index hint: skip "USE INDEX [FOR JOIN] (...)"
+            j = i + 2
+            while j < n and tokens[j][0] != "lp":
+                j += 1
+            i = _matching_paren(tokens, j) + 1
+            continue
+        elif (upper == "WITH" and next_token[1].upper() == "ROLLUP") or upper == "COLLATE":
+            i += 2
+            continue
+        elif upper == "RLIKE":
+            emit("REGEXP", "id")
+        elif upper == "DIV":
+            emit("/", "op")
+        elif upper == "MOD" and next_token[0] != "lp":
+            emit("%", "op")
+        elif upper == "INTERVAL" and next_token[0] in ("num", "str", "op"):
+            amount, unit, end = _read_interval(tokens, i)
+            if unit is None:
+                emit(text, kind)
+            else:
+                emit(sqlite_string(f"{amount} {unit}"), "str")
+                i = end
+                continue
+        elif upper == "SEPARATOR" and current is not None:
+            current["skip"] = False
+            if current["distinct"]:
+                # SQLite only accepts one argument with DISTINCT: keep the default separator
+                i += 2
+                continue
+            emit(",", "comma")
+        elif upper == "ORDER" and current is not None and current["depth"] == depth:
+            # ORDER BY inside GROUP_CONCAT needs SQLite 3.44; drop it
+            current["skip"] = True
+        elif next_token[0] == "lp" and (upper not in KEYWORDS or upper in ("LEFT", "RIGHT")):
+            if upper in UNIT_FIRST_FUNCTIONS and i + 2 < n:
+                # EXTRACT(YEAR FROM x) / TIMESTAMPDIFF(DAY, a, b): pass the unit as a string
+                emit(upper, "id")
+                emit("(", "lp")
+                emit(sqlite_string(tokens[i + 2][1].upper()), "str")
+                emit(",", "comma")
+                depth += 1
+                separator = tokens[i + 3] if i + 3 < n else ("", "")
+                i += 4 if separator[0] == "comma" or separator[1].upper() == "FROM" else 3
+                continue
+            if upper == "GROUP_CONCAT":
+                distinct = i + 2 < n and tokens[i + 2][1].upper() == "DISTINCT"
+                group_concats.append({"depth": depth + 1, "distinct": distinct, "skip": False})
+            emit(FUNCTION_RENAMES.get(upper, text), "id")
+        elif upper == "AS" and _inside_cast(out, kinds) and next_token[1].upper() in CAST_TYPES:
+            emit("AS", "id")
+            emit(CAST_TYPES[next_token[1].upper()], "id")
+            j = i + 2
+            # Skip length/precision and "SIGNED INTEGER"-style suffixes
+            if j < n and tokens[j][0] == "lp":
+                j = _matching_paren(tokens, j) + 1
+            while j < n and tokens[j][0] == "id" and tokens[j][1].upper() in ("INTEGER", "INT", "SIGNED", "UNSIGNED"):
+                j += 1
+            i = j
+            continue
+        else:
+            emit(text, kind)
+        i += 1
+    return " ".join(out)
+
+
+def _inside_cast(out: List[str], kinds: List[str]) -> bool:
+    """True if the innermost open parenthesis belongs to CAST/CONVERT"""
+    depth = 0
+    for i in range(len(out) - 1, -1, -1):
+        if kinds[i] == "rp":
+            depth += 1
+        elif kinds[i] == "lp":
+            if depth == 0:
+                return i > 0 and out[i - 1].upper() in ("CAST", "CONVERT")
+            depth -= 1
+    return False
+
+
+def _read_interval(tokens: List[Tuple[str, str]], i: int) -> Tuple[Optional[str], Optional[str], int]:
+    """Parse ``INTERVAL [-]n UNIT`` starting at ``i``; returns (amount, unit, next index)"""
+    j = i + 1
+    sign = ""
+    if j < len(tokens) and tokens[j] == ("op", "-"):
+        sign = "-"
+        j += 1
+    if j + 1 >= len(tokens) or tokens[j][0] not in ("num", "str"):
+        return None, None, i
+    amount = tokens[j][1] if tokens[j][0] == "num" else unescape_string(tokens[j][1]).strip()
+    unit = tokens[j + 1][1].upper()
+    if unit not in _INTERVAL_UNITS:
+        return None, None, i
+    if amount.startswith("-") and sign:
+        amount, sign = amount[1:], ""
+    return sign + amount, unit, j + 2
+
+
+# ---------------------------------------------------------------------------
+# MySQL functions as SQLite UDFs
+
+_DATETIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d")
+_DATE_FORMAT_CODES = {
+    "%Y": "%Y", "%y": "%y", "%m": "%m", "%d": "%d", "%H": "%H", "%h": "%I", "%I": "%I", "%i": "%M",
+    "%s": "%S", "%S": "%S", "%p": "%p", "%M": "%B", "%b": "%b", "%W": "%A", "%a": "%a", "%j": "%j",
+    "%T": "%H:%M:%S", "%r": "%I:%M:%S %p", "%U": "%U", "%u": "%W", "%%": "%%",
+}
+
+
+def _parse_datetime(value: Any) -> Optional[datetime.datetime]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    for fmt in _DATETIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _has_time(value: Any) -> bool:
+    return value is not None and len(str(value).strip()) > 10
+
+
+def _format_datetime(moment: datetime.datetime, with_time: bool) -> str:
+    return moment.strftime("%Y-%m-%d %H:%M:%S" if with_time else "%Y-%m-%d")
+
+
+def _add_months(moment: datetime.datetime, months: int) -> datetime.datetime:
+    month_index = moment.month - 1 + months
+    year = moment.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(moment.day, calendar.monthrange(year, month)[1])
+    return moment.replace(year=year, month=month, day=day)
+
+
+def _date_add(value, interval, sign=1):
+    moment = _parse_datetime(value)
+    if moment is None or interval is None:
+        return None
+    if isinstance(interval, (int, float)):
+        amount, unit = float(interval), "DAY"
+    else:
+        parts = str(interval).split()
+        if len(parts) != 2:
+            return None
+        amount, unit = float(parts[0]), parts[1].upper()
+    amount *= sign
+    if unit in ("MONTH", "QUARTER", "YEAR"):
+        moment = _add_months(moment, int(amount) * {"MONTH": 1, "QUARTER": 3, "YEAR": 12}[unit])
+        return _format_datetime(moment, _has_time(value))
+    seconds = {"MICROSECOND": 1e-6, "SECOND": 1, "MINUTE": 60, "HOUR": 3600, "DAY": 86400, "WEEK": 604800}
+    if unit not in seconds:
+        return None
+    moment = moment + datetime.timedelta(seconds=amount * seconds[unit])
+    return _format_datetime(moment, _has_time(value) or unit not in ("DAY", "WEEK"))
+
+
+def _date_part(attribute):
+    def part(value):
+        moment = _parse_datetime(value)
+        return None if moment is None else getattr(moment, attribute)
+    return part
+
+
+def _extract(unit, value):
+    moment = _parse_datetime(value)
+    if moment is None or unit is None:
+        return None
+    unit = str(unit).upper()
+    if unit == "QUARTER":
+        return (moment.month - 1) // 3 + 1
+    if unit == "WEEK":
+        return int(moment.strftime("%U"))
+    if unit == "YEAR_MONTH":
+        return moment.year * 100 + moment.month
+    return getattr(moment, unit.lower(), None)
+
+
+def _timestampdiff(unit, start, end):
+    first, second = _parse_datetime(start), _parse_datetime(end)
+    if first is None or second is None or unit is None:
+        return None
+    unit = str(unit).upper()
+    if unit in ("MONTH", "QUARTER", "YEAR"):
+        months = (second.year - first.year) * 12 + second.month - first.month
+        if months > 0 and (second.day, second.time()) < (first.day, first.time()):
+            months -= 1
+        elif months < 0 and (second.day, second.time()) > (first.day, first.time()):
+            months += 1
+        return int(months / {"MONTH": 1, "QUARTER": 3, "YEAR": 12}[unit])
+    seconds = {"MICROSECOND": 1e-6, "SECOND": 1, "MINUTE": 60, "HOUR": 3600, "DAY": 86400, "WEEK": 604800}
+    if unit not in seconds:
+        return None
+    return int((second - first).total_seconds() / seconds[unit])
+
+
+def _datediff(end, start):
+    first, second = _parse_datetime(end), _parse_datetime(start)
+    if first is None or second is None:
+        return None
+    return (first.date() - second.date()).days
+
+
+def _date_format(value, fmt):
+    moment = _parse_datetime(value)
+    if moment is None or fmt is None:
+        return None
+    text = re.sub(r"%.", lambda m: _DATE_FORMAT_CODES.get(m.group(), m.group()[1:]), str(fmt))
+    text = text.replace("%c", str(moment.month)).replace("%e", str(moment.day))
+    return moment.strftime(text)
+
+
+def _concat(*args):
+    if any(arg is None for arg in args):
+        return None
+    return "".join(_to_text(arg) for arg in args)
+
+
+def _concat_ws(separator, *args):
+    if separator is None:
+        return None
+    return str(separator).join(_to_text(arg) for arg in args if arg is not None)
+
+
+def _to_text(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _left(value, length):
+    return None if value is None or length is None else str(value)[:max(int(length), 0)]
+
+
+def _right(value, length):
+    if value is None or length is None:
+        return None
+    length = int(length)
+    return str(value)[-length:] if length > 0 else ""
+
+
+def _locate(needle, haystack, start=1):
+    if needle is None or haystack is None:
+        return None
+    return str(haystack).find(str(needle), max(int(start) - 1, 0)) + 1
+
+
+def _pad(left):
+    def pad(value, length, fill):
+        if value is None or length is None or fill is None:
+            return None
+        value, length, fill = str(value), int(length), str(fill)
+        if len(value) >= length or not fill:
+            return value[:length]
+        padding = (fill * length)[:length - len(value)]
+        return padding + value if left else value + padding
+    return pad
+
+
+def _substring_index(value, delimiter, count):
+    if value is None or delimiter is None or count is None:
+        return None
+    parts = str(value).split(str(delimiter))
+    count = int(count)
+    return str(delimiter).join(parts[:count] if count >= 0 else parts[count:])
+
+
+def _regexp(pattern, value):
+    if pattern is None or value is None:
+        return None
+    return 1 if re.search(str(pattern), str(value), re.IGNORECASE) else 0
+
+
+def _truncate(value, digits):
+    if value is None or digits is None:
+        return None
+    factor = 10 ** int(digits)
+    return math.trunc(float(value) * factor) / factor
+
+
+def _mysql_format(value, digits=0):
+    if value is None:
+        return None
+    return f"{float(value):,.{max(int(digits or 0), 0)}f}"
+
+
+def _field(value, *options):
+    if value is None:
+        return 0
+    for index, option in enumerate(options, start=1):
+        if option == value or (option is not None and str(option).lower() == str(value).lower()):
+            return index
+    return 0
+
+
+def _null_safe(function):
+    def wrapper(*args):
+        if any(arg is None for arg in args):
+            return None
+        return function(*(float(arg) for arg in args))
+    return wrapper
+
+
+def _last_day(value):
+    moment = _parse_datetime(value)
+    if moment is None:
+        return None
+    return moment.replace(day=calendar.monthrange(moment.year, moment.month)[1]).strftime("%Y-%m-%d")
+
+
+UDFS = {
+    "NOW": lambda: datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    "SYSDATE": lambda: datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    "CURDATE": lambda: datetime.date.today().isoformat(),
+    "CURTIME": lambda: datetime.datetime.now().strftime("%H:%M:%S"),
+    "YEAR": _date_part("year"),
+    "MONTH": _date_part("month"),
+    "DAY": _date_part("day"),
+    "DAYOFMONTH": _date_part("day"),
+    "HOUR": _date_part("hour"),
+    "MINUTE": _date_part("minute"),
+    "SECOND": _date_part("second"),
+    "QUARTER": lambda v: _extract("QUARTER", v),
+    "WEEK": lambda v, mode=0: _extract("WEEK", v),
+    "DAYOFWEEK": lambda v: None if _parse_datetime(v) is None else (_parse_datetime(v).weekday() + 1) % 7 + 1,
+    "WEEKDAY": lambda v: None if _parse_datetime(v) is None else _parse_datetime(v).weekday(),
+    "DAYNAME": lambda v: None if _parse_datetime(v) is None else _parse_datetime(v).strftime("%A"),
+    "MONTHNAME": lambda v: None if _parse_datetime(v) is None else _parse_datetime(v).strftime("%B"),
+    "LAST_DAY": _last_day,
+    "EXTRACT": _extract,
+    "DATE_ADD": _date_add,
+    "ADDDATE": _date_add,
+    "DATE_SUB": lambda v, i: _date_add(v, i, sign=-1),
+    "SUBDATE": lambda v, i: _date_add(v, i, sign=-1),
+    "DATEDIFF": _datediff,
+    "TIMESTAMPDIFF": _timestampdiff,
+    "TIMESTAMPADD": lambda unit, amount, v: _date_add(v, f"{amount} {unit}"),
+    "DATE_FORMAT": _date_format,
+    "CONCAT": _concat,
+    "CONCAT_WS": _concat_ws,
+    "MYSQL_LEFT": _left,
+    "MYSQL_RIGHT": _right,
+    "MYSQL_FORMAT": _mysql_format,
+    "MYSQL_SUBSTRING_INDEX": _substring_index,
+    "LOCATE": _locate,
+    "LPAD": _pad(left=True),
+    "RPAD": _pad(left=False),
+    "REPEAT": lambda v, n: None if v is None or n is None else str(v) * max(int(n), 0),
+    "REVERSE": lambda v: None if v is None else str(v)[::-1],
+    "ISNULL": lambda v: 1 if v is None else 0,
+    "FIELD": _field,
+    "REGEXP": _regexp,
+    "TRUNCATE": _truncate,
+    "MOD": lambda a, b: None if a is None or not b else math.fmod(float(a), float(b)),
+    "CEIL": _null_safe(math.ceil),
+    "CEILING": _null_safe(math.ceil),
+    "FLOOR": _null_safe(math.floor),
+    "SQRT": _null_safe(math.sqrt),
+    "POW": _null_safe(math.pow),
+    "POWER": _null_safe(math.pow),
+    "LN": _null_safe(math.log),
+    "EXP": _null_safe(math.exp),
+    "SIGN": _null_safe(lambda v: (v > 0) - (v < 0)),
+    "PI": lambda: math.pi,
+    "RAND": lambda seed=None: random.random(),
+}
+
+
+def register_functions(connection: sqlite3.Connection):
+    """Register the MySQL compatibility functions on a SQLite connection"""
+    for name, function in UDFS.items():
+        connection.create_function(name, -1, function)
@@ -0,0 +1,158 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from services.sakila_data import DEFAULT_DATA_PATH, iter_inserts
+from services.schema_catalog import SchemaCatalog
+from services.sqlite_dialect import register_functions, sqlite_string, translate, unescape_string
+
+logger = logging.getLogger(__name__)
+
+# SQLite errors caused by the query itself (wrong table/column names, bad aggregates),
+# as opposed to MySQL features the dialect translation does not cover
+SCHEMA_ERRORS = (
+    "no such table",
+    "no such column",
+    "ambiguous column name",
+    "misuse of aggregate",
+    "a GROUP BY clause is required",
+)
+
+_MYSQL_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'", re.DOTALL)
+
+
+def _sqlite_type(mysql_type: str) -> str:
+    base = mysql_type.split("(", 1)[0].upper()
+    if base in ("TINYINT", "SMALLINT", "MEDIUMINT", "INT", "INTEGER", "BIGINT", "YEAR", "BIT"):
+        return "INTEGER"
+    if base in ("DECIMAL", "NUMERIC", "FLOAT", "DOUBLE", "REAL"):
+        return "NUMERIC"
+    if base in ("BLOB", "TINYBLOB", "MEDIUMBLOB", "LONGBLOB", "BINARY", "VARBINARY"):
+        return "BLOB"
+    return "TEXT"
+
+
+class SQLiteMirror:
+    """In-memory SQLite copy of the Sakila schema, optionally with its data.
+
+    Built once from the schema catalog (and the INSERTs of the data dump when
+    ``load_data`` is set). ``dry_run`` translates a generated MySQL query and
+    prepares it with ``EXPLAIN QUERY PLAN``, which catches unknown tables and
+    columns without touching MySQL or scanning any rows. ``execute`` runs
+    queries on a private copy of the database with its own lock, so a long
+    query in a worker thread never blocks a dry run on the event loop.
+    """
+
+    def __init__(self, catalog: SchemaCatalog, data_path: Optional[str] = None, load_data: bool = False):
+        started = time.perf_counter()
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(":memory:", check_same_thread=False)
+        register_functions(self._connection)
+        self._execute_lock = threading.Lock()
+        self._execute_connection: Optional[sqlite3.Connection] = None
+        self._create_tables()
+        self.rows_loaded = self._load_data(data_path or DEFAULT_DATA_PATH) if load_data else 0
+        self.build_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(
+            f"SQLite mirror ready: {len(catalog.tables)} tables, {self.rows_loaded} rows in {self.build_ms} ms"
+        )
+
+    def _create_tables(self):
+        with self._lock:
+            for name, table in self.catalog.tables.items():
+                columns = [f'"{column}" {_sqlite_type(sql_type)}' for column, sql_type in table["columns"].items()]
+                if table["primary_key"]:
+                    columns.append("PRIMARY KEY (" + ", ".join(f'"{c}"' for c in table["primary_key"]) + ")")
+                self._connection.execute(f'CREATE TABLE "{name}" ({", ".join(columns)})')
+                for position, index in enumerate(table["indexes"]):
+                    if index["fulltext"]:
+                        continue
+                    unique = "UNIQUE " if index["unique"] else ""
+                    self._connection.execute(
+                        f'CREATE {unique}INDEX "{name}_{index["name"] or position}" ON "{name}" '
+                        f'({", ".join(chr(34) + c + chr(34) for c in index["columns"])})'
+                    )
+
+    def _load_data(self, path: str) -> int:
+        """Replay the INSERTs of the MySQL data dump (string escapes translated)"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                dump = f.read()
+        except OSError as e:
+            logger.warning(f"Data dump not available ({path}): {e}")
+            return 0
+        loaded = 0
+        with self._lock:
+            for table, values_sql, rows in iter_inserts(dump):
+                if not self.catalog.has_table(table):
+                    continue
+                values_sql = _MYSQL_STRING_RE.sub(lambda m: sqlite_string(unescape_string(m.group())), values_sql)
+                try:
+                    self._connection.execute(f'INSERT OR IGNORE INTO "{table}" VALUES {values_sql}')
+                    loaded += rows
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not load rows for {table} into the SQLite mirror: {e}")
+            self._connection.commit()
+        return loaded
+
+    def dry_run(self, sql_query: str) -> Dict[str, Any]:
+        """Prepare the translated query with EXPLAIN QUERY PLAN without running it"""
+        started = time.perf_counter()
+        translated = translate(sql_query)
+        result: Dict[str, Any] = {"ok": True, "error": None, "error_kind": None, "translated_sql": translated}
+        try:
+            with self._lock:
+                plan = self._connection.execute(f"EXPLAIN QUERY PLAN {translated}").fetchall()
+            result["plan"] = [row[-1] for row in plan]
+        except (sqlite3.Error, sqlite3.Warning) as e:
+            message = str(e)
+            result.update({
+                "ok": False,
+                "error": message,
+                "error_kind": "schema" if message.startswith(SCHEMA_ERRORS) else "dialect",
+            })
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    def _execution_connection(self) -> sqlite3.Connection:
+        """Copy of the mirror used by ``execute``, made on first use (callers hold ``_execute_lock``)"""
+        if self._execute_connection is None:
+            connection = sqlite3.connect(":memory:", check_same_thread=False)
+            register_functions(connection)
+            with self._lock:
+                self._connection.backup(connection)
+            self._execute_connection = connection
+        return self._execute_connection
+
+    def execute(self, sql_query: str, max_rows: int, timeout: float) -> Dict[str, Any]:
+        """Run the translated query, keeping at most ``max_rows`` rows.
+
+        Only meaningful when the mirror was built with ``load_data``. The
+        query is interrupted once it runs longer than ``timeout`` seconds
+        (``sqlite3.OperationalError: interrupted``); other SQLite errors
+        propagate as well.
+        """
+        started = time.perf_counter()
+        translated = translate(sql_query)
+        deadline = started + timeout
+        with self._execute_lock:
+            connection = self._execution_connection()
+            connection.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+            try:
+                cursor = connection.execute(translated)
+                columns = [column[0] for column in cursor.description or ()]
+                rows = cursor.fetchmany(max_rows + 1)
+                cursor.close()
+            finally:
+                connection.set_progress_handler(None, 0)
+        return {
+            "columns": columns,
+            "rows": rows[:max_rows],
+            "truncated": len(rows) > max_rows,
+            "translated_sql": translated,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
@@ -0,0 +1,74 @@
+import importlib
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+class StartupReport:
+    """Timeline of a process start: heavy imports, component construction, warm-up and readiness.
+
+    ``started`` is a ``time.perf_counter()`` reading taken as early as
+    possible (first line of the app module); every figure is in
+    milliseconds from there, or the duration of the step.
+    """
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = time.perf_counter() if started is None else started
+        self.imports: Dict[str, float] = {}
+        self.phases: Dict[str, float] = {}
+        self.warmup: Optional[Dict[str, Any]] = None
+        self.cache_seed: Optional[Dict[str, Any]] = None
+        self.ready_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def import_module(self, name: str):
+        """Import ``name`` and record how long it took (0 if it was already loaded)"""
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        self.imports[name] = _ms(time.perf_counter() - started)
+        return module
+
+    @contextmanager
+    def phase(self, name: str):
+        """Record the duration of the enclosed block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = _ms(time.perf_counter() - started)
+
+    def mark(self, name: str):
+        """Record the time elapsed since the start under ``name``"""
+        self.phases[name] = self.elapsed_ms()
+
+    def mark_ready(self):
+        self.ready_ms = self.elapsed_ms()
+
+    def elapsed_ms(self) -> float:
+        return _ms(time.perf_counter() - self.started)
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_ms is not None
+
+    def summary(self) -> str:
+        """One log line with the slowest steps"""
+        steps = sorted({**self.imports, **self.phases}.items(), key=lambda item: item[1], reverse=True)
+        top = ", ".join(f"{name} {value:.0f}ms" for name, value in steps[:5])
+        return f"Ready in {self.ready_ms:.0f}ms ({top})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "ready_ms": self.ready_ms,
+            "uptime_ms": self.elapsed_ms(),
+            "imports_ms": dict(self.imports),
+            "phases_ms": dict(self.phases),
+            "warmup": self.warmup,
+            "cache_seed": self.cache_seed,
+            "error": self.error,
+        }
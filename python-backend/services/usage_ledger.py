@@ -0,0 +1,84 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+_FIELDS = ("requests", "prompt_tokens", "completion_tokens", "cached_tokens", "failures")
+
+
+class UsageLedger:
+    """LLM token usage and cost per client identifier.
+
+    Counts requests and the ``usage`` reported by the provider for each
+    client; the cost uses per-million-token prices (cached prompt tokens at
+    their own, usually discounted, price). At most ``max_clients`` clients
+    are tracked: the least recently active one is folded into ``"other"``
+    so totals stay exact while memory stays bounded.
+    """
+
+    def __init__(self, max_clients: int = 10000, input_price: float = 0.0,
+                 cached_input_price: float = 0.0, output_price: float = 0.0):
+        self.max_clients = max(1, max_clients)
+        self.input_price = input_price
+        self.cached_input_price = cached_input_price
+        self.output_price = output_price
+        self._clients: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+        self._other = dict.fromkeys(_FIELDS, 0)
+
+    def _entry(self, client_id: str) -> Dict[str, float]:
+        entry = self._clients.get(client_id)
+        if entry is None:
+            entry = self._clients[client_id] = dict.fromkeys(_FIELDS, 0)
+            if len(self._clients) > self.max_clients:
+                _, evicted = self._clients.popitem(last=False)
+                for field in _FIELDS:
+                    self._other[field] += evicted[field]
+        else:
+            self._clients.move_to_end(client_id)
+        return entry
+
+    def record(self, client_id: str, usage: Optional[Dict[str, int]], success: bool = True):
+        """Count one LLM generation for ``client_id``"""
+        entry = self._entry(client_id or "anonymous")
+        entry["requests"] += 1
+        if not success:
+            entry["failures"] += 1
+        if usage:
+            entry["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            entry["completion_tokens"] += usage.get("completion_tokens") or 0
+            entry["cached_tokens"] += usage.get("cached_tokens") or 0
+
+    def cost(self, entry: Dict[str, float]) -> float:
+        """Cost in the price currency (prices are per million tokens)"""
+        uncached = entry["prompt_tokens"] - entry["cached_tokens"]
+        return round((
+            uncached * self.input_price
+            + entry["cached_tokens"] * self.cached_input_price
+            + entry["completion_tokens"] * self.output_price
+        ) / 1_000_000, 6)
+
+    def client(self, client_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._clients.get(client_id)
+        if entry is None:
+            return None
+        return dict(entry, cost=self.cost(entry))
+
+    def stats(self, top: int = 20) -> Dict[str, Any]:
+        """Totals plus the ``top`` clients by tokens used"""
+        totals = dict(self._other)
+        for entry in self._clients.values():
+            for field in _FIELDS:
+                totals[field] += entry[field]
+        ranked = sorted(
+            self._clients.items(),
+            key=lambda item: item[1]["prompt_tokens"] + item[1]["completion_tokens"],
+            reverse=True
+        )[:top]
+        return {
+            "clients": len(self._clients),
+            "prices_per_million": {
+                "input": self.input_price,
+                "cached_input": self.cached_input_price,
+                "output": self.output_price,
+            },
+            "totals": dict(totals, cost=self.cost(totals)),
+            "top_clients": [dict(entry, client_id=client_id, cost=self.cost(entry)) for client_id, entry in ranked],
+        }